@@ -35,55 +35,10 @@ __module__ = "bcc_logging"
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
 
 
-import logging
-import logging.handlers
-import os
-import time
-
-
-loglevelname = 'info'
-loglevel = logging.INFO
-defaultloglevel = logging.INFO
-loglevelmap = {'critical': logging.CRITICAL, 'error': logging.ERROR, 'warning': logging.WARNING, 'info': logging.INFO,
-               'debug': logging.DEBUG}
-logformat = '[UTC] %(asctime)-15s [%(process)s] (%(module)s-%(funcName)s-%(lineno)d) %(levelname)s: %(message)s'
-logfilename = '/tmp/python-oc.log'
-
-
-def getLogFormat():
-    return logformat
-
-
-def getLogFilename():
-    global logfilename
-    try:
-        logfilename = os.getenv('OC_LOG_FILE', logfilename)
-    except KeyError as e:
-        logfilename = '/tmp/python-oc.log'
-    return logfilename
-
-
-def getLogLevel():
-    global loglevel
-    global loglevelname
-    try:
-        loglevelname = os.getenv('OC_LOG_LEVEL', loglevelname)
-        loglevel = loglevelmap[loglevelname.lower()]
-    except KeyError as e:
-        loglevel = defaultloglevel
-    return loglevel
-
-
-def initLogging(name):
-    logfilehandler = logging.handlers.RotatingFileHandler(getLogFilename(), maxBytes=10485760, backupCount=10)
-    #logfilehandler = logging.handlers.SysLogHandler(facility=logging.handlers.SysLogHandler.LOG_SYSLOG)
-    logfilehandler.setLevel(getLogLevel())
-    formatter = logging.Formatter(getLogFormat())
-    formatter.converter = time.gmtime
-    logfilehandler.setFormatter(formatter)
-
-    logger = logging.getLogger(name)
-    logger.setLevel(getLogLevel())
-    logger.addHandler(logfilehandler)
-    return logger
-
+# Logging is shared with the OC REST wrappers so both write through one queue
+# and writer thread per process.
+from oc.oc_logging import getLogFilename
+from oc.oc_logging import getLogFormat
+from oc.oc_logging import getLogLevel
+from oc.oc_logging import initLogging
+from oc.oc_logging import truncateBody
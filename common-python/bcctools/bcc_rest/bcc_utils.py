@@ -34,10 +34,14 @@ __module__ = "authenticate"
 
 import getpass
 import json
+import logging
 import requests
 import ast
 
 from bcc_logging import initLogging
+from bcc_logging import truncateBody
+from oc.oc_retry import RetryPolicy
+from oc.oc_sessionpool import HTTPSessionPool
 
 from bcc_exceptions import RESTException 
 from bcc_exceptions import REST401Exception
@@ -59,24 +63,41 @@ def showVersionHistory():
 
 
 mylogger = initLogging(__name__)
-httpSession = None
+#sessionHeaders = {'Accept': 'application/oracle-compute-v3+json', 'Accept-Encoding': 'gzip;q=1.0, identity; q=0.5', 'Content-Type': 'application/oracle-compute-v3+json'}
+sessionHeaders = {'Content-Type': 'application/json'}
+sessionPool = HTTPSessionPool(sessionHeaders, envprefix='BCC')
+retryPolicy = RetryPolicy(envprefix='BCC')
 restEndpoint = None
 
 
 def clearHTTPSession():
-    global httpSession
-    httpSession = None
+    # Pooled sessions are returned without cookies so there is no per call state
+    # to clear, just drop the connections that have been idle too long.
+    sessionPool.evict()
     return
 
 
-def getHTTPSession():
-    global httpSession
-    #headers = {'Accept': 'application/oracle-compute-v3+json', 'Accept-Encoding': 'gzip;q=1.0, identity; q=0.5', 'Content-Type': 'application/oracle-compute-v3+json'}
-    headers = {'Content-Type': 'application/json'}
-    if httpSession is None:
-        httpSession = requests.Session()
-        httpSession.headers.update(headers)
-    return httpSession
+def closeHTTPSessions():
+    sessionPool.clear()
+    return
+
+
+def getSessionPool():
+    return sessionPool
+
+
+def getRetryPolicy():
+    return retryPolicy
+
+
+def setRetryPolicy(policy):
+    global retryPolicy
+    retryPolicy = policy
+    return
+
+
+def sendRequest(method, url, data=None, **kwargs):
+    return retryPolicy.execute(method, lambda: sessionPool.request(method, url, data=data, **kwargs), data)
 
 
 def getRESTEndpoint():
@@ -91,7 +112,7 @@ def setRESTEndpoint(url):
 
 def callRESTApi(endpoint, basepath, resourcename='', data=None, method='GET', params=None, cookie=None, **kwargs):
     response = {}
-    client = getHTTPSession()
+    cookies = None
     
     if data is None:
         data = {}
@@ -99,7 +120,7 @@ def callRESTApi(endpoint, basepath, resourcename='', data=None, method='GET', pa
     if cookie is not None:
         dictData = dict(ast.literal_eval(cookie.strip()))
         if 'JSESSIONID' in dictData:
-            client.cookies['JSESSIONID'] = dictData['JSESSIONID']
+            cookies = {'JSESSIONID': dictData['JSESSIONID']}
         # we need to pass dynSessConf no matter what
         if '_dynSessConf' in dictData:
             data['_dynSessConf'] = dictData['_dynSessConf']
@@ -111,39 +132,37 @@ def callRESTApi(endpoint, basepath, resourcename='', data=None, method='GET', pa
     #print('url     : ' + str(url))
     #print('params  : ' + str(params))
     #print('data    : ' + str(data))
-    #print('headers : ' + str(client.headers))
-    #print ('cookies : ' + str(client.cookies))
+    #print ('cookies : ' + str(cookies))
     requests.packages.urllib3.disable_warnings()
     if method.upper() == 'GET':
-        response = client.get(url, params=params, verify=False)
+        response = sendRequest('GET', url, params=params, cookies=cookies, verify=False)
     elif method.upper() == 'POST':
-        response = client.post(url, data=json.dumps(data), verify=False)
+        response = sendRequest('POST', url, data=json.dumps(data), cookies=cookies, verify=False)
         #print "************************"
         #print response.text        
         #print "************************"
     elif method.upper() == 'PUT':
-        response = client.put(url, params=params, verify=False)
+        response = sendRequest('PUT', url, params=params, cookies=cookies, verify=False)
     elif method.upper() == 'DELETE':
-        response = client.delete(url, verify=False)
-    # Clean because it seems reusing the session fails
-    clearHTTPSession()
+        response = sendRequest('DELETE', url, cookies=cookies, verify=False)
     #print('response headers : ' + str(response.headers))
     #print('response status  : ' + str(response.status_code))
     #print('response text    : ' + str(response.text))
 
     # Check response and raise exception if necessary
-    mylogger.debug("Response ({0:d}) : {1:s}".format(response.status_code, response.text))
+    if mylogger.isEnabledFor(logging.DEBUG):
+        mylogger.debug("Response ({0:d}) : {1:s}".format(response.status_code, truncateBody(response.text)))
     if response.status_code == 401:
-        mylogger.warn("Response ({0:d}) : {1:s}".format(response.status_code, response.text))
+        mylogger.warn("Response ({0:d}) : {1:s}".format(response.status_code, truncateBody(response.text)))
         raise REST401Exception('{0:s} : {1:s}'.format(str(response.status_code), str(response.text)))
     elif response.status_code == 404:
-        mylogger.warn("Response ({0:d}) : {1:s}".format(response.status_code, response.text))
+        mylogger.warn("Response ({0:d}) : {1:s}".format(response.status_code, truncateBody(response.text)))
         raise REST404Exception('{0:s} : {1:s}'.format(str(response.status_code), str(response.text)))
     elif response.status_code == 409:
-        mylogger.warn("Response ({0:d}) : {1:s}".format(response.status_code, response.text))
+        mylogger.warn("Response ({0:d}) : {1:s}".format(response.status_code, truncateBody(response.text)))
         raise REST409Exception('{0:s} : {1:s}'.format(str(response.status_code), str(response.text)))
     elif response.status_code >= 400 and response.status_code < 600:
-        mylogger.warn("Response ({0:d}) : {1:s}".format(response.status_code, response.text))
+        mylogger.warn("Response ({0:d}) : {1:s}".format(response.status_code, truncateBody(response.text)))
         raise RESTException('{0:s} : {1:s}'.format(str(response.status_code), str(response.text)))
 
     return response
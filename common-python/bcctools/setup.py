@@ -51,6 +51,7 @@ setup(name='bcc_rest',
       install_requires=[
           'simplejson',
           'requests',
+          'oc',
           'abi',
           'ConfigParser'
       ]
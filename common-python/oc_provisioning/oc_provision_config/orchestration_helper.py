@@ -33,10 +33,15 @@ import ConfigParser
 from collections import defaultdict
 import copy
 import errno
+import getopt
+import hashlib
+import multiprocessing
 import os
 import posixpath
 import re
 import shutil
+import sys
+import threading
 import yaml
 import simplejson as json
 
@@ -51,6 +56,16 @@ default_seclist = "/default/default"
 
 yaml_map = defaultdict(list)
 
+# the inputs and outputs of each generated section are kept in the orchestrations directory so
+# an incremental generation only writes sections whose inputs changed
+manifest_file = ".manifest.json"
+manifest_version = 1
+generation_state = {'orch_dir': None, 'image_name': None, 'previous': {}, 'sections': {}, 'record': None, 'changed': [], 'removed': [],
+                    'templates': {}, 'orch_templates': {}, 'workers': 1, 'pool': None}
+
+# fewer sections than this to generate are not worth handing to the worker pool
+parallel_threshold = 8
+
 # root for orchestration files
 root_orch_dir = "orchestrations"
 
@@ -84,6 +99,90 @@ seclist_map = {'atg': ['atg_instances'],
                'dgraph' : ['endeca_instances'],
                'db' : ['db_server']}
 
+# parsed property files of each project, by project directory
+project_models = {}
+project_models_lock = threading.Lock()
+
+class ProjectModel(object):
+    """
+    The project, storage and instances properties of a project, each parsed once and
+    read again only when the file's mtime or size changes. Lookups are answered from
+    the parsed files and remembered until then.
+    """
+    def __init__(self, project_name):
+        self.project_name = project_name
+        self.project_path = project_directory + "/" + project_name
+        self.lock = threading.RLock()
+        self.configs = {}
+
+    def get_config(self, data_type):
+        """
+        Return the parsed property file for a data type, re-reading it if it changed on disk
+        """
+        config_file = self.project_path + "/" + config_file_map[data_type]
+        try:
+            stat = os.stat(config_file)
+            signature = (stat.st_mtime, stat.st_size)
+        except OSError:
+            # a missing file reads as empty, as ConfigParser.read does
+            signature = None
+        with self.lock:
+            cached = self.configs.get(data_type)
+            if cached is None or cached['signature'] != signature:
+                config = ConfigParser.ConfigParser()
+                config.read(config_file)
+                cached = {'signature': signature, 'config': config, 'sections': config.sections(), 'values': {}, 'items': {}}
+                self.configs[data_type] = cached
+            return cached
+
+    def invalidate(self, data_type=None):
+        """
+        Forget a parsed property file, or all of them, after writing to it
+        """
+        with self.lock:
+            if data_type is None:
+                self.configs.clear()
+            else:
+                self.configs.pop(data_type, None)
+
+    def sections(self, data_type):
+        return list(self.get_config(data_type)['sections'])
+
+    def has_section(self, data_type, section_name):
+        return self.get_config(data_type)['config'].has_section(section_name)
+
+    def has_option(self, data_type, section_name, option):
+        return self.get_config(data_type)['config'].has_option(section_name, option)
+
+    def items(self, data_type, section_name):
+        cached = self.get_config(data_type)
+        with self.lock:
+            if section_name not in cached['items']:
+                cached['items'][section_name] = cached['config'].items(section_name)
+            return list(cached['items'][section_name])
+
+    def get(self, data_type, section, option):
+        cached = self.get_config(data_type)
+        key = (section, cached['config'].optionxform(option))
+        with self.lock:
+            if key not in cached['values']:
+                cached['values'][key] = cached['config'].get(section, option)
+            return cached['values'][key]
+
+def get_project_model(project_name):
+    """
+    Return the shared model of a project's property files
+    """
+    model_key = project_directory + "/" + project_name
+    with project_models_lock:
+        if model_key not in project_models:
+            project_models[model_key] = ProjectModel(project_name)
+        return project_models[model_key]
+
+def forget_project_model(project_name):
+    with project_models_lock:
+        project_models.pop(project_directory + "/" + project_name, None)
+
 def get_existing_projects():
     return os.listdir(project_directory)
 
@@ -94,10 +193,17 @@ def make_project(project_name):
 def delete_project(project_name):
     dir_to_del = posixpath.join(project_directory, project_name)
     shutil.rmtree(dir_to_del) 
+    forget_project_model(project_name)
 
-def generate_orchestrations(project_name, domain, user, image_name):
+def generate_orchestrations(project_name, domain, user, image_name, incremental=False, workers=1):
     """
-    main function to generate orchs and yaml
+    main function to generate orchs and yaml. With incremental, sections whose inputs are unchanged
+    since the last generation are left as they are and files no longer generated are removed.
+    With workers above 1, or 0 for one per cpu, sections are generated by a pool of worker processes
+    and merged in section order so the output is the same as with workers=1.
+    Returns the playbooks that were written again, the ones that need to be re-run. The cleanup
+    playbooks of deleted sections are kept, as they still delete what those sections created, and are
+    listed in generation_state['removed'] and the manifest until they are generated again.
     """          
     global identity_domain
     global username
@@ -110,19 +216,214 @@ def generate_orchestrations(project_name, domain, user, image_name):
     compute_domain = "/Compute-" + identity_domain
     compute_name = compute_domain + "/" + username    
     
-    # delete any exinsting orchs    
-    remove_existing_orchestrations(project_name)
-    
-    generate_secapp_data(project_name)
-    generate_seclist_data(project_name)
-    generate_storage_data(project_name)
-    generate_instance_data(project_name, image_name)
-    create_common_opc_ansible_configs(project_name)
-    generate_storage_yaml(project_name)
-    generate_instance_yaml(project_name)
-    create_shell_wrapper(project_name)
-    
-    
+    previous = None
+    if incremental:
+        previous = read_generation_manifest(project_name)
+    if previous is None:
+        # delete any exinsting orchs    
+        remove_existing_orchestrations(project_name)
+    
+    yaml_map.clear()
+    generation_state['orch_dir'] = project_directory + "/" + project_name + "/" + root_orch_dir
+    generation_state['image_name'] = image_name
+    generation_state['previous'] = previous['sections'] if previous is not None else {}
+    generation_state['sections'] = {}
+    generation_state['record'] = None
+    generation_state['changed'] = []
+    generation_state['removed'] = previous.get('removed', []) if previous is not None else []
+    generation_state['templates'] = {}
+    generation_state['orch_templates'] = {}
+    generation_state['workers'] = workers if workers > 0 else multiprocessing.cpu_count()
+    
+    try:
+        generate_secapp_data(project_name)
+        generate_seclist_data(project_name)
+        generate_storage_data(project_name)
+        generate_instance_data(project_name, image_name)
+        create_common_opc_ansible_configs(project_name)
+        generate_storage_yaml(project_name)
+        generate_instance_yaml(project_name)
+        create_shell_wrapper(project_name)
+    finally:
+        if generation_state['pool'] is not None:
+            generation_state['pool'].close()
+            generation_state['pool'].join()
+            generation_state['pool'] = None
+    
+    remove_stale_outputs(project_name)
+    write_generation_manifest(project_name)
+    return list(generation_state['changed'])
+    
+def read_generation_manifest(project_name):
+    """
+    Return the manifest written by the last generation, None if there is no usable one
+    """
+    manifest_path = project_directory + "/" + project_name + "/" + root_orch_dir + "/" + manifest_file
+    if not os.path.isfile(manifest_path):
+        return None
+    try:
+        with open(manifest_path) as manifest:
+            data = json.load(manifest)
+    except (IOError, ValueError):
+        print "ignoring unreadable generation manifest " + manifest_path
+        return None
+    if data.get('version') != manifest_version:
+        return None
+    return data
+
+def write_generation_manifest(project_name):
+    manifest_path = project_directory + "/" + project_name + "/" + root_orch_dir + "/" + manifest_file
+    data = {'version': manifest_version, 'sections': generation_state['sections'], 'changed': generation_state['changed'],
+            'removed': generation_state['removed']}
+    target = open(manifest_path, 'w')
+    target.write(json.dumps(data, sort_keys=True, indent=2))
+    target.close()
+
+def hash_template(template_file):
+    """
+    Hash a template once per generation
+    """
+    templates = generation_state['templates']
+    if template_file not in templates:
+        with open(template_file, 'rb') as template:
+            templates[template_file] = hashlib.sha1(template.read()).hexdigest()
+    return templates[template_file]
+
+def hash_inputs(inputs):
+    """
+    Hash everything a section's output is made from, templates by their content
+    """
+    effective = dict(inputs)
+    effective['compute_name'] = compute_name
+    effective['compute_domain'] = compute_domain
+    effective['templates'] = [[template_file, hash_template(template_file)] for template_file in inputs.get('templates', [])]
+    return hashlib.sha1(json.dumps(effective, sort_keys=True)).hexdigest()
+
+def is_section_current(section_key, input_hash):
+    """
+    Test if the last generation recorded the same inputs for a section and its outputs are still there
+    """
+    previous = generation_state['previous'].get(section_key)
+    if previous is None or previous['inputs'] != input_hash:
+        return False
+    return all(os.path.isfile(generation_state['orch_dir'] + "/" + output) for output in previous['outputs'])
+
+def run_section(task):
+    """
+    Generate one section, in this process or a pool worker, and return the files and playbooks it wrote
+    """
+    input_hash, generate_name, args = task
+    record = {'inputs': input_hash, 'outputs': [], 'playbooks': []}
+    generation_state['record'] = record
+    try:
+        globals()[generate_name](*args)
+    finally:
+        generation_state['record'] = None
+    return record
+
+def generate_sections(project_name, sections):
+    """
+    Generate a list of (section_key, inputs, generate, args), skipping those that are current. Changed
+    sections are spread over the worker pool when there are enough of them, then all are merged in
+    list order so the playbook lists for the shell wrapper come out as a serial generation makes them.
+    """
+    tasks = []
+    for section_key, inputs, generate, args in sections:
+        input_hash = hash_inputs(inputs)
+        if not is_section_current(section_key, input_hash):
+            tasks.append((section_key, (input_hash, generate.__name__, args)))
+    if generation_state['workers'] > 1 and len(tasks) >= parallel_threshold:
+        if generation_state['pool'] is None:
+            # forked after the generation settings are made, so the workers share them
+            generation_state['pool'] = multiprocessing.Pool(generation_state['workers'])
+        records = generation_state['pool'].map(run_section, [task for section_key, task in tasks])
+    else:
+        records = [run_section(task) for section_key, task in tasks]
+    generated = dict(zip([section_key for section_key, task in tasks], records))
+    for section_key, inputs, generate, args in sections:
+        if section_key in generated:
+            record = generated[section_key]
+            generation_state['changed'].extend(playbook for yaml_type, playbook in record['playbooks'])
+        else:
+            record = generation_state['previous'][section_key]
+        for yaml_type, playbook in record['playbooks']:
+            yaml_map[yaml_type].append(playbook)
+        generation_state['sections'][section_key] = record
+
+def generate_section(project_name, section_key, inputs, generate, *args):
+    generate_sections(project_name, [(section_key, inputs, generate, args)])
+
+def load_orch_template(data_file):
+    """
+    Load an orch template once per generation. Workers are given the template's name rather than
+    its data, as a dict rebuilt from a pickle need not list its keys in the same order.
+    """
+    orch_templates = generation_state['orch_templates']
+    if data_file not in orch_templates:
+        with open(data_file) as template:
+            orch_templates[data_file] = json.load(template)
+    return orch_templates[data_file]
+
+def write_output(orch_file, content):
+    """
+    Write a generated file, leaving it untouched if it already holds the same content
+    """
+    record = generation_state['record']
+    if record is not None:
+        record['outputs'].append(os.path.relpath(orch_file, generation_state['orch_dir']).replace(os.sep, "/"))
+    if os.path.isfile(orch_file):
+        with open(orch_file) as existing:
+            if existing.read() == content:
+                return
+    target = open(orch_file, 'w')
+    target.write(content)
+    target.close()
+
+def remove_stale_outputs(project_name):
+    """
+    Remove files the last generation wrote that this one did not, e.g. those of a deleted instance.
+    Cleanup playbooks are kept and added to the removed list instead, as they are what deletes the
+    instance from the cloud; those generated again, or deleted by hand, are dropped from it.
+    """
+    current = set()
+    for section in generation_state['sections'].values():
+        current.update(section['outputs'])
+    # playbooks are named relative to the ansible directory, as in the changed list
+    removed = [playbook for playbook in generation_state['removed']
+               if "ansible/" + playbook not in current and os.path.isfile(generation_state['orch_dir'] + "/ansible/" + playbook)]
+    for section in generation_state['previous'].values():
+        for output in section['outputs']:
+            stale_file = generation_state['orch_dir'] + "/" + output
+            if output in current or not os.path.isfile(stale_file):
+                continue
+            if output.endswith("_cleanup.yaml"):
+                playbook = posixpath.relpath(output, "ansible")
+                if playbook not in removed:
+                    print "keeping " + stale_file + " of a removed section"
+                    removed.append(playbook)
+            else:
+                print "removing " + stale_file
+                os.remove(stale_file)
+    generation_state['removed'] = removed
+
+def instance_inputs(project_name, section):
+    """
+    Everything the orchestration and playbooks of an instance are made from
+    """
+    return {'section': get_config_items(project_name, "instances", section),
+            'project': [get_config_items(project_name, "project", project_section) for project_section in get_section_data(project_name, "project")],
+            'image_name': generation_state['image_name'], 'wrapper_script': wrapper_script, 'default_seclist': default_seclist,
+            'instance_flags': instance_flags, 'seclist_map': seclist_map,
+            'templates': ['orch_templates/instance.template', 'ansible_templates/opc/instance.yaml', 'ansible_templates/opc/instance_cleanup.yaml',
+                          'ansible_templates/openstack/os_instance.yaml', 'ansible_templates/openstack/os_instance_cleanup.yaml']}
+
+def storage_inputs(project_name, section):
+    """
+    Everything the orchestration and playbooks of a storage volume are made from
+    """
+    return {'section': get_config_items(project_name, "storage", section),
+            'templates': ['orch_templates/storage.template', 'ansible_templates/opc/storage.yaml', 'ansible_templates/opc/storage_cleanup.yaml']}
+
 def remove_existing_orchestrations(project_name):
     orch_dir = project_directory + "/" + project_name + "/" + root_orch_dir
     if os.path.exists(orch_dir):
@@ -137,11 +438,15 @@ def generate_storage_yaml(project_name):
     """          
     data_type = "storage"
     sections = get_section_data(project_name, data_type)
-    for section in sections:
-        storage_description = get_config_item(project_name, section, 'description', data_type)
-        storage_size = get_config_item(project_name, section, 'size', data_type)
-        storage_properties = get_config_item(project_name, section, 'properties', data_type)
-        create_storage_yaml(section, storage_description, storage_properties, storage_size, project_name)
+    generate_sections(project_name, [("storage_yaml/" + section, storage_inputs(project_name, section), create_storage_section_yaml, (section, project_name))
+                                     for section in sections])
+
+def create_storage_section_yaml(section, project_name):
+    data_type = "storage"
+    storage_description = get_config_item(project_name, section, 'description', data_type)
+    storage_size = get_config_item(project_name, section, 'size', data_type)
+    storage_properties = get_config_item(project_name, section, 'properties', data_type)
+    create_storage_yaml(section, storage_description, storage_properties, storage_size, project_name)
 
 def generate_instance_yaml(project_name):
     """
@@ -149,12 +454,16 @@ def generate_instance_yaml(project_name):
     """            
     data_type = "instances"
     sections = get_section_data(project_name, data_type)
-    for section in sections:
-        target_platform = get_config_item(project_name, section, 'targetPlatform', data_type)
-        if (target_platform == 'opc'):
-            create_instance_yaml(section, project_name)
-        elif (target_platform == 'openstack'):
-            create_os_instance_yaml(section, project_name)
+    generate_sections(project_name, [("instances_yaml/" + section, instance_inputs(project_name, section), create_instance_section_yaml, (section, project_name))
+                                     for section in sections])
+
+def create_instance_section_yaml(section, project_name):
+    data_type = "instances"
+    target_platform = get_config_item(project_name, section, 'targetPlatform', data_type)
+    if (target_platform == 'opc'):
+        create_instance_yaml(section, project_name)
+    elif (target_platform == 'openstack'):
+        create_os_instance_yaml(section, project_name)
                
 def create_common_opc_ansible_configs(project_name):
     """
@@ -323,41 +632,27 @@ def create_instance_yaml(section_name, project_name):
     write_yaml_data(clean_data, instance_cleanup_yaml, data_type, project_name)
                                  
 def get_section_data(project_name, data_type):
-    config = ConfigParser.ConfigParser()
-    storage_data = project_directory + "/" + project_name + "/" + config_file_map[data_type]
-    config.read(storage_data)
-    return config.sections()
+    return get_project_model(project_name).sections(data_type)
 
 def does_name_exist(project_name, data_type, section_name):
-    config = ConfigParser.ConfigParser()
-    storage_data = project_directory + "/" + project_name + "/" + config_file_map[data_type]
-    config.read(storage_data)
-    return config.has_section(section_name)
+    return get_project_model(project_name).has_section(data_type, section_name)
 
 def get_all_attached_storage(project_name, data_type):
     attached_storage = []
     
-    config = ConfigParser.ConfigParser()
-    storage_data = project_directory + "/" + project_name + "/" + config_file_map[data_type]
-    config.read(storage_data) 
+    model = get_project_model(project_name)
         
-    for section in config.sections():
-        if config.has_option(section, 'attachedStorage'):
-            attached_storage.append(config.get(section, 'attachedStorage'))
+    for section in model.sections(data_type):
+        if model.has_option(data_type, section, 'attachedStorage'):
+            attached_storage.append(model.get(data_type, section, 'attachedStorage'))
     return attached_storage
         
         
 def get_config_items(project_name, data_type, section_name):
-    config = ConfigParser.ConfigParser()
-    storage_data = project_directory + "/" + project_name + "/" + config_file_map[data_type]
-    config.read(storage_data)
-    return config.items(section_name)
+    return get_project_model(project_name).items(data_type, section_name)
 
 def get_config_item(project_name, section, option, data_type):
-    config = ConfigParser.ConfigParser()
-    storage_data = project_directory + "/" + project_name + "/" + config_file_map[data_type]
-    config.read(storage_data)
-    return config.get(section, option)
+    return get_project_model(project_name).get(data_type, section, option)
 
 def update_config_section(project_name, data_type, section_name, prop_name, prop_value):
     config = ConfigParser.ConfigParser()
@@ -367,6 +662,7 @@ def update_config_section(project_name, data_type, section_name, prop_name, prop
     config.set(section_name, prop_name, prop_value)
     with open(storage_data, 'wb') as configfile:
         config.write(configfile)
+    get_project_model(project_name).invalidate(data_type)
     print ">> " + prop_name + " updated"
 
 def add_config_section(project_name, data_type, section_name, section_data):
@@ -380,6 +676,7 @@ def add_config_section(project_name, data_type, section_name, section_data):
         
     with open(storage_data, 'wb') as configfile:
         config.write(configfile)
+    get_project_model(project_name).invalidate(data_type)
         
 def delete_config_section(project_name, data_type, section_name):
     config = ConfigParser.ConfigParser()
@@ -388,6 +685,7 @@ def delete_config_section(project_name, data_type, section_name):
     config.remove_section(section_name)    
     with open(storage_data, 'wb') as configfile:
         config.write(configfile)
+    get_project_model(project_name).invalidate(data_type)
         
 def generate_storage_data(project_name):
     """
@@ -395,20 +693,26 @@ def generate_storage_data(project_name):
     """                  
     data_type = "storage"
     data_file = 'orch_templates/storage.template'
-    with open(data_file) as data_file:    
-        data = json.load(data_file)
  
     sections = get_section_data(project_name, data_type)
     
-    for section in sections:
-        data['description'] = section + " Commerce Storage"
-        data['name'] = compute_name + "/" + section
-        data['oplans'][0]['objects'][0]['name'] = compute_name + "/" + section
-        data['oplans'][0]['objects'][0]['description'] = get_config_item(project_name, section, 'description', data_type)
-        data['oplans'][0]['objects'][0]['size'] = get_config_item(project_name, section, 'size', data_type)
-        data['oplans'][0]['objects'][0]['properties'][0] = get_config_item(project_name, section, 'properties', data_type)
+    generate_sections(project_name, [("storage/" + section, storage_inputs(project_name, section), create_storage_data, (data_file, section, project_name))
+                                     for section in sections])
 
-        write_orch_data(data, section, data_type, project_name)    
+def create_storage_data(data_file, section, project_name):
+    """
+    Create the orch for one OPC storage volume
+    """
+    data_type = "storage"
+    data = load_orch_template(data_file)
+    data['description'] = section + " Commerce Storage"
+    data['name'] = compute_name + "/" + section
+    data['oplans'][0]['objects'][0]['name'] = compute_name + "/" + section
+    data['oplans'][0]['objects'][0]['description'] = get_config_item(project_name, section, 'description', data_type)
+    data['oplans'][0]['objects'][0]['size'] = get_config_item(project_name, section, 'size', data_type)
+    data['oplans'][0]['objects'][0]['properties'][0] = get_config_item(project_name, section, 'properties', data_type)
+
+    write_orch_data(data, section, data_type, project_name)    
 
 def create_seclist_yaml(project_name, allseclist_list):
     """
@@ -487,6 +791,18 @@ def generate_seclist_data(project_name):
     """
     Generate security list orchestrations
     """        
+    data_type = "instances"
+    instances = []
+    for section in get_section_data(project_name, data_type):
+        instances.append([get_config_item(project_name, section, HOSTNAME_KEY, data_type), get_config_item(project_name, section, INSTANCE_TYPES_KEY, data_type)])
+    inputs = {'instances': instances, 'default_seclist': default_seclist, 'seclist_map': seclist_map,
+              'templates': ['orch_templates/seclist.template', 'ansible_templates/opc/seclist.yaml', 'ansible_templates/opc/seclist_cleanup.yaml']}
+    generate_section(project_name, "seclist", inputs, create_seclist_data, project_name)
+
+def create_seclist_data(project_name):
+    """
+    Create the security list orchestration and playbooks for all instances
+    """        
     data_type = "seclist"
     data_file = 'orch_templates/seclist.template'
     with open(data_file) as data_file:    
@@ -529,6 +845,18 @@ def generate_secapp_data(project_name):
     """
     Generate security app orchestrations
     """       
+    data_type = "instances"
+    instances = []
+    for section in get_section_data(project_name, data_type):
+        instances.append(get_config_item(project_name, section, 'jsondata', data_type))
+    inputs = {'instances': instances,
+              'templates': ['orch_templates/secapp.template', 'ansible_templates/opc/secapp.yaml', 'ansible_templates/opc/secapp_cleanup.yaml']}
+    generate_section(project_name, "secapp", inputs, create_secapp_data, project_name)
+
+def create_secapp_data(project_name):
+    """
+    Create the security application orchestration and playbooks for all instances
+    """       
     data_type = "secapp"
     data_file_type = "instances"
     data_file = 'orch_templates/secapp.template'
@@ -611,63 +939,66 @@ def generate_instance_data(project_name, image_name):
     """        
     data_type = "instances"
     data_file = 'orch_templates/instance.template'
-    with open(data_file) as data_file:    
-        master_data = json.load(data_file)
-        data_file.close()
-        
-    data = copy.deepcopy(master_data)
     
     sections = get_section_data(project_name, data_type)
     
-    for section in sections:
-        json_data = {}
-        
-        data = copy.deepcopy(master_data)
-       
-        data['description'] = section + " Commerce Instance"
-        data['name'] = compute_name + "/" + section
-        data['oplans'][0]['objects'][0]['instances'][0]['label'] = section
-        data['oplans'][0]['objects'][0]['instances'][0]['name'] = compute_name + "/" + section
-        hostname = get_config_item(project_name, section, HOSTNAME_KEY, data_type)
-        data['oplans'][0]['objects'][0]['instances'][0]['hostname'] = hostname
-        data['oplans'][0]['objects'][0]['instances'][0]['imagelist'] = compute_name + "/" + image_name
-        data['oplans'][0]['objects'][0]['instances'][0]['shape'] = get_config_item(project_name, section, 'opc_shape', data_type)
-        data['oplans'][0]['objects'][0]['instances'][0]['sshkeys'][0] = compute_name + "/" + get_config_item(project_name, section, 'sshkeyname', data_type)
-        
-        instance_types = get_config_item(project_name, section, INSTANCE_TYPES_KEY, data_type).split(',')
-        config_source = get_config_item(project_name, section, 'configSource', data_type)
-        
-        # add json data to config products with if configSource is set to user-data
-        if (config_source == 'user-data'):
-            data['oplans'][0]['objects'][0]['instances'][0]['attributes']['userdata']['commerceSetup'] = json.loads(get_config_item(project_name, section, 'jsondata', data_type))           
-        
-        data['oplans'][0]['objects'][0]['instances'][0]['attributes']['userdata']['pre-bootstrap']['script'] = wrapper_script + " " + compute_script_flags(instance_types, config_source)
-            
-        data['oplans'][0]['objects'][0]['instances'][0]['networking']['eth0']['seclists'] = compute_seclists(hostname, instance_types)
+    generate_sections(project_name, [("instances/" + section, instance_inputs(project_name, section), create_instance_data, (data_file, section, image_name, project_name))
+                                     for section in sections])
+
+def create_instance_data(data_file, section, image_name, project_name):
+    """
+    Create the orch and installer json for one instance
+    """
+    data_type = "instances"
+    master_data = load_orch_template(data_file)
+    json_data = {}
+    
+    data = copy.deepcopy(master_data)
+   
+    data['description'] = section + " Commerce Instance"
+    data['name'] = compute_name + "/" + section
+    data['oplans'][0]['objects'][0]['instances'][0]['label'] = section
+    data['oplans'][0]['objects'][0]['instances'][0]['name'] = compute_name + "/" + section
+    hostname = get_config_item(project_name, section, HOSTNAME_KEY, data_type)
+    data['oplans'][0]['objects'][0]['instances'][0]['hostname'] = hostname
+    data['oplans'][0]['objects'][0]['instances'][0]['imagelist'] = compute_name + "/" + image_name
+    data['oplans'][0]['objects'][0]['instances'][0]['shape'] = get_config_item(project_name, section, 'opc_shape', data_type)
+    data['oplans'][0]['objects'][0]['instances'][0]['sshkeys'][0] = compute_name + "/" + get_config_item(project_name, section, 'sshkeyname', data_type)
+    
+    instance_types = get_config_item(project_name, section, INSTANCE_TYPES_KEY, data_type).split(',')
+    config_source = get_config_item(project_name, section, 'configSource', data_type)
+    
+    # add json data to config products with if configSource is set to user-data
+    if (config_source == 'user-data'):
+        data['oplans'][0]['objects'][0]['instances'][0]['attributes']['userdata']['commerceSetup'] = json.loads(get_config_item(project_name, section, 'jsondata', data_type))           
+    
+    data['oplans'][0]['objects'][0]['instances'][0]['attributes']['userdata']['pre-bootstrap']['script'] = wrapper_script + " " + compute_script_flags(instance_types, config_source)
         
-        # write json data for configuring installers
-        json_data["commerceSetup"] = json.loads(get_config_item(project_name, section, 'jsondata', data_type))
+    data['oplans'][0]['objects'][0]['instances'][0]['networking']['eth0']['seclists'] = compute_seclists(hostname, instance_types)
+    
+    # write json data for configuring installers
+    json_data["commerceSetup"] = json.loads(get_config_item(project_name, section, 'jsondata', data_type))
 
-        write_orch_data(json_data, section, 'json', project_name)        
+    write_orch_data(json_data, section, 'json', project_name)        
+    
+    # if instance config has attached storage, add it to our output data
+    storage_list = ''
+    storage_attachments = []
+    storage_list = get_config_item(project_name, section, 'attachedstorage', data_type)
+    if storage_list:
+        storage_attachments = storage_list.split(',')           
+        if storage_attachments:
+            data['oplans'][0]['objects'][0]['instances'][0]['storage_attachments'] = storage_attachments
+            for idx, attachment in enumerate(storage_attachments):
+                attachment = compute_name + "/" + attachment
+                tempdict = {'index' : idx + 1, 'volume' : attachment}
+                data['oplans'][0]['objects'][0]['instances'][0]['storage_attachments'][idx] = tempdict
         
-        # if instance config has attached storage, add it to our output data
-        storage_list = ''
-        storage_attachments = []
-        storage_list = get_config_item(project_name, section, 'attachedstorage', data_type)
-        if storage_list:
-            storage_attachments = storage_list.split(',')           
-            if storage_attachments:
-                data['oplans'][0]['objects'][0]['instances'][0]['storage_attachments'] = storage_attachments
-                for idx, attachment in enumerate(storage_attachments):
-                    attachment = compute_name + "/" + attachment
-                    tempdict = {'index' : idx + 1, 'volume' : attachment}
-                    data['oplans'][0]['objects'][0]['instances'][0]['storage_attachments'][idx] = tempdict
-            
 
-        # write orchestration files for direct user use
-        write_orch_data(data, section, data_type, project_name)
-        # write orchestration files for ansible template use
-        write_ansible_orch_template(data, section, data_type, project_name)
+    # write orchestration files for direct user use
+    write_orch_data(data, section, data_type, project_name)
+    # write orchestration files for ansible template use
+    write_ansible_orch_template(data, section, data_type, project_name)
 
 def write_ansible_orch_template(data, name, orch_type, project_name):
     
@@ -681,9 +1012,7 @@ def write_ansible_orch_template(data, name, orch_type, project_name):
             if exc.errno != errno.EEXIST:
                 raise    
     
-    target = open(orch_file, 'w')
-    target.write(json.dumps(data))
-    target.close()
+    write_output(orch_file, json.dumps(data))
     
 def write_orch_data(data, name, orch_type, project_name):
     
@@ -697,9 +1026,7 @@ def write_orch_data(data, name, orch_type, project_name):
             if exc.errno != errno.EEXIST:
                 raise    
             
-    target = open(orch_file, 'w')
-    target.write(json.dumps(data, ensure_ascii=True))
-    target.close()
+    write_output(orch_file, json.dumps(data, ensure_ascii=True))
 
 def create_shell_wrapper(project_name):
     """
@@ -755,19 +1082,9 @@ def create_shell_wrapper(project_name):
             elif ('_cleanup.yaml' in listitem):
                 delete_shell_cmds.insert(0, base_cmd + listitem + " > " + log_dir + log_filename + ".log " + " 2>&1")                   
 
-    create_script = open(create_wrapper, 'w')        
-    
-    for cmd in create_shell_cmds:
-        create_script.write(cmd)
-        create_script.write("\n")
-    create_script.close()
+    write_output(create_wrapper, "".join(cmd + "\n" for cmd in create_shell_cmds))
     
-    delete_script = open(delete_wrapper, 'w')        
-    
-    for cmd in delete_shell_cmds:
-        delete_script.write(cmd)
-        delete_script.write("\n")
-    delete_script.close()
+    write_output(delete_wrapper, "".join(cmd + "\n" for cmd in delete_shell_cmds))
     
     os.chmod(create_wrapper, 0755)
     os.chmod(delete_wrapper, 0755)
@@ -782,9 +1099,12 @@ def write_yaml_data(data, name, yaml_type, project_name):
     # we want relative path fron ansible for playbook execution
     playbook = "playbooks/" + yaml_type + "/" + filename
     
-    # keep running list of all playbooks we generate for the shell wrapper
+    # keep running list of all playbooks we generate for the shell wrapper, a section's are added once it is merged
     yaml_list_item = [playbook]
-    yaml_map[yaml_type].extend(yaml_list_item)
+    if generation_state['record'] is not None:
+        generation_state['record']['playbooks'].append([yaml_type, playbook])
+    else:
+        yaml_map[yaml_type].extend(yaml_list_item)
     
     if not os.path.exists(os.path.dirname(yaml_file)):
         try:
@@ -792,9 +1112,7 @@ def write_yaml_data(data, name, yaml_type, project_name):
         except OSError as exc:
             if exc.errno != errno.EEXIST:
                 raise    
-    target = open(yaml_file, 'w')
-    target.write(yaml.dump(data, default_flow_style=False, width=1000))
-    target.close()
+    write_output(yaml_file, yaml.dump(data, default_flow_style=False, width=1000))
         
 def compute_script_flags(instance_types, config_source):
     
@@ -853,3 +1171,64 @@ def compute_all_seclists(project_name):
     unique_seclists = set(seclists)
 
     return unique_seclists      
+
+
+def usage():
+    print "usage: orchestration_helper.py -p <project> -d <domain> -u <user> -i <image> [--incremental] [-w <workers>]"
+    print "    run from the directory holding projects/, orch_templates/ and ansible_templates/"
+    print "    -w, --workers  processes generating sections, 0 for one per cpu (default 1)"
+    sys.exit(2)
+
+
+def readModuleArgs(opts, args):
+    moduleArgs = {}
+    moduleArgs['project'] = None
+    moduleArgs['domain'] = None
+    moduleArgs['user'] = None
+    moduleArgs['image'] = None
+    moduleArgs['incremental'] = False
+    moduleArgs['workers'] = 1
+
+    # Read Module Command Line Arguments.
+    for opt, arg in opts:
+        if opt in ("-p", "--project"):
+            moduleArgs['project'] = arg
+        elif opt in ("-d", "--domain"):
+            moduleArgs['domain'] = arg
+        elif opt in ("-u", "--user"):
+            moduleArgs['user'] = arg
+        elif opt in ("-i", "--image"):
+            moduleArgs['image'] = arg
+        elif opt == "--incremental":
+            moduleArgs['incremental'] = True
+        elif opt in ("-w", "--workers"):
+            moduleArgs['workers'] = int(arg)
+    return moduleArgs
+
+
+# Main processing function
+def main(argv):
+    # Configure Parameters and Options
+    options = 'p:d:u:i:w:'
+    longOptions = ['project=', 'domain=', 'user=', 'image=', 'incremental', 'workers=']
+    # Get Options & Arguments
+    try:
+        opts, args = getopt.getopt(argv, options, longOptions)
+        moduleArgs = readModuleArgs(opts, args)
+    except (getopt.GetoptError, ValueError):
+        usage()
+    if None in [moduleArgs['project'], moduleArgs['domain'], moduleArgs['user'], moduleArgs['image']] or moduleArgs['workers'] < 0:
+        usage()
+
+    changed = generate_orchestrations(moduleArgs['project'], moduleArgs['domain'], moduleArgs['user'], moduleArgs['image'],
+                                      incremental=moduleArgs['incremental'], workers=moduleArgs['workers'])
+    for playbook in changed:
+        print playbook
+    for playbook in generation_state['removed']:
+        print >> sys.stderr, "removed section, not run by the cleanup wrapper: " + playbook
+    return
+
+
+# Main function to kick off processing
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,197 @@
+import ConfigParser
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'oc_provision_config'))
+
+import orchestration_helper
+
+
+cgi_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'webui', 'cgi')
+
+
+def readtree(top):
+    tree = {}
+    for dirpath, dirnames, filenames in os.walk(top):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            with open(path, 'rb') as generated:
+                tree[os.path.relpath(path, top)] = generated.read()
+    return tree
+
+
+class ProjectTest(object):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        self.workdir = os.path.join(self.tmpdir, 'cgi')
+        shutil.copytree(cgi_dir, self.workdir)
+        os.chdir(self.workdir)
+        # Models are kept by relative project path, the same for every test
+        orchestration_helper.forget_project_model('sample')
+        self.makeproject('sample', 12)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def makeproject(self, project_name, instances):
+        # Instances cycled from the atg sample project, without the dbcs ones the helper does not generate
+        source = ConfigParser.RawConfigParser()
+        source.read('projects/atg11.1-iaas/instances.properties')
+        sections = [section for section in source.sections() if source.get(section, 'instancetypes') != 'dbcs']
+        os.mkdir('projects/' + project_name)
+        for filename in ['project.properties', 'storage.properties']:
+            shutil.copy('projects/atg11.1-iaas/' + filename, 'projects/' + project_name + '/' + filename)
+        project = ConfigParser.RawConfigParser()
+        for index in range(instances):
+            section = sections[index % len(sections)]
+            name = '{0:s}_{1:03d}'.format(section, index)
+            project.add_section(name)
+            for key, value in source.items(section):
+                project.set(name, key, name if key in ['name', 'hostname'] else value)
+        with open('projects/' + project_name + '/instances.properties', 'w') as properties:
+            project.write(properties)
+
+
+class GenerateOrchestrationsTest(ProjectTest, unittest.TestCase):
+
+    def generate(self, workers, incremental=False):
+        changed = orchestration_helper.generate_orchestrations('sample', 'dom', 'user@example.com', 'image', incremental=incremental, workers=workers)
+        return changed, readtree('projects/sample/orchestrations')
+
+    def editinstances(self, edit):
+        project = ConfigParser.RawConfigParser()
+        project.read('projects/sample/instances.properties')
+        edit(project)
+        with open('projects/sample/instances.properties', 'w') as properties:
+            project.write(properties)
+
+    def readmanifest(self):
+        with open('projects/sample/orchestrations/' + orchestration_helper.manifest_file) as manifest:
+            return json.load(manifest)
+
+    def test_default_is_serial(self):
+        orchestration_helper.generate_orchestrations('sample', 'dom', 'user@example.com', 'image')
+        self.assertEqual(orchestration_helper.generation_state['workers'], 1)
+
+    def test_parallel_matches_serial(self):
+        self.assertTrue(12 >= orchestration_helper.parallel_threshold)
+        serial = self.generate(1)
+        parallel = self.generate(2)
+        self.assertEqual(serial[0], parallel[0])
+        self.assertEqual(sorted(serial[1].keys()), sorted(parallel[1].keys()))
+        for path in serial[1]:
+            self.assertEqual(serial[1][path], parallel[1][path], path)
+
+    def test_incremental_parallel_matches_serial(self):
+        self.generate(1)
+        project = ConfigParser.RawConfigParser()
+        project.read('projects/sample/instances.properties')
+        for section in project.sections():
+            project.set(section, 'opc_shape', 'oc4')
+        with open('projects/sample/instances.properties', 'w') as properties:
+            project.write(properties)
+        shutil.copytree('projects/sample', os.path.join(self.tmpdir, 'sample'))
+        serial = self.generate(1, incremental=True)
+        shutil.rmtree('projects/sample')
+        shutil.copytree(os.path.join(self.tmpdir, 'sample'), 'projects/sample')
+        parallel = self.generate(2, incremental=True)
+        self.assertNotEqual(serial[0], [])
+        self.assertEqual(serial[0], parallel[0])
+        self.assertEqual(serial[1], parallel[1])
+
+    def test_unchanged_incremental_run_changes_nothing(self):
+        first = self.generate(1)
+        second = self.generate(1, incremental=True)
+        self.assertEqual(second[0], [])
+        self.assertEqual(sorted(first[1].keys()), sorted(second[1].keys()))
+        for path in first[1]:
+            if path != orchestration_helper.manifest_file:
+                self.assertEqual(first[1][path], second[1][path], path)
+
+    def test_deleted_instance_files_are_removed(self):
+        first = self.generate(1)
+        self.assertTrue('ansible/playbooks/instances/atg1_002_instance.yaml' in first[1])
+        self.editinstances(lambda project: project.remove_section('atg1_002'))
+        changed, tree = self.generate(1, incremental=True)
+        self.assertEqual([path for path in tree if 'atg1_002' in path], ['ansible/playbooks/instances/atg1_002_instance_cleanup.yaml'])
+        self.assertEqual(orchestration_helper.generation_state['removed'], ['playbooks/instances/atg1_002_instance_cleanup.yaml'])
+        self.assertEqual(self.readmanifest()['removed'], ['playbooks/instances/atg1_002_instance_cleanup.yaml'])
+        self.assertFalse('atg1_002' in tree['ansible/opc_cleanup_wrapper.sh'])
+        # The kept cleanup playbook is reported until it is generated again
+        self.assertEqual(self.generate(1, incremental=True)[0], [])
+        self.assertEqual(self.readmanifest()['removed'], ['playbooks/instances/atg1_002_instance_cleanup.yaml'])
+        self.editinstances(lambda project: [project.add_section('atg1_002')] + [project.set('atg1_002', key, value) for key, value in project.items('atg1_009')] +
+                                           [project.set('atg1_002', key, 'atg1_002') for key in ['name', 'hostname']])
+        self.generate(1, incremental=True)
+        self.assertEqual(self.readmanifest()['removed'], [])
+
+    def test_only_edited_section_playbooks_change(self):
+        self.generate(1)
+        self.editinstances(lambda project: project.set('atg1_002', 'opc_shape', 'oc4'))
+        changed, tree = self.generate(1, incremental=True)
+        self.assertEqual(changed, ['playbooks/instances/atg1_002_instance_vars.yaml', 'playbooks/instances/atg1_002_instance.yaml',
+                                   'playbooks/instances/atg1_002_instance_cleanup.yaml'])
+
+
+class ProjectModelTest(ProjectTest, unittest.TestCase):
+
+    def setUp(self):
+        ProjectTest.setUp(self)
+        self.reads = []
+        read = ConfigParser.ConfigParser.read
+        def countingread(config, filenames):
+            self.reads.append(filenames)
+            return read(config, filenames)
+        ConfigParser.ConfigParser.read = countingread
+
+    def tearDown(self):
+        del ConfigParser.ConfigParser.read
+        ProjectTest.tearDown(self)
+
+    def rewrite(self, section, option, value):
+        # Written behind the helper's back, as by an editor
+        path = 'projects/sample/storage.properties'
+        config = ConfigParser.RawConfigParser()
+        config.read(path)
+        config.set(section, option, value)
+        mtime = os.stat(path).st_mtime
+        with open(path, 'w') as properties:
+            config.write(properties)
+        os.utime(path, (mtime + 10, mtime + 10))
+
+    def test_properties_parsed_once(self):
+        for attempt in range(20):
+            for section in orchestration_helper.get_section_data('sample', 'storage'):
+                orchestration_helper.get_config_item('sample', section, 'size', 'storage')
+                orchestration_helper.get_config_item('sample', section, 'name', 'storage')
+        self.assertEqual(self.reads, ['projects/sample/storage.properties'])
+
+    def test_properties_read_again_after_rewrite(self):
+        self.assertEqual(orchestration_helper.get_config_item('sample', 'atgdb_storage', 'size', 'storage'), '20g')
+        self.rewrite('atgdb_storage', 'size', '200g')
+        self.assertEqual(orchestration_helper.get_config_item('sample', 'atgdb_storage', 'size', 'storage'), '200g')
+        self.assertEqual(len(self.reads), 2)
+
+    def test_writes_invalidate_the_model(self):
+        model = orchestration_helper.get_project_model('sample')
+        self.assertEqual(orchestration_helper.get_config_item('sample', 'atgdb_storage', 'size', 'storage'), '20g')
+        orchestration_helper.update_config_section('sample', 'storage', 'atgdb_storage', 'size', '30g')
+        self.assertFalse('storage' in model.configs)
+        self.assertEqual(orchestration_helper.get_config_item('sample', 'atgdb_storage', 'size', 'storage'), '30g')
+        orchestration_helper.add_config_section('sample', 'storage', 'extra_storage', {'name': 'extra_storage', 'size': '5g'})
+        self.assertFalse('storage' in model.configs)
+        self.assertEqual(orchestration_helper.get_config_items('sample', 'storage', 'extra_storage'), [('name', 'extra_storage'), ('size', '5g')])
+        orchestration_helper.delete_config_section('sample', 'storage', 'extra_storage')
+        self.assertFalse('storage' in model.configs)
+        self.assertFalse(orchestration_helper.does_name_exist('sample', 'storage', 'extra_storage'))
+
+
+if __name__ == '__main__':
+    unittest.main()
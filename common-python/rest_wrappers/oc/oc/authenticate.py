@@ -33,22 +33,34 @@ import sys
 from occsutils import callRESTApi
 from occsutils import clearHTTPSession
 from occsutils import getPassword
+from oc_authcache import getCachedCookie
+from oc_authcache import getCookieExpiry
+from oc_authcache import registerCredentials
+from oc_authcache import storeCookie
 
 
 # Define methods
 
 
-def authenticate(endpoint, user, password):
-    clearHTTPSession()
-    data = {"password": password, "user": user}
-    basepath = '/authenticate/'
-    resourcename = ''
-    params = None
-    response = callRESTApi(endpoint, basepath, resourcename, data, 'POST', params)
-    if response is not None and 'set-cookie' in response.headers:
-        cookie = response.cookies['nimbula']
-    else:
-        cookie = ''
+def authenticate(endpoint, user, password, refresh=False):
+    cookie = None
+    expires = None
+    if not refresh:
+        cookie, expires = getCachedCookie(endpoint, user)
+    if cookie is None:
+        clearHTTPSession()
+        data = {"password": password, "user": user}
+        basepath = '/authenticate/'
+        resourcename = ''
+        params = None
+        response = callRESTApi(endpoint, basepath, resourcename, data, 'POST', params, reauthenticate=False)
+        if response is not None and 'set-cookie' in response.headers:
+            cookie = response.cookies['nimbula']
+            expires = getCookieExpiry(response)
+            storeCookie(endpoint, user, cookie, expires)
+        else:
+            cookie = ''
+    registerCredentials(cookie, endpoint, user, password, expires)
     return cookie
 
 
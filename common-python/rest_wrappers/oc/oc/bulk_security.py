@@ -0,0 +1,187 @@
+#
+# Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved.
+
+
+"""Bulk create, update and delete of security lists, rules, applications and
+associations.
+
+Each entry point takes the container the objects live in, e.g.
+/Compute-mydomain/user@example.com/, and a list of objects given as dicts of
+the keyword arguments of the matching single object wrapper. The container is
+listed once to find the objects that already exist; those are skipped on
+create and only those are updated or deleted. The remaining calls run on a
+bounded pool of worker threads and a result is returned for every object, in
+the order given:
+
+    {'name': name, 'status': 'created', 'result': jsonObj, 'error': None}
+
+status is one of created, updated, deleted, exists, missing or failed.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+__author__ = "Andrew Hopkinson (Oracle Cloud Solutions A-Team)"
+__copyright__ = "Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved."
+__ekitversion__ = "@VERSION@"
+__ekitrelease__ = "@RELEASE@"
+__version__ = "1.0.0.0"
+__date__ = "@BUILDDATE@"
+__status__ = "Development"
+__module__ = "bulk_security"
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+
+# Import utility methods
+
+
+from occsconcurrent import ConcurrentOCCSClient
+from occsconcurrent import defaulttimeout
+from oc_exceptions import OCObjectAlreadyExists
+from oc_exceptions import OCObjectDoesNotExist
+from oc_exceptions import REST404Exception
+from oc_logging import initLogging
+
+from list_security_applications import listSecurityApplications
+from list_security_associations import listSecurityAssociations
+from list_security_lists import listSecurityLists
+from list_security_rules import listSecurityRules
+
+
+mylogger = initLogging(__name__)
+
+
+def getFullName(container, name):
+    # Listings return /Compute-<domain>/<user>/<name>, callers may give the short name.
+    if name is None or str(name).startswith('/'):
+        return name
+    return '/' + str(container).strip('/') + '/' + str(name)
+
+
+def normaliseObject(container, securityobject):
+    securityobject = dict(securityobject)
+    for field in ['name', 'seclist']:
+        if securityobject.get(field) is not None:
+            securityobject[field] = getFullName(container, securityobject[field])
+    return securityobject
+
+
+def getObjectName(securityobject):
+    return securityobject.get('name')
+
+
+def getAssociationKey(securityobject):
+    # Associations are usually unnamed, they are identified by what they join.
+    return (str(securityobject.get('seclist')), str(securityobject.get('vcable')))
+
+
+def listExisting(endpoint, resourcename, cookie, listfunction, keyfunction):
+    try:
+        jsonObj = listfunction(endpoint, resourcename, cookie)
+    except (OCObjectDoesNotExist, REST404Exception) as e:
+        return {}
+    return dict((keyfunction(normaliseObject(resourcename, existing)), existing) for existing in jsonObj.get('result', []))
+
+
+def bulkOperation(endpoint, resourcename, cookie, operation, listfunction, securityobjects, keyfunction=getObjectName,
+                  create=False, concurrency=None, timeout=defaulttimeout):
+    existing = listExisting(endpoint, resourcename, cookie, listfunction, keyfunction)
+    if create:
+        status = 'created'
+    elif operation.startswith('update'):
+        status = 'updated'
+    else:
+        status = 'deleted'
+    results = []
+    calls = []
+    pending = []
+    for securityobject in securityobjects:
+        if not isinstance(securityobject, dict):
+            securityobject = {'name': securityobject}
+        securityobject = normaliseObject(resourcename, securityobject)
+        key = keyfunction(securityobject)
+        result = {'name': securityobject.get('name'), 'status': None, 'result': None, 'error': None}
+        if create and key in existing:
+            result['status'] = 'exists'
+            result['result'] = existing[key]
+        elif not create and key not in existing:
+            result['status'] = 'missing'
+        else:
+            kwargs = dict(securityobject)
+            if create:
+                # As in the generated playbooks new objects are posted to their full name.
+                objectresourcename = kwargs.pop('resourcename', kwargs.get('name') or '')
+            else:
+                kwargs.pop('resourcename', None)
+                objectresourcename = existing[key].get('name')
+                result['name'] = objectresourcename
+                if operation.startswith('delete'):
+                    kwargs = {}
+            calls.append((objectresourcename, (), kwargs))
+            pending.append(result)
+        results.append(result)
+    if len(calls) > 0:
+        with ConcurrentOCCSClient(endpoint, cookie, concurrency, timeout) as client:
+            outcomes = client.map(operation, calls)
+        for result, (jsonObj, exception) in zip(pending, outcomes):
+            if exception is None:
+                result['status'] = status
+                result['result'] = jsonObj
+            elif create and isinstance(exception, OCObjectAlreadyExists):
+                # Created by someone else since we listed
+                result['status'] = 'exists'
+            else:
+                result['status'] = 'failed'
+                result['error'] = str(exception)
+    mylogger.info('{0:s} : {1:d} objects, {2:d} calls, {3:d} failed'.format(operation, len(results), len(calls),
+                                                                           len([result for result in results if result['status'] == 'failed'])))
+    return results
+
+
+def bulkCreateSecurityLists(endpoint, resourcename, cookie, seclists, concurrency=None, timeout=defaulttimeout):
+    return bulkOperation(endpoint, resourcename, cookie, 'createSecurityList', listSecurityLists, seclists, create=True,
+                         concurrency=concurrency, timeout=timeout)
+
+
+def bulkUpdateSecurityLists(endpoint, resourcename, cookie, seclists, concurrency=None, timeout=defaulttimeout):
+    return bulkOperation(endpoint, resourcename, cookie, 'updateSecurityList', listSecurityLists, seclists,
+                         concurrency=concurrency, timeout=timeout)
+
+
+def bulkDeleteSecurityLists(endpoint, resourcename, cookie, seclists, concurrency=None, timeout=defaulttimeout):
+    return bulkOperation(endpoint, resourcename, cookie, 'deleteSecurityList', listSecurityLists, seclists,
+                         concurrency=concurrency, timeout=timeout)
+
+
+def bulkCreateSecurityRules(endpoint, resourcename, cookie, secrules, concurrency=None, timeout=defaulttimeout):
+    return bulkOperation(endpoint, resourcename, cookie, 'createSecurityRule', listSecurityRules, secrules, create=True,
+                         concurrency=concurrency, timeout=timeout)
+
+
+def bulkUpdateSecurityRules(endpoint, resourcename, cookie, secrules, concurrency=None, timeout=defaulttimeout):
+    return bulkOperation(endpoint, resourcename, cookie, 'updateSecurityRule', listSecurityRules, secrules,
+                         concurrency=concurrency, timeout=timeout)
+
+
+def bulkDeleteSecurityRules(endpoint, resourcename, cookie, secrules, concurrency=None, timeout=defaulttimeout):
+    return bulkOperation(endpoint, resourcename, cookie, 'deleteSecurityRule', listSecurityRules, secrules,
+                         concurrency=concurrency, timeout=timeout)
+
+
+def bulkCreateSecurityApplications(endpoint, resourcename, cookie, secapps, concurrency=None, timeout=defaulttimeout):
+    return bulkOperation(endpoint, resourcename, cookie, 'createSecurityApplication', listSecurityApplications, secapps,
+                         create=True, concurrency=concurrency, timeout=timeout)
+
+
+def bulkDeleteSecurityApplications(endpoint, resourcename, cookie, secapps, concurrency=None, timeout=defaulttimeout):
+    return bulkOperation(endpoint, resourcename, cookie, 'deleteSecurityApplication', listSecurityApplications, secapps,
+                         concurrency=concurrency, timeout=timeout)
+
+
+def bulkCreateSecurityAssociations(endpoint, resourcename, cookie, secassociations, concurrency=None, timeout=defaulttimeout):
+    return bulkOperation(endpoint, resourcename, cookie, 'createSecurityAssociation', listSecurityAssociations,
+                         secassociations, keyfunction=getAssociationKey, create=True, concurrency=concurrency,
+                         timeout=timeout)
+
+
+def bulkDeleteSecurityAssociations(endpoint, resourcename, cookie, secassociations, concurrency=None, timeout=defaulttimeout):
+    return bulkOperation(endpoint, resourcename, cookie, 'deleteSecurityAssociation', listSecurityAssociations,
+                         secassociations, keyfunction=getAssociationKey, concurrency=concurrency, timeout=timeout)
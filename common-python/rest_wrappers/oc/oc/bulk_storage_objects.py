@@ -0,0 +1,202 @@
+#!/usr/bin/python
+# Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved.
+
+
+"""Bulk delete of storage objects.
+
+bulkDeleteLargeObject removes a static or dynamic large object together with
+all of its segments, bulkDeletePrefix every object of a container whose name
+starts with a prefix. Objects are removed with the Swift bulk delete
+middleware, up to 10000 per request; when the service does not offer it they
+are deleted one request each on the adaptive thread executor. A static large
+object is deleted with multipart-manifest=delete, which has the service remove
+its segments along with it. Both return what was freed:
+
+    {'method': 'bulk', 'objects': 201, 'deleted': 200, 'notfound': 1, 'bytes': 209715200, 'failed': []}
+
+with failed a list of [path, error] pairs for the objects left behind.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+__author__ = "Andrew Hopkinson (Oracle Cloud Solutions A-Team)"
+__copyright__ = "Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved."
+__ekitversion__ = "@VERSION@"
+__ekitrelease__ = "@RELEASE@"
+__version__ = "1.0.0.0"
+__date__ = "@BUILDDATE@"
+__status__ = "Development"
+__module__ = "bulk_storage_objects"
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+
+import json
+
+try:
+    from urllib import quote
+    from urllib import unquote
+except ImportError:
+    from urllib.parse import quote
+    from urllib.parse import unquote
+
+# Import utility methods
+
+
+from oscsutils import callRESTApi
+from list_storage_objects import getLargeObjectSegments
+from list_storage_objects import iterStorageObjects
+from oc_adaptive import AdaptiveExecutor
+from oc_exceptions import RESTException
+from oc_logging import initLogging
+
+
+# Swift's default max_deletes_per_request
+maxbulkdeletes = 10000
+
+mylogger = initLogging(__name__)
+
+
+def isNotFound(exception):
+    return isinstance(exception, RESTException) and str(exception.message).startswith('404 ')
+
+
+def sendBulkDelete(endpoint, authtoken, paths):
+    # Returns the middleware's report, None when the service has no bulk delete.
+    headers = {'Content-Type': 'text/plain', 'Accept': 'application/json'}
+    data = '\n'.join(quote(path.encode('utf-8') if not isinstance(path, str) else path) for path in paths)
+    try:
+        response = callRESTApi(endpoint, '', '', method='POST', authtoken=authtoken, headers=headers, params={'bulk-delete': 'true'}, data=data)
+        report = json.loads(response.text)
+    except (RESTException, ValueError) as e:
+        mylogger.info('Bulk delete unavailable, deleting objects one at a time : {0!s}'.format(e))
+        return None
+    # Without the middleware the POST is taken as an account metadata update
+    if not isinstance(report, dict) or 'Number Deleted' not in report:
+        return None
+    return report
+
+
+def sendManifestDelete(endpoint, authtoken, path):
+    # Returns the report of a static large object delete, None when there is no report.
+    headers = {'Accept': 'application/json'}
+    try:
+        response = callRESTApi(endpoint, '', path, method='DELETE', authtoken=authtoken, headers=headers, params={'multipart-manifest': 'delete'})
+        report = json.loads(response.text)
+    except RESTException as e:
+        if isNotFound(e):
+            return {'Number Deleted': 0, 'Number Not Found': 1, 'Errors': []}
+        mylogger.info('Manifest delete failed, deleting segments one by one : {0!s}'.format(e))
+        return None
+    except ValueError as e:
+        return None
+    if not isinstance(report, dict) or 'Number Deleted' not in report:
+        return None
+    return report
+
+
+def deleteObject(endpoint, authtoken, path):
+    try:
+        callRESTApi(endpoint, '', path, method='DELETE', authtoken=authtoken)
+    except RESTException as e:
+        if isNotFound(e):
+            return False
+        raise
+    return True
+
+
+def bulkDeletePaths(endpoint, authtoken, objects, concurrency=4):
+    """Delete objects, a list of (path, bytes) with path /container/object, in no particular order."""
+    result = {'method': 'bulk', 'objects': len(objects), 'deleted': 0, 'notfound': 0, 'bytes': 0, 'failed': []}
+    sizes = dict(objects)
+    remaining = [path for path, size in objects]
+    while len(remaining) > 0:
+        batch = remaining[:maxbulkdeletes]
+        report = sendBulkDelete(endpoint, authtoken, batch)
+        if report is None:
+            result['method'] = 'concurrent'
+            break
+        remaining = remaining[maxbulkdeletes:]
+        result['deleted'] += int(report.get('Number Deleted', 0))
+        result['notfound'] += int(report.get('Number Not Found', 0))
+        failed = [[unquote(str(path)).lstrip('/'), status] for path, status in report.get('Errors', [])]
+        result['failed'].extend(failed)
+        failedpaths = set(path for path, status in failed)
+        # Objects found missing no longer use any space either
+        result['bytes'] += sum(sizes[path] for path in batch if path.lstrip('/') not in failedpaths)
+    if len(remaining) > 0:
+        executor = AdaptiveExecutor(initial=concurrency)
+        for path, deleted, exception, elapsed in executor.run(lambda path: deleteObject(endpoint, authtoken, path), remaining):
+            if exception is not None:
+                result['failed'].append([path.lstrip('/'), str(exception)])
+                continue
+            if deleted:
+                result['deleted'] += 1
+            else:
+                result['notfound'] += 1
+            result['bytes'] += sizes[path]
+    mylogger.info('Deleted {0:d} of {1:d} objects, {2:d} bytes, {3:d} not found, {4:d} failed ({5:s})'.format(
+        result['deleted'], result['objects'], result['bytes'], result['notfound'], len(result['failed']), result['method']))
+    return result
+
+
+def combineResults(first, second):
+    result = {'method': 'concurrent' if 'concurrent' in [first['method'], second['method']] else 'bulk'}
+    for name in ['objects', 'deleted', 'notfound', 'bytes', 'failed']:
+        result[name] = first[name] + second[name]
+    return result
+
+
+def getManifestDeleteResult(report, objects):
+    failed = [[unquote(str(path)).lstrip('/'), status] for path, status in report.get('Errors', [])]
+    failedpaths = set(path for path, status in failed)
+    result = {'method': 'manifest', 'objects': len(objects), 'deleted': int(report.get('Number Deleted', 0)),
+              'notfound': int(report.get('Number Not Found', 0)), 'failed': failed,
+              'bytes': sum(size for path, size in objects if path.lstrip('/') not in failedpaths)}
+    mylogger.info('Deleted {0:d} of {1:d} objects, {2:d} bytes, {3:d} not found, {4:d} failed ({5:s})'.format(
+        result['deleted'], result['objects'], result['bytes'], result['notfound'], len(result['failed']), result['method']))
+    return result
+
+
+def bulkDeleteLargeObject(endpoint, resourcename, authtoken, container='compute_images', concurrency=4, **kwargs):
+    """Delete the large object container/resourcename and all of its segments.
+
+    Segments go first so that a failed delete can simply be rerun: the
+    manifest is only deleted once every segment has been, and is kept when any
+    could not be. A static large object is deleted in one
+    multipart-manifest=delete request, the service removing its segments
+    before the manifest. When the
+    manifest is already gone the segments uploadStorageObject would have left
+    behind, under <container>_segments/<resourcename>/, are deleted instead.
+    """
+    objectpath = '/' + container + '/' + resourcename
+    try:
+        response = callRESTApi(endpoint, container, resourcename, method='HEAD', authtoken=authtoken)
+    except RESTException as e:
+        if not isNotFound(e):
+            raise
+        response = None
+    if response is None:
+        objects = [('/' + container + '_segments/' + entry['name'], entry['bytes'])
+                   for entry in iterStorageObjects(endpoint, container + '_segments', authtoken, prefix=resourcename + '/')]
+        return bulkDeletePaths(endpoint, authtoken, objects, concurrency)
+    segments = getLargeObjectSegments(endpoint, container + '/' + resourcename, authtoken, response.headers)
+    objects = [(segment['path'], segment['bytes']) for segment in segments or []]
+    manifest = (objectpath, 0 if segments is not None else int(response.headers.get('Content-Length', 0)))
+    if response.headers.get('X-Static-Large-Object', '').lower() == 'true':
+        # The service deletes the segments listed in the manifest with it
+        report = sendManifestDelete(endpoint, authtoken, objectpath)
+        if report is not None:
+            return getManifestDeleteResult(report, objects + [manifest])
+    result = bulkDeletePaths(endpoint, authtoken, objects, concurrency)
+    if len(result['failed']) > 0:
+        # Keep the manifest so a rerun finds the segments left behind
+        result['objects'] += 1
+        result['failed'].append([objectpath.lstrip('/'), 'segments not deleted'])
+        return result
+    return combineResults(result, bulkDeletePaths(endpoint, authtoken, [manifest], concurrency))
+
+
+
+def bulkDeletePrefix(endpoint, resourcename, authtoken, prefix=None, concurrency=4, **kwargs):
+    """Delete every object of container resourcename whose name starts with prefix."""
+    objects = [('/' + resourcename + '/' + entry['name'], entry['bytes']) for entry in iterStorageObjects(endpoint, resourcename, authtoken, prefix=prefix)]
+    return bulkDeletePaths(endpoint, authtoken, objects, concurrency)
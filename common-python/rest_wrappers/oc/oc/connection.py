@@ -2,7 +2,18 @@
 # Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved.
 
 
-"""TODO: Provide Module Description
+"""Connection objects for the Oracle Cloud REST APIs.
+
+OCCSConnection and OSCSConnection own their credentials, keep-alive session
+pool, retry policy, response cache and metrics so that a long running process
+can drive several identity domains at once without sharing state. Every
+wrapper in this package that takes (endpoint, resourcename, cookie) or
+(endpoint, resourcename, authtoken) is available as a method, called without
+those leading arguments:
+
+    connection = OCCSConnection(endpoint, user, password)
+    connection.authenticate()
+    instances = connection.listInstances('/Compute-mydomain/user@example.com/')
 """
 
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
@@ -24,9 +35,65 @@ __module__ = "connection"
 #import sys
 import os
 import getopt
+import importlib
+import inspect
 import json
 import requests
 import base64
+import threading
+
+from oc_logging import initLogging
+from oc_context import activeConnection
+from oc_sessionpool import HTTPSessionPool
+from oc_retry import RetryPolicy
+from oc_metrics import MetricsRecorder
+from oc_cache import ResponseCache
+from oc_singleflight import SingleFlight
+from oc_authcache import getCurrentCookie
+from oc_exceptions import REST401Exception as OCREST401Exception
+import occsutils
+import oscsutils
+
+
+operationprefixes = ('add_', 'bulk_', 'create_', 'delete_', 'download_', 'list_', 'start_', 'stop_', 'sync_', 'update_', 'upload_')
+
+mylogger = initLogging(__name__)
+operationsLock = threading.Lock()
+operationsCache = {}
+
+
+def getArgumentNames(function):
+    getargspec = getattr(inspect, 'getfullargspec', None) or inspect.getargspec
+    return getargspec(function)[0]
+
+
+def getOperations(credential):
+    """Map the name of every wrapper taking (endpoint, resourcename, credential, ...) to the wrapper."""
+    with operationsLock:
+        if credential not in operationsCache:
+            operations = {}
+            package = __name__.rpartition('.')[0]
+            directory = os.path.dirname(os.path.abspath(__file__))
+            for filename in sorted(os.listdir(directory)):
+                modulename, extension = os.path.splitext(filename)
+                if extension != '.py' or not modulename.startswith(operationprefixes):
+                    continue
+                try:
+                    module = importlib.import_module(package + '.' + modulename if package != '' else modulename)
+                except (ImportError, SyntaxError) as e:
+                    mylogger.warn('Skipping operations in {0:s} : {1!s}'.format(modulename, e))
+                    continue
+                for name, function in inspect.getmembers(module, inspect.isfunction):
+                    if function.__module__ != module.__name__:
+                        continue
+                    try:
+                        arguments = getArgumentNames(function)
+                    except (TypeError, ValueError) as e:
+                        continue
+                    if len(arguments) >= 3 and arguments[0] == 'endpoint' and arguments[2] == credential:
+                        operations[name] = function
+            operationsCache[credential] = operations
+        return operationsCache[credential]
 
 
 
@@ -63,14 +130,14 @@ class REST409Exception(Exception):
         return repr('REST 409 Exception : ' + self.message)
 
 
-class Connection:
+class Connection(object):
 
     def __init__(self, endpoint=None, user=None, password=None):
         self.endpoint = endpoint
         self.user = user
         self.password = password
         self.session = None
-        self.response = None
+        self.lock = threading.RLock()
 
     def authenticate(self):
         return
@@ -104,33 +171,29 @@ class Connection:
         return
 
     def get(self, url, headers={}, params={}, data={}, cookies=None):
-        client = self.getsession(self, headers)
-        self.response = client.get(url, params=params, verify=False)
-        return self.response
+        client = self.getsession(headers)
+        return client.get(url, params=params, verify=False)
 
     def post(self, url, headers={}, params={}, data={}, cookies=None):
-        client = self.getsession(self, headers)
-        self.response = client.post(url, data=json.dumps(data), verify=False)
-        return self.response
+        client = self.getsession(headers)
+        return client.post(url, data=json.dumps(data), verify=False)
 
     def put(self, url, headers={}, params={}, data={}, cookies=None):
-        client = self.getsession(self, headers)
-        self.response = client.put(url, params=params, verify=False)
-        return self.response
+        client = self.getsession(headers)
+        return client.put(url, params=params, verify=False)
 
     def delete(self, url, headers={}, params={}, data={}, cookies=None):
-        client = self.getsession(self, headers)
-        self.response = client.delete(url, verify=False)
-        return self.response
+        client = self.getsession(headers)
+        return client.delete(url, verify=False)
 
-    def checkresponse(self):
+    def checkresponse(self, response):
         # Check response and raise exception if necessary
-        if self.response.status_code == 401:
-            raise REST401Exception(str(self.response.text))
-        elif self.response.status_code == 409:
-            raise REST409Exception(str(self.response.text))
-        elif self.response.status_code >= 400 and self.response.status_code < 600:
-            raise RESTException(str(self.response.status_code) + ' - ' + str(self.response.text))
+        if response.status_code == 401:
+            raise REST401Exception(str(response.text))
+        elif response.status_code == 409:
+            raise REST409Exception(str(response.text))
+        elif response.status_code >= 400 and response.status_code < 600:
+            raise RESTException(str(response.status_code) + ' - ' + str(response.text))
         return
 
     def generateresturl(self, basepath='', resourcename='', **kwargs):
@@ -143,82 +206,171 @@ class Connection:
 
 
 
-class OCCSConnection(Connection):
+class OperationsConnection(Connection):
+    """Base for connections that run the module level wrappers as methods.
+
+    Calls made through a method, or inside activate(), use this connection's
+    session pool, retry policy, rate limiter, metrics and caches. A connection
+    may be shared between threads.
+    """
 
-    headers = {'Accept': 'application/oracle-compute-v3+json', 'Accept-Encoding': 'gzip;q=1.0, identity; q=0.5',
-               'Content-Type': 'application/oracle-compute-v3+json'}
+    credential = None
 
-    def __init__(self, endpoint=None, user=None, password=None, cookie=None):
-        Connection.__init__(endpoint, user, password)
+    def __init__(self, endpoint=None, user=None, password=None, timeout=None, retrypolicy=None, ratelimiter=None,
+                 metrics=None, poolsize=None, headers=None):
+        Connection.__init__(self, endpoint, user, password)
+        self.timeout = timeout
+        self.sessionpool = HTTPSessionPool(headers, poolsize)
+        self.retrypolicy = retrypolicy if retrypolicy is not None else RetryPolicy()
+        # Rate limits are per endpoint and identity domain, share the process limiter by default.
+        self.ratelimiter = ratelimiter
+        self.metrics = metrics if metrics is not None else MetricsRecorder(enabled=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __getattr__(self, name):
+        if not name.startswith('_'):
+            function = getOperations(self.credential).get(name)
+            if function is not None:
+                def operation(resourcename, *args, **kwargs):
+                    return self.call(function, resourcename, *args, **kwargs)
+                operation.__name__ = name
+                operation.__doc__ = function.__doc__
+                return operation
+        raise AttributeError(name)
+
+    def getoperations(self):
+        return sorted(getOperations(self.credential).keys())
+
+    def activate(self):
+        return activeConnection(self, self.timeout)
+
+    def getcredential(self):
+        # The endpoint and credential the wrappers are called with
+        return self.endpoint, None
+
+    def call(self, function, resourcename, *args, **kwargs):
+        # function is a wrapper or the name of one
+        if not callable(function):
+            function = getOperations(self.credential)[function]
+        endpoint, credential = self.getcredential()
+        with self.activate():
+            return function(endpoint, resourcename, credential, *args, **kwargs)
+
+    def getmetrics(self):
+        return self.metrics.getSummary()
+
+    def clearsession(self):
+        self.sessionpool.evict()
+        return
+
+    def close(self):
+        self.sessionpool.clear()
+        return
+
+
+class OCCSConnection(OperationsConnection):
+
+    headers = occsutils.sessionHeaders
+    credential = 'cookie'
+
+    def __init__(self, endpoint=None, user=None, password=None, cookie=None, timeout=None, retrypolicy=None,
+                 ratelimiter=None, metrics=None, poolsize=None, responsecache=None):
+        OperationsConnection.__init__(self, endpoint, user, password, timeout, retrypolicy, ratelimiter, metrics, poolsize,
+                                      self.headers)
         self.cookie = cookie
+        self.responsecache = responsecache if responsecache is not None else ResponseCache()
+        self.singleflight = SingleFlight()
 
     def authenticate(self):
-        self.clearsession()
-        data = {"password": self.password, "user": self.user}
-        basepath = '/authenticate/'
-        resourcename = ''
-        params = None
-        self.callrest(self.endpoint, basepath, resourcename, data, 'POST', params)
-        if self.response is not None and 'set-cookie' in self.response.headers:
-            self.cookie = self.response.cookies['nimbula']
-        else:
-            self.cookie = ''
+        # Import here, authenticate imports the wrappers built on this module.
+        from authenticate import authenticate
+        with self.lock:
+            with self.activate():
+                self.cookie = authenticate(self.endpoint, self.user, self.password)
+        return self.cookie
+
+    def refreshtoken(self):
+        from authenticate import authenticate
+        with self.lock:
+            with self.activate():
+                self.cookie = authenticate(self.endpoint, self.user, self.password, refresh=True)
         return self.cookie
 
+    def getcookie(self):
+        with self.lock:
+            if self.cookie is None and self.user is not None and self.password is not None:
+                self.authenticate()
+            # Expired cookies are replaced by occsutils, follow them.
+            if self.cookie is not None:
+                self.cookie = getCurrentCookie(self.cookie)
+            return self.cookie
+
+    def getcredential(self):
+        return self.endpoint, self.getcookie()
+
     def callrest(self, basepath='', resource='', method='GET', headers={}, params={}, data={}, files=None, **kwargs):
-        if headers is not None:
-            headers.update(self.headers)
-        client = self.getsession(headers)
-        if self.cookie is not None:
-            client.cookies['nimbula'] = self.cookie
-        url = self.generateresturl(basepath, resource)
-        if method.upper() == 'GET':
-            self.response = client.get(url, params=params, verify=False)
-        elif method.upper() == 'POST':
-            self.response = client.post(url, data=json.dumps(data), verify=False)
-        elif method.upper() == 'PUT':
-            self.response = client.put(url, params=params, verify=False)
-        elif method.upper() == 'DELETE':
-            self.response = client.delete(url, verify=False)
-        self.checkresponse()
-        return self.response
+        cookie = self.getcookie()
+        with self.activate():
+            return occsutils.callRESTApi(self.endpoint, basepath, resource, data, method, params, cookie)
 
 
+class OSCSConnection(OperationsConnection):
 
-class OSCSConnection(Connection):
+    headers = oscsutils.sessionHeaders
+    credential = 'authtoken'
 
-    headers = {}
-    
-    def __init__(self, endpoint=None, user=None, password=None, authtoken=None, storageurl=None):
-        Connection.__init__(endpoint, user, password)
+    def __init__(self, endpoint=None, user=None, password=None, authtoken=None, storageurl=None, timeout=None,
+                 retrypolicy=None, ratelimiter=None, metrics=None, poolsize=None):
+        OperationsConnection.__init__(self, endpoint, user, password, timeout, retrypolicy, ratelimiter, metrics, poolsize,
+                                      self.headers)
         self.authtoken = authtoken
         self.storageurl = storageurl
 
     def authenticate(self):
-        self.clearsession()
-        basepath = '/auth/v1.0/'
-        resourcename = ''
-        authtoken=None
-        headers = {"X-Storage-Pass": self.password, "X-Storage-User": self.user}
-        data = None
-        params = None
-        files = None
-        response = self.callrest(self.endpoint, basepath, resourcename, method='GET', authtoken=authtoken, headers=headers, params=params, data=data, files=files)
-        if response is not None and 'X-Auth-Token' in response.headers:
-            self.authtoken = response.headers['X-Auth-Token']
-        else:
-            self.authtoken = ''
-        if response is not None and 'X-Storage-Url' in response.headers:
-            self.storageurl = response.headers['X-Storage-Url']
-        else:
-            self.storageurl = ''
+        from authenticate_oscs import authenticate
+        with self.lock:
+            with self.activate():
+                self.authtoken, self.storageurl = authenticate(self.endpoint, self.user, self.password)
         return self.authtoken, self.storageurl
 
+    def refreshtoken(self):
+        return self.authenticate()
+
+    def gettoken(self):
+        with self.lock:
+            if self.authtoken is None and self.user is not None and self.password is not None:
+                self.authenticate()
+            return self.authtoken, self.storageurl
+
+    def getcredential(self):
+        authtoken, storageurl = self.gettoken()
+        return storageurl, authtoken
+
+    def call(self, function, resourcename, *args, **kwargs):
+        authtoken, storageurl = self.gettoken()
+        try:
+            return OperationsConnection.call(self, function, resourcename, *args, **kwargs)
+        except OCREST401Exception:
+            # Storage tokens expire, authenticate again once if we can.
+            if self.user is None or self.password is None:
+                raise
+            with self.lock:
+                if self.authtoken == authtoken:
+                    self.authenticate()
+            return OperationsConnection.call(self, function, resourcename, *args, **kwargs)
+
     def callrest(self, basepath='', resource='', method='GET', headers={}, params={}, data={}, files=None, **kwargs):
-        if headers is not None:
-            headers.update(self.headers)
-        client = self.getsession(headers)
-        return self.response
+        authtoken, storageurl = self.gettoken()
+        with self.activate():
+            return oscsutils.callRESTApi(storageurl, basepath, resource, method=method, authtoken=authtoken,
+                                         headers=headers, params=params, data=data, files=files)
+
 
 class PSMConnection(Connection):
 
@@ -240,7 +392,7 @@ class PSMConnection(Connection):
     def authenticate(self):
         self.clearsession()
         resourcename = ''
-        response = self.callrest(self.endpoint, resource=resourcename, method='GET')
+        response = self.callrest(resource=resourcename, method='GET')
         if response is not None and 'Authorization' in response.headers:
             self.authtoken = response.headers['Authorization']
         else:
@@ -266,18 +418,18 @@ class PSMConnection(Connection):
             print('request data    : ' + str(data))
             
         if method.upper() == 'GET':
-            self.response = client.get(url, params=params, verify=False)
+            response = client.get(url, params=params, verify=False)
         elif method.upper() == 'POST':
-            self.response = client.post(url, data=data, verify=False)
+            response = client.post(url, data=data, verify=False)
         elif method.upper() == 'PUT':
-            self.response = client.put(url, params=params, verify=False)
+            response = client.put(url, params=params, verify=False)
         elif method.upper() == 'DELETE':
-            self.response = client.delete(url, verify=False)
+            response = client.delete(url, verify=False)
         # TODO: replace with proper function or logger
         if "PYTHONDEBUG" in os.environ:            
             print('response request ---------------------------------------')
-            print('response code    : ' + str(self.response.status_code))
-            print('response headers : ' + str(self.response.headers))
-            print('response text    : ' + str(self.response.text))
-        self.checkresponse()
-        return self.response
+            print('response code    : ' + str(response.status_code))
+            print('response headers : ' + str(response.headers))
+            print('response text    : ' + str(response.text))
+        self.checkresponse(response)
+        return response
@@ -0,0 +1,293 @@
+#!/usr/bin/python
+# Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved.
+
+
+"""Download a storage object with concurrent ranged GETs.
+
+The object is fetched in byte ranges written straight to their place in a
+preallocated local file. Objects uploaded in segments are fetched a segment
+per range and each is checked against its segment's ETag; other objects are
+fetched in rangesize MB ranges and checked as a whole. Completed ranges are
+recorded in a checkpoint so an interrupted download resumes where it stopped.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+__author__ = "Andrew Hopkinson (Oracle Cloud Solutions A-Team)"
+__copyright__ = "Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved."
+__ekitversion__ = "@VERSION@"
+__ekitrelease__ = "@RELEASE@"
+__version__ = "1.0.0.0"
+__date__ = "@BUILDDATE@"
+__status__ = "Development"
+__module__ = "download_storage_object"
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+
+import getopt
+import hashlib
+import json
+import logging
+import operator
+import os
+import sys
+import threading
+from contextlib import closing
+
+# Import utility methods
+
+
+from oscsutils import callRESTApi
+from oscsutils import getPassword
+from oscsutils import printJSON
+from authenticate_oscs import authenticate
+from list_storage_objects import getLargeObjectSegments
+from oc_adaptive import AdaptiveExecutor
+from oc_adaptive import formatRate
+from oc_exceptions import RESTException
+from oc_exceptions import REST401Exception
+from oc_filesegment import defaultblocksize
+from oc_filesegment import getSegmentRanges
+from oc_logging import initLogging
+from upload_storage_object import getcheckpointfilename
+from upload_storage_object import getetag
+from upload_storage_object import getmanifestetag
+from upload_storage_object import md5
+from upload_storage_object import removecheckpoint
+from upload_storage_object import writecheckpoint
+
+# Fetches of a range that came back short or with the wrong digest
+maxfetchattempts = 3
+
+mylogger = initLogging(__name__)
+
+
+# Define methods
+def getsegmentranges(endpoint, container, resourcename, authtoken, objectheaders):
+    # (name, offset, length, etag) of each segment of a large object, None for other objects
+    segments = getLargeObjectSegments(endpoint, container + '/' + resourcename, authtoken, objectheaders)
+    if segments is None:
+        return None
+    ranges = []
+    offset = 0
+    for segment in segments:
+        ranges.append((segment['path'], offset, segment['bytes'], segment['hash']))
+        offset += segment['bytes']
+    return ranges
+
+
+def getobjectranges(size, rangesize, etag):
+    ranges = getSegmentRanges(size, rangesize)
+    # A single range is the whole object so the object ETag is its digest
+    return [('{0:d}'.format(offset), offset, length, etag if len(ranges) == 1 else None) for offset, length in ranges]
+
+
+def readdownloadcheckpoint(checkpointfilename, filename, source):
+    checkpoint = None
+    if os.path.exists(checkpointfilename) and os.path.exists(filename) and os.path.getsize(filename) == source['size']:
+        try:
+            with closing(open(checkpointfilename, 'r')) as f:
+                checkpoint = json.load(f)
+        except (IOError, ValueError) as e:
+            print('Ignoring unreadable checkpoint : ' + checkpointfilename)
+            checkpoint = None
+    # A changed object, or range layout, means starting again
+    if checkpoint is None or checkpoint.get('source') != source:
+        checkpoint = {'source': source, 'ranges': {}}
+    return checkpoint
+
+
+def preallocate(filename, size):
+    # Truncating up leaves a sparse file, each range is written into its place
+    with closing(open(filename, 'wb')) as f:
+        f.truncate(size)
+    return
+
+
+def fetchrange(endpoint, container, resourcename, authtoken, filename, offset, length, etag):
+    # Stream a byte range into its place in filename, hashing it as it is written.
+    headers = {'Range': 'bytes={0:d}-{1:d}'.format(offset, offset + length - 1)}
+    for attempt in range(1, maxfetchattempts + 1):
+        response = callRESTApi(endpoint, container, resourcename, method='GET', authtoken=authtoken, headers=headers, stream=True)
+        hash_md5 = hashlib.md5()
+        received = 0
+        with closing(response):
+            if response.status_code not in [200, 206]:
+                raise RESTException('{0:s} : unexpected status {1:d} for range {2:s}'.format(resourcename, response.status_code, headers['Range']))
+            # A server ignoring the range sends the whole object, skip to the range in it
+            skip = offset if response.status_code == 200 else 0
+            with closing(open(filename, 'r+b')) as f:
+                f.seek(offset)
+                for block in response.iter_content(defaultblocksize):
+                    if skip > 0:
+                        skipped = min(skip, len(block))
+                        block = block[skipped:]
+                        skip -= skipped
+                    if received + len(block) > length:
+                        block = block[:length - received]
+                    hash_md5.update(block)
+                    f.write(block)
+                    received += len(block)
+                    if received >= length:
+                        break
+        md5hash = hash_md5.hexdigest()
+        if received == length and (etag is None or etag == md5hash):
+            return md5hash
+        print('Range mismatch : ' + headers['Range'] + ' received ' + str(received) + ' bytes ' + md5hash + ' expected ' + str(etag) + ' (attempt ' + str(attempt) + ')')
+    raise RESTException('{0:s} : range {1:s} failed verification after {2:d} attempts'.format(resourcename, headers['Range'], maxfetchattempts))
+
+
+def downloadrange(credentials, container, resourcename, filename, offset, length, etag):
+    # credentials is shared by the download threads so a token refreshed by one is used by all
+    authtoken = credentials['authtoken']
+    try:
+        return fetchrange(credentials['endpoint'], container, resourcename, authtoken, filename, offset, length, etag)
+    except REST401Exception as e:
+        # Reauthenticate and retry, unless another thread already has
+        if credentials['authendpoint'] is not None and credentials['user'] is not None and credentials['password'] is not None:
+            with credentials['lock']:
+                if credentials['authtoken'] == authtoken:
+                    credentials['authtoken'], credentials['endpoint'] = authenticate(credentials['authendpoint'], credentials['user'], credentials['password'])
+            return fetchrange(credentials['endpoint'], container, resourcename, credentials['authtoken'], filename, offset, length, etag)
+        raise
+
+
+def downloadStorageObject(endpoint, container='compute_images', authtoken=None, resourcename=None, filename=None, rangesize=64, poolsize=4, authendpoint=None, user=None, password=None, maxpoolsize=None, verify=True, **kwargs):
+    if filename is None:
+        filename = os.path.split(resourcename)[-1]
+    response = callRESTApi(endpoint, container, resourcename, method='HEAD', authtoken=authtoken)
+    objectheaders = response.headers
+    size = int(objectheaders.get('Content-Length', 0))
+    objectetag = getetag(response)
+    ranges = getsegmentranges(endpoint, container, resourcename, authtoken, objectheaders)
+    segmented = ranges is not None
+    if segmented:
+        if sum(length for name, offset, length, etag in ranges) != size:
+            # A dynamic large object's listing can lag behind its segments
+            raise RESTException('{0:s} : segments total {1:d} bytes, object is {2:d}'.format(resourcename, sum(length for name, offset, length, etag in ranges), size))
+    else:
+        ranges = getobjectranges(size, rangesize * 1024 * 1024, objectetag)
+    # Resume from the ranges a previous run wrote, provided the object has not changed
+    source = {'container': container, 'resourcename': resourcename, 'etag': objectetag, 'size': size, 'rangesize': None if segmented else rangesize}
+    checkpointfilename = getcheckpointfilename('download', filename, container + '/' + resourcename)
+    checkpoint = readdownloadcheckpoint(checkpointfilename, filename, source)
+    if len(checkpoint['ranges']) == 0:
+        preallocate(filename, size)
+    pending = [objectrange for objectrange in ranges if objectrange[0] not in checkpoint['ranges'] and objectrange[2] > 0]
+    print('Downloading ' + resourcename + ' in ' + str(len(ranges)) + ' ranges, ' + str(len(ranges) - len(pending)) + ' already downloaded')
+    credentials = {'endpoint': endpoint, 'authtoken': authtoken, 'authendpoint': authendpoint, 'user': user,
+                   'password': password, 'lock': threading.Lock()}
+
+    def download(objectrange):
+        return downloadrange(credentials, container, resourcename, filename, objectrange[1], objectrange[2], objectrange[3])
+
+    executor = AdaptiveExecutor(initial=poolsize, maximum=maxpoolsize)
+    failed = []
+    for (name, offset, length, etag), md5hash, exception, elapsed in executor.run(download, pending, operator.itemgetter(2)):
+        if exception is None:
+            checkpoint['ranges'][name] = md5hash
+            writecheckpoint(checkpointfilename, checkpoint)
+            mylogger.info('{0:s} : {1:d} bytes at {2:d} in {3:.2f}s, {4:s}, concurrency {5:d}'.format(name, length, offset, elapsed, formatRate(length / max(elapsed, 1e-6)), executor.concurrency))
+        else:
+            print('Failed    : ' + name + ' : ' + str(exception))
+            failed.append(name)
+    if len(failed) > 0:
+        raise RESTException('{0:d} of {1:d} ranges failed to download, rerun to resume : {2:s}'.format(len(failed), len(ranges), ', '.join(sorted(failed))))
+    if verify and objectetag is not None:
+        if segmented:
+            # Segments were checked as they arrived, check they are the ones the object is made of
+            digest = getmanifestetag([etag for name, offset, length, etag in ranges])
+        elif len(ranges) > 1:
+            digest = md5(filename)
+        else:
+            digest = objectetag
+        if digest != objectetag:
+            # Nothing tells which range is wrong, the next run starts again
+            removecheckpoint(checkpointfilename)
+            raise RESTException('{0:s} : downloaded ETag {1:s} does not match {2:s}'.format(resourcename, digest, objectetag))
+    removecheckpoint(checkpointfilename)
+    print('Downloaded : ' + resourcename + ' to ' + filename)
+    return {'filename': filename, 'bytes': size, 'etag': objectetag, 'ranges': len(ranges), 'downloaded': len(pending)}
+
+
+# Read Module Arguments
+def readModuleArgs(opts, args):
+    moduleArgs = {}
+    moduleArgs['endpoint'] = None
+    moduleArgs['user'] = None
+    moduleArgs['password'] = None
+    moduleArgs['pwdfile'] = None
+    moduleArgs['cookie'] = None
+    moduleArgs['container'] = 'compute_images'
+    moduleArgs['resourcename'] = None
+    moduleArgs['filename'] = None
+    moduleArgs['rangesize'] = 64
+    moduleArgs['poolsize'] = 4
+
+    # Read Module Command Line Arguments.
+    for opt, arg in opts:
+        if opt in ("-e", "--endpoint"):
+            moduleArgs['endpoint'] = arg
+        elif opt in ("-u", "--user"):
+            moduleArgs['user'] = arg
+        elif opt in ("-p", "--password"):
+            moduleArgs['password'] = arg
+        elif opt in ("-P", "--pwdfile"):
+            moduleArgs['pwdfile'] = arg
+        elif opt in ("-C", "--cookie"):
+            moduleArgs['cookie'] = arg
+        elif opt in ("-c", "--container"):
+            moduleArgs['container'] = arg
+        elif opt in ("-R", "--resourcename"):
+            moduleArgs['resourcename'] = arg
+        elif opt in ("-f", "--filename"):
+            moduleArgs['filename'] = arg
+        elif opt in ("-s", "--rangesize"):
+            moduleArgs['rangesize'] = int(arg)
+        elif opt in ("-t", "--poolsize"):
+            moduleArgs['poolsize'] = int(arg)
+    return moduleArgs
+
+
+# Main processing function
+def main(argv):
+    # Configure Parameters and Options
+    options = 'e:u:p:P:C:c:R:f:s:t:'
+    longOptions = ['endpoint=', 'user=', 'password=', 'pwdfile=', 'cookie=', 'container=', 'resourcename=',
+                   'filename=', 'rangesize=', 'poolsize=']
+    # Get Options & Arguments
+    try:
+        opts, args = getopt.getopt(argv, options, longOptions)
+        # Read Module Arguments
+        moduleArgs = readModuleArgs(opts, args)
+
+        # With a cookie the endpoint is the storage url, otherwise it is the authentication endpoint
+        authendpoint = None
+        endpoint = moduleArgs['endpoint']
+        if moduleArgs['cookie'] is None and moduleArgs['endpoint'] is not None and moduleArgs['user'] is not None:
+            if moduleArgs['password'] is None and moduleArgs['pwdfile'] is None:
+                moduleArgs['password'] = getPassword(moduleArgs['user'])
+            elif moduleArgs['pwdfile'] is not None:
+                with open(moduleArgs['pwdfile'], 'r') as f:
+                    moduleArgs['password'] = f.read().rstrip('\n')
+            authendpoint = moduleArgs['endpoint']
+            moduleArgs['cookie'], endpoint = authenticate(authendpoint, moduleArgs['user'], moduleArgs['password'])
+        if moduleArgs['cookie'] is not None and moduleArgs['resourcename'] is not None:
+            jsonObj = downloadStorageObject(endpoint, moduleArgs['container'], moduleArgs['cookie'], moduleArgs['resourcename'],
+                                            moduleArgs['filename'], moduleArgs['rangesize'], moduleArgs['poolsize'],
+                                            authendpoint, moduleArgs['user'], moduleArgs['password'])
+            printJSON(jsonObj)
+        else:
+            print ('Incorrect parameters')
+    except getopt.GetoptError:
+        usage()
+    except Exception as e:
+        print('Unknown Exception please check log file')
+        logging.exception(e)
+        sys.exit(1)
+
+    return
+
+
+# Main function to kick off processing
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -31,6 +31,8 @@ import sys
 
 
 from occsutils import callRESTApi
+from occsutils import iterRESTResults
+from occsutils import getResponseJSON
 from occsutils import getPassword
 from occsutils import printJSON
 from authenticate import authenticate
@@ -44,10 +46,16 @@ def listInstanceSnapshot(endpoint, resourcename, cookie):
     params = None
     data = None
     response = callRESTApi(endpoint, basepath, resourcename, data, 'GET', params, cookie)
-    jsonResponse = json.loads(response.text)
+    jsonResponse = getResponseJSON(response)
     return jsonResponse
 
 
+def iterInstanceSnapshot(endpoint, resourcename, cookie):
+    basepath = '/snapshot/'
+    params = None
+    return iterRESTResults(endpoint, basepath, resourcename, params, cookie)
+
+
 # Read Module Arguments
 def readModuleArgs(opts, args):
     moduleArgs = {}
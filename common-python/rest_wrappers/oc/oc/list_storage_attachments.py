@@ -31,6 +31,8 @@ import sys
 
 
 from occsutils import callRESTApi
+from occsutils import iterRESTResults
+from occsutils import getResponseJSON
 from occsutils import getPassword
 from occsutils import printJSON
 from authenticate import authenticate
@@ -52,10 +54,24 @@ def listStorageAttachments(endpoint, resourcename, cookie, instancename=None, st
             params['storage_volume_name'] = storagevolumename
     data = None
     response = callRESTApi(endpoint, basepath, resourcename, data, 'GET', params, cookie)
-    jsonResponse = json.loads(response.text)
+    jsonResponse = getResponseJSON(response)
     return jsonResponse
 
 
+def iterStorageAttachments(endpoint, resourcename, cookie, instancename=None, state=None, storagevolumename=None):
+    basepath = '/storage/attachment/'
+    params = None
+    if instancename is not None or state is not None or storagevolumename is not None:
+        params = {}
+        if instancename is not None:
+            params['instance_name'] = instancename
+        if state is not None:
+            params['state'] = state
+        if storagevolumename is not None:
+            params['storage_volume_name'] = storagevolumename
+    return iterRESTResults(endpoint, basepath, resourcename, params, cookie)
+
+
 # Read Module Arguments
 def readModuleArgs(opts, args):
     moduleArgs = {}
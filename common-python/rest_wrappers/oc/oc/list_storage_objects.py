@@ -29,8 +29,14 @@ import requests
 import subprocess
 import sys
 import tempfile
+import threading
 from contextlib import closing
 
+try:
+    import Queue
+except ImportError:
+    import queue as Queue
+
 # Import utility methods
 
 
@@ -40,6 +46,10 @@ from oscsutils import printJSON
 from authenticate_oscs import authenticate
 
 
+# Swift returns at most 10000 entries per request
+defaultpagesize = 1000
+
+
 # Define methods
 def listStorageObjects(endpoint, resourcename, authtoken, limit=None, marker=None, end_marker=None, format=None, prefix=None, delimiter=None, **kwargs):
     basepath = ''
@@ -64,6 +74,99 @@ def listStorageObjects(endpoint, resourcename, authtoken, limit=None, marker=Non
     return jsonResponse
 
 
+def listStorageObjectsPage(endpoint, resourcename, authtoken, limit, marker=None, end_marker=None, prefix=None, delimiter=None):
+    text = listStorageObjects(endpoint, resourcename, authtoken, limit=limit, marker=marker, end_marker=end_marker, format='json', prefix=prefix, delimiter=delimiter)
+    # An empty container answers 204 with no body
+    if text is None or text.strip() == '':
+        return []
+    return json.loads(text)
+
+
+def getPageMarker(page):
+    # Entries rolled up by a delimiter only carry a subdir
+    last = page[-1]
+    return last.get('name', last.get('subdir'))
+
+
+def fetchStorageObjectPages(pages, stopevent, endpoint, resourcename, authtoken, limit, marker, end_marker, prefix, delimiter):
+    try:
+        while not stopevent.is_set():
+            page = listStorageObjectsPage(endpoint, resourcename, authtoken, limit, marker, end_marker, prefix, delimiter)
+            putStorageObjectPage(pages, stopevent, (page, None))
+            if len(page) < limit:
+                break
+            marker = getPageMarker(page)
+    except Exception as e:
+        putStorageObjectPage(pages, stopevent, (None, e))
+    putStorageObjectPage(pages, stopevent, None)
+    return
+
+
+def putStorageObjectPage(pages, stopevent, item):
+    # Give up when the consumer has gone away rather than blocking forever.
+    while not stopevent.is_set():
+        try:
+            pages.put(item, timeout=1)
+            return
+        except Queue.Full:
+            pass
+    return
+
+
+def iterStorageObjects(endpoint, resourcename, authtoken, limit=defaultpagesize, marker=None, end_marker=None, prefix=None, delimiter=None, prefetch=True, **kwargs):
+    """Yield the objects of a container as dicts, limit entries per request.
+
+    The marker is advanced automatically so the whole container is listed
+    a page at a time. With prefetch the next page is requested on a background
+    thread while the current one is consumed, so up to three pages are held:
+    the one being consumed, one queued and one fetched waiting to be queued.
+    """
+    if not prefetch:
+        while True:
+            page = listStorageObjectsPage(endpoint, resourcename, authtoken, limit, marker, end_marker, prefix, delimiter)
+            for entry in page:
+                yield entry
+            if len(page) < limit:
+                return
+            marker = getPageMarker(page)
+    pages = Queue.Queue(maxsize=1)
+    stopevent = threading.Event()
+    fetcher = threading.Thread(target=fetchStorageObjectPages, args=(pages, stopevent, endpoint, resourcename, authtoken, limit, marker, end_marker, prefix, delimiter))
+    fetcher.daemon = True
+    fetcher.start()
+    try:
+        while True:
+            item = pages.get()
+            if item is None:
+                return
+            page, exception = item
+            if exception is not None:
+                raise exception
+            for entry in page:
+                yield entry
+    finally:
+        stopevent.set()
+
+
+def getLargeObjectSegments(endpoint, resourcename, authtoken, objectheaders=None, **kwargs):
+    """Return the segments of the large object resourcename, i.e. container/object.
+
+    Each segment is a dict of its path, /container/object, bytes and hash, in
+    object order. None is returned when the object is not a static or dynamic
+    large object; objectheaders saves the HEAD when the caller already has them.
+    """
+    if objectheaders is None:
+        objectheaders = callRESTApi(endpoint, '', resourcename, method='HEAD', authtoken=authtoken).headers
+    if objectheaders.get('X-Static-Large-Object', '').lower() == 'true':
+        response = callRESTApi(endpoint, '', resourcename, method='GET', authtoken=authtoken, params={'multipart-manifest': 'get'})
+        return [{'path': segment['name'], 'bytes': segment['bytes'], 'hash': segment['hash']} for segment in json.loads(response.text)]
+    elif objectheaders.get('X-Object-Manifest') is not None:
+        segmentcontainer, prefix = objectheaders['X-Object-Manifest'].split('/', 1)
+        return [{'path': '/' + segmentcontainer + '/' + entry['name'], 'bytes': entry['bytes'], 'hash': entry['hash']}
+                for entry in iterStorageObjects(endpoint, segmentcontainer, authtoken, prefix=prefix)]
+    return None
+
+
 # Read Module Arguments
 def readModuleArgs(opts, args):
     moduleArgs = {}
@@ -0,0 +1,151 @@
+#
+# Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved.
+
+
+"""Adaptive concurrency for network bound transfers.
+
+Runs a function over tasks on threads, starting with a few calls in
+flight and adding one more while the measured throughput keeps improving. The
+number in flight is halved when a call fails, e.g. on a 5xx that outlived its
+retries, and never falls below minimum or rises above maximum.
+
+    executor = AdaptiveExecutor(initial=4, maximum=16)
+    for task, result, exception, elapsed in executor.run(function, tasks, sizefunction):
+        ...
+
+Results are yielded as calls complete, not in task order. sizefunction gives
+the bytes a task transfers; without it every call counts as one unit.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+__author__ = "Andrew Hopkinson (Oracle Cloud Solutions A-Team)"
+__copyright__ = "Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved."
+__ekitversion__ = "@VERSION@"
+__ekitrelease__ = "@RELEASE@"
+__version__ = "1.0.0.0"
+__date__ = "@BUILDDATE@"
+__status__ = "Development"
+__module__ = "oc_adaptive"
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+
+import os
+import threading
+import time
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+from oc_context import activeConnection
+from oc_context import getCallContext
+from oc_logging import initLogging
+
+
+defaultmaximum = 16
+# Relative throughput gain needed before another call is added
+defaultimprovement = 0.05
+
+mylogger = initLogging(__name__)
+
+
+def getMaxConcurrency():
+    try:
+        maximum = int(os.getenv('OC_MAX_CONCURRENCY', defaultmaximum))
+    except ValueError as e:
+        maximum = defaultmaximum
+    return max(maximum, 1)
+
+
+def formatRate(bytespersecond):
+    return '{0:.2f} MB/s'.format(bytespersecond / (1024.0 * 1024.0))
+
+
+class AdaptiveExecutor(object):
+    """Additive increase, multiplicative decrease of the calls in flight.
+
+    Throughput is measured over windows of as many completed calls as there are
+    calls in flight, so each window sees every concurrent call finish once.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=None, improvement=defaultimprovement):
+        self.maximum = maximum if maximum is not None else getMaxConcurrency()
+        self.minimum = max(min(minimum, self.maximum), 1)
+        self.concurrency = min(max(initial, self.minimum), self.maximum)
+        self.improvement = improvement
+        self.best = 0.0
+        self.windowstart = time.time()
+        self.windowbytes = 0
+        self.windowcalls = 0
+        self.windowerrors = 0
+        self.history = [self.concurrency]
+
+    def record(self, size, exception):
+        self.windowbytes += size
+        self.windowcalls += 1
+        if exception is not None:
+            self.windowerrors += 1
+        if self.windowerrors > 0:
+            # Back off at once rather than at the end of the window
+            self.resize(max(self.concurrency // 2, self.minimum), 'errors')
+            self.best = 0.0
+        elif self.windowcalls >= self.concurrency:
+            elapsed = max(time.time() - self.windowstart, 1e-6)
+            throughput = self.windowbytes / elapsed
+            if throughput > self.best * (1.0 + self.improvement):
+                self.best = throughput
+                self.resize(min(self.concurrency + 1, self.maximum), formatRate(throughput))
+            else:
+                self.best = max(self.best, throughput)
+                self.resize(self.concurrency, formatRate(throughput))
+        return
+
+    def resize(self, concurrency, reason):
+        if concurrency != self.concurrency:
+            mylogger.info('Concurrency {0:d} -> {1:d} ({2:s})'.format(self.concurrency, concurrency, reason))
+            self.concurrency = concurrency
+            self.history.append(concurrency)
+        self.windowstart = time.time()
+        self.windowbytes = 0
+        self.windowcalls = 0
+        self.windowerrors = 0
+        return
+
+    def run(self, function, tasks, sizefunction=None):
+        results = Queue()
+
+        def worker(task, context):
+            # Re-enter the connection and timeout of the thread that submitted the task
+            with activeConnection(*context):
+                start = time.time()
+                try:
+                    result = function(task)
+                    exception = None
+                except Exception as e:
+                    result = None
+                    exception = e
+                results.put((task, result, exception, time.time() - start))
+
+        # Tasks are taken as calls are started, so a generator can produce them on demand
+        tasks = iter(tasks)
+        exhausted = False
+        running = 0
+        while not exhausted or running > 0:
+            while running < self.concurrency and not exhausted:
+                try:
+                    task = next(tasks)
+                except StopIteration:
+                    exhausted = True
+                    break
+                thread = threading.Thread(target=worker, args=(task, getCallContext()))
+                thread.daemon = True
+                thread.start()
+                running += 1
+            if running == 0:
+                break
+            task, result, exception, elapsed = results.get()
+            running -= 1
+            size = (sizefunction(task) if sizefunction is not None else 1) if exception is None else 0
+            self.record(size, exception)
+            yield task, result, exception, elapsed
@@ -0,0 +1,192 @@
+#
+# Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved.
+
+
+"""Cross process cache of Oracle Compute Cloud authentication cookies.
+
+Cookies are stored in a json file, readable only by the owner, keyed by
+endpoint and user together with their expiry time. Access is serialised with
+an exclusive lock on a companion lock file so parallel Ansible forks can share
+a single authentication.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+__author__ = "Andrew Hopkinson (Oracle Cloud Solutions A-Team)"
+__copyright__ = "Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved."
+__ekitversion__ = "@VERSION@"
+__ekitrelease__ = "@RELEASE@"
+__version__ = "1.0.0.0"
+__date__ = "@BUILDDATE@"
+__status__ = "Development"
+__module__ = "oc_authcache"
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from oc_logging import initLogging
+
+
+# Compute Cloud cookies are valid for 30 minutes when the response does not say otherwise
+defaultcookielifetime = 1800
+defaultrefreshmargin = 300
+cachefilename = os.path.join(os.path.expanduser('~'), '.oc', 'authcache.json')
+
+mylogger = initLogging(__name__)
+credentialsLock = threading.Lock()
+credentials = {}
+
+
+def getCacheFilename():
+    return os.getenv('OC_AUTH_CACHE', cachefilename)
+
+
+def isCacheEnabled():
+    return os.getenv('OC_AUTH_CACHE_DISABLED', 'false').lower() not in ['true', 'yes', '1']
+
+
+def getRefreshMargin():
+    try:
+        refreshmargin = int(os.getenv('OC_AUTH_REFRESH_MARGIN', defaultrefreshmargin))
+    except ValueError as e:
+        refreshmargin = defaultrefreshmargin
+    return refreshmargin
+
+
+def getCacheKey(endpoint, user):
+    return '{0:s}|{1:s}'.format(str(endpoint).strip('/'), str(user))
+
+
+@contextmanager
+def lockedCache(exclusive=False):
+    filename = getCacheFilename()
+    cachedir = os.path.dirname(filename)
+    if cachedir != '' and not os.path.exists(cachedir):
+        try:
+            os.makedirs(cachedir, 0o700)
+        except OSError as e:
+            if not os.path.isdir(cachedir):
+                raise
+    lockfd = os.open(filename + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(lockfd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield filename
+    finally:
+        fcntl.flock(lockfd, fcntl.LOCK_UN)
+        os.close(lockfd)
+
+
+def readCache(filename):
+    cache = {}
+    if os.path.exists(filename):
+        try:
+            with open(filename, 'r') as f:
+                cache = json.load(f)
+        except (IOError, ValueError) as e:
+            mylogger.warn('Ignoring unreadable authentication cache {0:s} : {1!s}'.format(filename, e))
+            cache = {}
+    return cache
+
+
+def writeCache(filename, cache):
+    tmpfilename = '{0:s}.{1:d}.tmp'.format(filename, os.getpid())
+    fd = os.open(tmpfilename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(cache, f)
+    os.rename(tmpfilename, filename)
+    return
+
+
+def getCachedCookie(endpoint, user):
+    cookie = None
+    expires = None
+    if not isCacheEnabled():
+        return cookie, expires
+    with lockedCache() as filename:
+        entry = readCache(filename).get(getCacheKey(endpoint, user))
+    # Treat cookies about to expire as missing so they are refreshed before calls start failing.
+    if entry is not None and entry.get('expires', 0) - getRefreshMargin() > time.time():
+        cookie = entry.get('cookie')
+        expires = entry.get('expires')
+    return cookie, expires
+
+
+def storeCookie(endpoint, user, cookie, expires=None):
+    if not isCacheEnabled() or cookie is None or cookie == '':
+        return
+    if expires is None:
+        expires = time.time() + defaultcookielifetime
+    with lockedCache(exclusive=True) as filename:
+        cache = readCache(filename)
+        now = time.time()
+        # Drop expired entries while we hold the lock
+        cache = dict((key, entry) for key, entry in cache.items() if entry.get('expires', 0) > now)
+        cache[getCacheKey(endpoint, user)] = {'cookie': cookie, 'expires': expires}
+        writeCache(filename, cache)
+    return
+
+
+def removeCookie(cookie):
+    # Evict a cookie the server rejected. Only entries still holding it are
+    # removed, another process may already have stored a fresh one.
+    if not isCacheEnabled() or cookie is None or cookie == '':
+        return
+    with lockedCache(exclusive=True) as filename:
+        cache = readCache(filename)
+        remaining = dict((key, entry) for key, entry in cache.items() if entry.get('cookie') != cookie)
+        if len(remaining) != len(cache):
+            writeCache(filename, remaining)
+    return
+
+
+def getCookieExpiry(response, name='nimbula'):
+    expires = None
+    if response is not None:
+        for cookie in response.cookies:
+            if cookie.name == name and cookie.expires is not None:
+                expires = cookie.expires
+    return expires
+
+
+# In process record of the credentials behind each cookie so an expired cookie
+# can be replaced without the caller having to authenticate again.
+def registerCredentials(cookie, endpoint, user, password, expires=None):
+    if cookie is not None and cookie != '':
+        if expires is None:
+            expires = time.time() + defaultcookielifetime
+        with credentialsLock:
+            credentials[cookie] = {'endpoint': endpoint, 'user': user, 'password': password, 'expires': expires,
+                                   'replacement': None}
+    return
+
+
+def registerReplacement(cookie, newcookie):
+    with credentialsLock:
+        if cookie in credentials and cookie != newcookie:
+            credentials[cookie]['replacement'] = newcookie
+    return
+
+
+def getCredentials(cookie):
+    with credentialsLock:
+        return credentials.get(cookie)
+
+
+def getCurrentCookie(cookie):
+    # Follow the chain of replacements to the most recent cookie.
+    with credentialsLock:
+        seen = set()
+        while cookie in credentials and credentials[cookie]['replacement'] is not None and cookie not in seen:
+            seen.add(cookie)
+            cookie = credentials[cookie]['replacement']
+    return cookie
+
+
+def isCookieExpiring(cookie):
+    entry = getCredentials(cookie)
+    return entry is not None and entry['expires'] - getRefreshMargin() <= time.time()
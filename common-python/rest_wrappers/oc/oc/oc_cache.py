@@ -0,0 +1,180 @@
+#
+# Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved.
+
+
+"""Conditional GET response cache for the REST utility modules.
+
+The cache is off unless OC_RESPONSE_CACHE is set to true. Responses are kept
+per URL, query parameters and identity in a least recently used list of at
+most OC_RESPONSE_CACHE_SIZE entries. An entry younger than
+OC_RESPONSE_CACHE_TTL seconds is returned without contacting the service,
+older entries carrying an ETag or Last-Modified header are revalidated with
+If-None-Match / If-Modified-Since and a 304 answer returns the cached
+response. The parsed json of a cached response is kept with it so unchanged
+payloads are not parsed again; callers must treat it as read only.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+__author__ = "Andrew Hopkinson (Oracle Cloud Solutions A-Team)"
+__copyright__ = "Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved."
+__ekitversion__ = "@VERSION@"
+__ekitrelease__ = "@RELEASE@"
+__version__ = "1.0.0.0"
+__date__ = "@BUILDDATE@"
+__status__ = "Development"
+__module__ = "oc_cache"
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from oc_logging import initLogging
+
+
+defaultcachesize = 256
+defaultcachettl = 0.0
+
+mylogger = initLogging(__name__)
+
+
+def isCacheEnabled():
+    return os.getenv('OC_RESPONSE_CACHE', 'false').lower() in ['true', 'yes', '1']
+
+
+def getCacheSize():
+    try:
+        cachesize = int(os.getenv('OC_RESPONSE_CACHE_SIZE', defaultcachesize))
+    except ValueError as e:
+        cachesize = defaultcachesize
+    return max(cachesize, 1)
+
+
+def getCacheTTL():
+    try:
+        cachettl = float(os.getenv('OC_RESPONSE_CACHE_TTL', defaultcachettl))
+    except ValueError as e:
+        cachettl = defaultcachettl
+    return max(cachettl, 0.0)
+
+
+def getIdentityHash(identity):
+    # Never keep the cookie itself in the key.
+    if identity is None:
+        return ''
+    return hashlib.sha1(str(identity).encode('utf-8')).hexdigest()
+
+
+def getRequestKey(url, params=None, identity=None):
+    if params is not None:
+        params = tuple(sorted((str(k), str(v)) for k, v in params.items()))
+    return (str(url), params, getIdentityHash(identity))
+
+
+class CacheEntry(object):
+
+    def __init__(self, response):
+        self.response = response
+        self.etag = response.headers.get('ETag')
+        self.lastmodified = response.headers.get('Last-Modified')
+        self.stored = time.time()
+        self.parsed = None
+        self.lock = threading.Lock()
+
+    def canRevalidate(self):
+        return self.etag is not None or self.lastmodified is not None
+
+    def getValidators(self):
+        headers = {}
+        if self.etag is not None:
+            headers['If-None-Match'] = self.etag
+        if self.lastmodified is not None:
+            headers['If-Modified-Since'] = self.lastmodified
+        return headers
+
+    def getJSON(self):
+        with self.lock:
+            if self.parsed is None:
+                self.parsed = json.loads(self.response.text)
+            return self.parsed
+
+
+class ResponseCache(object):
+    """Thread safe LRU cache of GET responses."""
+
+    def __init__(self, enabled=None, ttl=None, maxentries=None):
+        self.enabled = enabled if enabled is not None else isCacheEnabled()
+        self.ttl = ttl if ttl is not None else getCacheTTL()
+        self.maxentries = maxentries if maxentries is not None else getCacheSize()
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0}
+
+    def getKey(self, url, params=None, identity=None):
+        return getRequestKey(url, params, identity)
+
+    def count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+        return
+
+    def getStats(self):
+        with self.lock:
+            return dict(self.stats)
+
+    def lookup(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                if self.isFresh(entry) or entry.canRevalidate():
+                    # Re-insert as the most recently used
+                    self.entries[key] = entry
+                else:
+                    entry = None
+        return entry
+
+    def isFresh(self, entry):
+        return time.time() - entry.stored < self.ttl
+
+    def store(self, key, response):
+        entry = CacheEntry(response)
+        if response.status_code != 200 or not (entry.canRevalidate() or self.ttl > 0):
+            return None
+        response.cacheentry = entry
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = entry
+            while len(self.entries) > self.maxentries:
+                self.entries.popitem(last=False)
+        return entry
+
+    def revalidated(self, entry, response):
+        # 304 responses may carry updated validators
+        entry.etag = response.headers.get('ETag', entry.etag)
+        entry.lastmodified = response.headers.get('Last-Modified', entry.lastmodified)
+        entry.stored = time.time()
+        self.count('revalidated')
+        return entry.response
+
+    def invalidate(self, urlprefix):
+        urlprefix = str(urlprefix)
+        with self.lock:
+            for key in [key for key in self.entries if key[0].startswith(urlprefix)]:
+                del self.entries[key]
+        return
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+        return
+
+
+def getResponseJSON(response):
+    entry = getattr(response, 'cacheentry', None)
+    if entry is not None:
+        return entry.getJSON()
+    return json.loads(response.text)
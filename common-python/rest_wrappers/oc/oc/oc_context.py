@@ -0,0 +1,64 @@
+#
+# Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved.
+
+
+"""Per thread call context for the REST utility modules.
+
+A connection object activated on a thread supplies its own session pool,
+retry policy, rate limiter, metrics and caches to every REST call made from
+that thread; without one the module level defaults are used.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+__author__ = "Andrew Hopkinson (Oracle Cloud Solutions A-Team)"
+__copyright__ = "Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved."
+__ekitversion__ = "@VERSION@"
+__ekitrelease__ = "@RELEASE@"
+__version__ = "1.0.0.0"
+__date__ = "@BUILDDATE@"
+__status__ = "Development"
+__module__ = "oc_context"
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+
+import threading
+from contextlib import contextmanager
+
+
+callContext = threading.local()
+
+
+def getActiveConnection():
+    return getattr(callContext, 'connection', None)
+
+
+def getRequestTimeout():
+    return getattr(callContext, 'timeout', None)
+
+
+def getCallContext():
+    # The connection and timeout to re-enter with activeConnection on another thread
+    return getActiveConnection(), getRequestTimeout()
+
+
+def getActiveAttribute(name, default):
+    connection = getActiveConnection()
+    if connection is not None:
+        value = getattr(connection, name, None)
+        if value is not None:
+            return value
+    return default
+
+
+@contextmanager
+def activeConnection(connection, timeout=None):
+    # Nested activations restore the outer connection and timeout on exit.
+    previousconnection = getattr(callContext, 'connection', None)
+    previoustimeout = getattr(callContext, 'timeout', None)
+    callContext.connection = connection
+    callContext.timeout = timeout if timeout is not None else previoustimeout
+    try:
+        yield connection
+    finally:
+        callContext.connection = previousconnection
+        callContext.timeout = previoustimeout
@@ -52,6 +52,17 @@ class OCAlreadyStopped(RESTException):
         return repr('Oracle Cloud Object Already Stopped : ' + self.message)
 
 
+class OCSegmentOverflow(RESTException):
+    def __init__(self, *args):
+        self.message = ''
+        if len(args) > 0:
+            self.message = args[0]
+        Exception.__init__(self, *args)
+
+    def __str__(self):
+        return repr('Oracle Cloud Segment Overflow : ' + self.message)
+
+
 class REST401Exception(Exception):
     def __init__(self, *args):
         self.message = ''
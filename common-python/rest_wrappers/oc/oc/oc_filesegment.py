@@ -0,0 +1,207 @@
+#
+# Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved.
+
+
+"""Read only file object over a byte range of a file.
+
+Used to send segments of a large file as request bodies straight from the
+source file, without splitting it into temporary files first. Each segment
+has its own file handle so segments can be read concurrently. The MD5 of
+the bytes is optionally computed as they are read, i.e. as they are sent, so
+checking what the server stored costs no second read of the file.
+
+StreamSegment does the same for a stream of unknown length, e.g. the output
+of a compressor, cutting it into bodies that are sent chunked as they are read.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+__author__ = "Andrew Hopkinson (Oracle Cloud Solutions A-Team)"
+__copyright__ = "Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved."
+__ekitversion__ = "@VERSION@"
+__ekitrelease__ = "@RELEASE@"
+__version__ = "1.0.0.0"
+__date__ = "@BUILDDATE@"
+__status__ = "Development"
+__module__ = "oc_filesegment"
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+
+import hashlib
+import os
+
+from oc_exceptions import OCSegmentOverflow
+
+
+defaultblocksize = 1048576
+
+
+def getSegmentSuffix(index, count):
+    # The suffixes split(1) uses, aa, ab, ..., widened when there are more than
+    # 676 segments so that listing order is always segment order.
+    width = 2
+    while 26 ** width < count:
+        width += 1
+    suffix = ''
+    for position in range(width):
+        index, letter = divmod(index, 26)
+        suffix = chr(ord('a') + letter) + suffix
+    return suffix
+
+
+def getSegmentRanges(filesize, segmentsize):
+    # (offset, length) of each segment, an empty file is a single empty segment
+    count = max((filesize + segmentsize - 1) // segmentsize, 1)
+    return [(index * segmentsize, max(min(segmentsize, filesize - index * segmentsize), 0)) for index in range(count)]
+
+
+class FileSegment(object):
+    """File like view of length bytes of filename starting at offset.
+
+    Positions given to seek() and returned by tell() are relative to the start
+    of the segment. There is deliberately no fileno(): requests would use it to
+    size the body as the whole file.
+
+    With digest set hexdigest() returns the MD5 of the segment once it has been
+    read through to the end. Seeking back to the start, as a retried request
+    does, starts the digest again.
+
+    throttle, e.g. an oc_ratelimit.TokenBucket, has a token taken for every
+    byte read, and callback is called with the position after each read or
+    seek.
+    """
+
+    def __init__(self, filename, offset, length, blocksize=defaultblocksize, digest=False, throttle=None, callback=None):
+        self.filename = filename
+        self.offset = offset
+        self.length = length
+        self.blocksize = blocksize
+        self.digest = digest
+        self.throttle = throttle
+        self.callback = callback
+        self.position = 0
+        self.hash = hashlib.md5() if digest else None
+        self.hashposition = 0
+        self.file = open(filename, 'rb')
+        self.file.seek(offset)
+
+    def __len__(self):
+        return self.length
+
+    @property
+    def len(self):
+        return self.length - self.position
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def read(self, size=-1):
+        remaining = self.length - self.position
+        if size is None or size < 0 or size > remaining:
+            size = remaining
+        if size <= 0:
+            return b''
+        if self.throttle is not None:
+            self.throttle.acquire(size)
+        data = self.file.read(size)
+        if self.hash is not None and self.hashposition == self.position:
+            self.hash.update(data)
+            self.hashposition += len(data)
+        self.position += len(data)
+        if self.callback is not None:
+            self.callback(self.position)
+        return data
+
+    def readblocks(self):
+        # Bounded reads for callers iterating over the segment
+        while True:
+            data = self.read(self.blocksize)
+            if len(data) == 0:
+                return
+            yield data
+
+    def tell(self):
+        return self.position
+
+    def seek(self, position, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            position += self.position
+        elif whence == os.SEEK_END:
+            position += self.length
+        self.position = min(max(position, 0), self.length)
+        self.file.seek(self.offset + self.position)
+        if self.digest and self.position == 0:
+            self.hash = hashlib.md5()
+            self.hashposition = 0
+        if self.callback is not None:
+            self.callback(self.position)
+        return self.position
+
+    def hexdigest(self):
+        # None unless every byte of the segment went through the digest in order
+        if self.hash is None or self.hashposition != self.length:
+            return None
+        return self.hash.hexdigest()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        return
+
+
+class StreamSegment(object):
+    """Iterable over the next limit bytes at most of stream, sent as a chunked body.
+
+    first is data already read from the stream that starts the segment. The
+    MD5 is computed as the blocks are read; once iterated length is the number
+    of bytes sent, ended whether the stream ran out before limit and
+    hexdigest() their MD5. The stream cannot be read again, so there is no
+    seek and a request with this body is never resent.
+
+    throttle and callback are as for FileSegment. With whole the stream must
+    end within limit: when it does not, OCSegmentOverflow is raised before the
+    last block is sent, so the request is abandoned rather than completed
+    with a truncated body.
+    """
+
+    def __init__(self, stream, limit, first=b'', blocksize=defaultblocksize, throttle=None, callback=None, whole=False):
+        self.stream = stream
+        self.limit = limit
+        self.whole = whole
+        self.first = first
+        self.blocksize = blocksize
+        self.throttle = throttle
+        self.callback = callback
+        self.length = 0
+        self.ended = False
+        self.hash = hashlib.md5()
+
+    def __iter__(self):
+        data = self.first
+        self.first = b''
+        while True:
+            if len(data) == 0 and self.length < self.limit:
+                data = self.stream.read(min(self.blocksize, self.limit - self.length))
+                self.ended = len(data) == 0
+            if self.whole and not self.ended and self.length + len(data) >= self.limit:
+                # Peek before the last block goes out, the chunked body is not finished yet
+                if len(self.stream.read(1)) > 0:
+                    raise OCSegmentOverflow('stream exceeds {0:d} bytes'.format(self.limit))
+                self.ended = True
+            if len(data) == 0:
+                return
+            if self.throttle is not None:
+                self.throttle.acquire(len(data))
+            self.hash.update(data)
+            self.length += len(data)
+            if self.callback is not None:
+                self.callback(self.length)
+            yield data
+            data = b''
+
+    def hexdigest(self):
+        return self.hash.hexdigest()
@@ -17,11 +17,18 @@ __module__ = "oc_logging"
 # ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
 
 
+import atexit
 import logging
 import logging.handlers
 import os
+import threading
 import time
 
+try:
+    import Queue
+except ImportError:
+    import queue as Queue
+
 
 loglevelname = 'info'
 loglevel = logging.INFO
@@ -30,6 +37,17 @@ loglevelmap = {'critical': logging.CRITICAL, 'error': logging.ERROR, 'warning':
                'debug': logging.DEBUG}
 logformat = '[UTC] %(asctime)-15s [%(process)s] (%(module)s-%(funcName)s-%(lineno)d) %(levelname)s: %(message)s'
 logfilename = '/tmp/python-oc.log'
+defaultbodylimit = 1024
+defaultqueuesize = 10000
+
+# Arguments of these types cannot change after the call, so formatting can wait
+try:
+    immutabletypes = (basestring, int, long, float, bool, type(None))
+except NameError:
+    immutabletypes = (str, bytes, int, float, bool, type(None))
+
+loggingLock = threading.Lock()
+queueHandler = None
 
 
 def getLogFormat():
@@ -56,16 +74,132 @@ def getLogLevel():
     return loglevel
 
 
-def initLogging(name):
-    logfilehandler = logging.handlers.RotatingFileHandler(getLogFilename(), maxBytes=10485760, backupCount=10)
-    #logfilehandler = logging.handlers.SysLogHandler(facility=logging.handlers.SysLogHandler.LOG_SYSLOG)
-    logfilehandler.setLevel(getLogLevel())
-    formatter = logging.Formatter(getLogFormat())
-    formatter.converter = time.gmtime
-    logfilehandler.setFormatter(formatter)
+def getLogBodyLimit():
+    try:
+        bodylimit = int(os.getenv('OC_LOG_BODY_LIMIT', defaultbodylimit))
+    except ValueError as e:
+        bodylimit = defaultbodylimit
+    return bodylimit
+
 
+def getLogQueueSize():
+    try:
+        queuesize = int(os.getenv('OC_LOG_QUEUE_SIZE', defaultqueuesize))
+    except ValueError as e:
+        queuesize = defaultqueuesize
+    return max(queuesize, 1)
+
+
+def truncateBody(body, limit=None):
+    # Cap the size of logged payloads, a negative limit logs them in full.
+    limit = limit if limit is not None else getLogBodyLimit()
+    if body is None:
+        return ''
+    if limit < 0 or len(body) <= limit:
+        return body
+    return '{0:s}... [{1:d} of {2:d} characters]'.format(body[:limit], limit, len(body))
+
+
+class QueueHandler(logging.Handler):
+    """Hand records to a background thread that writes them to target.
+
+    The caller only queues the record; formatting, including any traceback,
+    and file I/O happen on the writer thread. Records are dropped, and counted, rather than
+    blocking the caller when the queue is full. The writer is restarted in a
+    forked child because threads do not survive the fork.
+    """
+
+    def __init__(self, target, queuesize=None):
+        logging.Handler.__init__(self)
+        self.target = target
+        self.queuesize = queuesize if queuesize is not None else getLogQueueSize()
+        self.pid = None
+        self.queue = None
+        self.writer = None
+        self.dropped = 0
+        self.startWriter()
+
+    def startWriter(self):
+        self.pid = os.getpid()
+        self.queue = Queue.Queue(maxsize=self.queuesize)
+        self.writer = threading.Thread(target=self.write, name='oc-logging')
+        self.writer.daemon = True
+        self.writer.start()
+        return
+
+    def prepare(self, record):
+        # Leave formatting to the writer unless an argument may change once we return.
+        args = record.args
+        if isinstance(args, dict):
+            args = args.values()
+        if not isinstance(record.msg, immutabletypes) or not all(isinstance(arg, immutabletypes) for arg in args or ()):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+    def emit(self, record):
+        try:
+            if self.pid != os.getpid():
+                with loggingLock:
+                    if self.pid != os.getpid():
+                        self.startWriter()
+            self.queue.put_nowait(self.prepare(record))
+        except Queue.Full:
+            self.dropped += 1
+        except Exception:
+            self.handleError(record)
+        return
+
+    def write(self):
+        while True:
+            record = self.queue.get()
+            try:
+                if record is None:
+                    return
+                if self.dropped > 0:
+                    dropped = self.dropped
+                    self.dropped = 0
+                    self.target.handle(logging.makeLogRecord({'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                                                              'msg': 'Log queue full, dropped {0:d} records'.format(dropped)}))
+                self.target.handle(record)
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        if self.pid == os.getpid() and self.writer.is_alive():
+            self.queue.join()
+        self.target.flush()
+        return
+
+    def close(self):
+        if self.pid == os.getpid() and self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+        self.target.close()
+        logging.Handler.close(self)
+        return
+
+
+def getQueueHandler():
+    global queueHandler
+    with loggingLock:
+        if queueHandler is None:
+            logfilehandler = logging.handlers.RotatingFileHandler(getLogFilename(), maxBytes=10485760, backupCount=10)
+            #logfilehandler = logging.handlers.SysLogHandler(facility=logging.handlers.SysLogHandler.LOG_SYSLOG)
+            formatter = logging.Formatter(getLogFormat())
+            formatter.converter = time.gmtime
+            logfilehandler.setFormatter(formatter)
+            queueHandler = QueueHandler(logfilehandler)
+            queueHandler.setLevel(getLogLevel())
+            atexit.register(queueHandler.close)
+    return queueHandler
+
+
+def initLogging(name):
+    # Every module shares the one handler, and writer thread, for the process.
     logger = logging.getLogger(name)
     logger.setLevel(getLogLevel())
-    logger.addHandler(logfilehandler)
+    handler = getQueueHandler()
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
     return logger
-
@@ -0,0 +1,284 @@
+#
+# Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved.
+
+
+"""Per call metrics for the REST utility modules.
+
+Collection is enabled by setting OC_METRICS to true or naming a file in
+OC_METRICS_FILE. Each REST call records its method, basepath, final status,
+latency, bytes sent and received, retries and authentication refreshes. When
+OC_METRICS_FILE is set every call is appended to it as a json line. At exit a
+p50/p95/p99 latency table per basepath is written to the log and, when
+OC_METRICS_SUMMARY_FILE is set, to that file. Nothing is written to stdout as
+the Ansible modules use it for their results.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+__author__ = "Andrew Hopkinson (Oracle Cloud Solutions A-Team)"
+__copyright__ = "Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved."
+__ekitversion__ = "@VERSION@"
+__ekitrelease__ = "@RELEASE@"
+__version__ = "1.0.0.0"
+__date__ = "@BUILDDATE@"
+__status__ = "Development"
+__module__ = "oc_metrics"
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+
+import atexit
+import json
+import os
+import random
+import threading
+import time
+
+try:
+    from urlparse import urlparse
+except ImportError:
+    from urllib.parse import urlparse
+
+from oc_logging import initLogging
+
+
+defaultreservoirsize = 1024
+
+mylogger = initLogging(__name__)
+
+
+def getMetricsFilename():
+    return os.getenv('OC_METRICS_FILE')
+
+
+def getSummaryFilename():
+    return os.getenv('OC_METRICS_SUMMARY_FILE')
+
+
+def getReservoirSize():
+    try:
+        reservoirsize = int(os.getenv('OC_METRICS_RESERVOIR_SIZE', defaultreservoirsize))
+    except ValueError as e:
+        reservoirsize = defaultreservoirsize
+    return max(reservoirsize, 1)
+
+
+def isMetricsEnabled():
+    return os.getenv('OC_METRICS', 'false').lower() in ['true', 'yes', '1'] or getMetricsFilename() is not None
+
+
+def getMetricsPath(basepath, url=None):
+    # Storage calls have no basepath, group them by the first segment of the url.
+    if basepath is not None and str(basepath).strip('/') != '':
+        return '/' + str(basepath).strip('/') + '/'
+    if url is not None:
+        segments = [segment for segment in urlparse(str(url)).path.split('/') if segment != '']
+        if len(segments) > 0:
+            return '/' + segments[0] + '/'
+    return '/'
+
+
+def percentile(values, fraction):
+    # Nearest rank on a sorted list
+    if len(values) == 0:
+        return 0.0
+    index = max(int(round(fraction * len(values) + 0.5)) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def getResponseBytes(response):
+    # Bytes actually read off the wire, i.e. before decompression, when available.
+    try:
+        return int(response.raw.tell())
+    except (AttributeError, TypeError, ValueError) as e:
+        pass
+    try:
+        return int(response.headers.get('Content-Length', 0))
+    except (AttributeError, TypeError, ValueError) as e:
+        return 0
+
+
+def getRequestBytes(response):
+    try:
+        return int(response.request.headers.get('Content-Length', 0))
+    except (AttributeError, TypeError, ValueError) as e:
+        return 0
+
+
+class CallRecord(object):
+
+    def __init__(self, method, basepath):
+        self.method = method.upper()
+        self.basepath = basepath
+        self.start = time.time()
+        self.status = None
+        self.bytesin = 0
+        self.bytesout = 0
+        self.retries = 0
+        self.refreshes = 0
+
+
+class CallStats(object):
+    """Running totals for one basepath and method.
+
+    Latencies are kept in a reservoir sample of at most reservoirsize entries,
+    every call has the same chance of being in it, so the percentiles stay
+    representative however many calls are made.
+    """
+
+    def __init__(self, reservoirsize):
+        self.reservoirsize = reservoirsize
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.refreshes = 0
+        self.bytesin = 0
+        self.bytesout = 0
+        self.total = 0.0
+        self.latencies = []
+
+    def add(self, entry):
+        self.calls += 1
+        if 'error' in entry:
+            self.errors += 1
+        self.retries += entry['retries']
+        self.refreshes += entry['refreshes']
+        self.bytesin += entry['bytesin']
+        self.bytesout += entry['bytesout']
+        self.total += entry['latency']
+        if len(self.latencies) < self.reservoirsize:
+            self.latencies.append(entry['latency'])
+        else:
+            index = random.randint(0, self.calls - 1)
+            if index < self.reservoirsize:
+                self.latencies[index] = entry['latency']
+        return
+
+
+class MetricsRecorder(object):
+
+    def __init__(self, enabled=None, filename=None, summaryfilename=None, reservoirsize=None):
+        self.enabled = enabled if enabled is not None else isMetricsEnabled()
+        self.filename = filename if filename is not None else getMetricsFilename()
+        self.summaryfilename = summaryfilename if summaryfilename is not None else getSummaryFilename()
+        self.reservoirsize = reservoirsize if reservoirsize is not None else getReservoirSize()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.calls = {}
+        self.metricsfile = None
+
+    def getStack(self):
+        # Calls nest, authentication during a refresh is a call of its own.
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = []
+            self.local.stack = stack
+        return stack
+
+    def getCurrent(self):
+        stack = self.getStack() if self.enabled else []
+        return stack[-1] if len(stack) > 0 else None
+
+    def startCall(self, method, basepath, url=None):
+        if not self.enabled:
+            return None
+        record = CallRecord(method, getMetricsPath(basepath, url))
+        self.getStack().append(record)
+        return record
+
+    def countRetry(self):
+        record = self.getCurrent()
+        if record is not None:
+            record.retries += 1
+        return
+
+    def countRefresh(self):
+        record = self.getCurrent()
+        if record is not None:
+            record.refreshes += 1
+        return
+
+    def recordResponse(self, response):
+        record = self.getCurrent()
+        if record is not None and response is not None:
+            record.status = response.status_code
+            record.bytesin += getResponseBytes(response)
+            record.bytesout += getRequestBytes(response)
+        return
+
+    def finishCall(self, record, response=None, exception=None):
+        if record is None:
+            return
+        stack = self.getStack()
+        if record in stack:
+            stack.remove(record)
+        if record.status is None and response is not None:
+            # Served without a request, e.g. from the response cache
+            record.status = response.status_code
+        entry = {'time': record.start, 'method': record.method, 'basepath': record.basepath, 'status': record.status,
+                 'latency': time.time() - record.start, 'bytesin': record.bytesin, 'bytesout': record.bytesout,
+                 'retries': record.retries, 'refreshes': record.refreshes}
+        if exception is not None:
+            entry['error'] = type(exception).__name__
+        with self.lock:
+            key = (record.basepath, record.method)
+            if key not in self.calls:
+                self.calls[key] = CallStats(self.reservoirsize)
+            self.calls[key].add(entry)
+            if self.filename is not None:
+                self.writeEntry(entry)
+        return
+
+    def writeEntry(self, entry):
+        try:
+            if self.metricsfile is None:
+                self.metricsfile = open(self.filename, 'a')
+            self.metricsfile.write(json.dumps(entry, sort_keys=True) + '\n')
+            self.metricsfile.flush()
+        except IOError as e:
+            mylogger.warn('Disabling metrics file {0:s} : {1!s}'.format(self.filename, e))
+            self.filename = None
+        return
+
+    def getSummary(self):
+        summary = []
+        with self.lock:
+            for (basepath, method), stats in sorted(self.calls.items()):
+                latencies = sorted(stats.latencies)
+                summary.append({'basepath': basepath, 'method': method, 'calls': stats.calls, 'errors': stats.errors,
+                                'retries': stats.retries, 'refreshes': stats.refreshes, 'bytesin': stats.bytesin,
+                                'bytesout': stats.bytesout, 'total': stats.total, 'p50': percentile(latencies, 0.50),
+                                'p95': percentile(latencies, 0.95), 'p99': percentile(latencies, 0.99)})
+        return summary
+
+    def formatSummary(self):
+        lines = ['{0:<32s} {1:<6s} {2:>6s} {3:>6s} {4:>7s} {5:>8s} {6:>8s} {7:>8s} {8:>8s} {9:>12s} {10:>12s}'.format(
+            'basepath', 'method', 'calls', 'errors', 'retries', 'total', 'p50', 'p95', 'p99', 'bytesin', 'bytesout')]
+        for row in self.getSummary():
+            lines.append('{0:<32s} {1:<6s} {2:>6d} {3:>6d} {4:>7d} {5:>8.3f} {6:>8.3f} {7:>8.3f} {8:>8.3f} {9:>12d} {10:>12d}'.format(
+                row['basepath'], row['method'], row['calls'], row['errors'], row['retries'], row['total'], row['p50'],
+                row['p95'], row['p99'], row['bytesin'], row['bytesout']))
+        return lines
+
+    def writeSummary(self):
+        if not self.enabled or len(self.calls) == 0:
+            return
+        lines = self.formatSummary()
+        for line in lines:
+            mylogger.info(line)
+        if self.summaryfilename is not None:
+            try:
+                with open(self.summaryfilename, 'a') as f:
+                    f.write('\n'.join(lines) + '\n')
+            except IOError as e:
+                mylogger.warn('Unable to write metrics summary {0:s} : {1!s}'.format(self.summaryfilename, e))
+        if self.metricsfile is not None:
+            self.metricsfile.close()
+            self.metricsfile = None
+        return
+
+
+metricsRecorder = MetricsRecorder()
+atexit.register(metricsRecorder.writeSummary)
+
+
+def getMetricsRecorder():
+    return metricsRecorder
@@ -0,0 +1,136 @@
+#
+# Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved.
+
+
+"""Progress of a transfer made of segments.
+
+Tracks the bytes sent for each segment and its state, pending, active, done,
+failed or skipped, and reports the overall rate and time remaining at most
+every OC_PROGRESS_INTERVAL seconds (default 5) to the log and, when given, a
+stream such as sys.stderr. Nothing is written to stdout, the Ansible modules
+return getSummary() in their results instead.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+__author__ = "Andrew Hopkinson (Oracle Cloud Solutions A-Team)"
+__copyright__ = "Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved."
+__ekitversion__ = "@VERSION@"
+__ekitrelease__ = "@RELEASE@"
+__version__ = "1.0.0.0"
+__date__ = "@BUILDDATE@"
+__status__ = "Development"
+__module__ = "oc_progress"
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+
+import os
+import threading
+import time
+
+from oc_logging import initLogging
+
+
+defaultinterval = 5.0
+states = ['pending', 'active', 'done', 'failed', 'skipped']
+
+mylogger = initLogging(__name__)
+
+
+def getProgressInterval():
+    try:
+        interval = float(os.getenv('OC_PROGRESS_INTERVAL', defaultinterval))
+    except ValueError as e:
+        interval = defaultinterval
+    return max(interval, 0.0)
+
+
+def formatBytes(count):
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if abs(count) < 1024.0:
+            return '{0:.1f} {1:s}'.format(count, unit)
+        count /= 1024.0
+    return '{0:.1f} TB'.format(count)
+
+
+def formatDuration(seconds):
+    if seconds is None:
+        return '--:--:--'
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return '{0:d}:{1:02d}:{2:02d}'.format(hours, minutes, seconds)
+
+
+class TransferProgress(object):
+
+    def __init__(self, name, stream=None, interval=None):
+        self.name = name
+        self.stream = stream
+        self.interval = interval if interval is not None else getProgressInterval()
+        self.lock = threading.Lock()
+        self.segments = {}
+        self.start = time.time()
+        self.reported = 0.0
+        self.finished = None
+
+    def addSegment(self, name, length, state='pending'):
+        with self.lock:
+            self.segments[name] = {'length': length, 'position': length if state in ['done', 'skipped'] else 0, 'state': state}
+        return
+
+    def setState(self, name, state):
+        with self.lock:
+            segment = self.segments[name]
+            segment['state'] = state
+            if state == 'done':
+                segment['position'] = segment['length']
+        self.report()
+        return
+
+    def setPosition(self, name, position):
+        # Positions rather than increments so a rewound, retried segment is not counted twice
+        with self.lock:
+            self.segments[name]['position'] = position
+        self.report()
+        return
+
+    def getSummary(self):
+        with self.lock:
+            segments = [dict(segment) for segment in self.segments.values()]
+            finished = self.finished
+        elapsed = max((finished or time.time()) - self.start, 1e-6)
+        total = sum(segment['length'] for segment in segments)
+        skipped = sum(segment['length'] for segment in segments if segment['state'] == 'skipped')
+        done = sum(segment['position'] for segment in segments)
+        # Only what was sent this run counts towards the rate
+        rate = (done - skipped) / elapsed
+        eta = (total - done) / rate if rate > 0 else None
+        summary = {'name': self.name, 'bytes': done, 'total': total, 'seconds': round(elapsed, 3), 'rate': round(rate, 1),
+                   'eta': round(eta, 1) if eta is not None else None}
+        for state in states:
+            summary[state] = len([segment for segment in segments if segment['state'] == state])
+        return summary
+
+    def formatSummary(self, summary):
+        percent = 100.0 * summary['bytes'] / summary['total'] if summary['total'] > 0 else 100.0
+        return '{0:s} {1:5.1f}% {2:s} of {3:s} {4:s}/s ETA {5:s} segments {6:d} done {7:d} active {8:d} pending {9:d} failed {10:d} skipped'.format(
+            self.name, percent, formatBytes(summary['bytes']), formatBytes(summary['total']), formatBytes(summary['rate']),
+            formatDuration(summary['eta']), summary['done'], summary['active'], summary['pending'], summary['failed'], summary['skipped'])
+
+    def report(self, force=False):
+        now = time.time()
+        with self.lock:
+            if not force and now - self.reported < self.interval:
+                return
+            self.reported = now
+        line = self.formatSummary(self.getSummary())
+        mylogger.info(line)
+        if self.stream is not None:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+        return
+
+    def finish(self):
+        with self.lock:
+            self.finished = time.time()
+        self.report(force=True)
+        return self.getSummary()
@@ -0,0 +1,207 @@
+#
+# Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved.
+
+
+"""Client side token bucket rate limiting for the REST utility modules.
+
+Requests are limited per endpoint host and identity domain. Limits come from
+OC_RATE_LIMIT (requests per second, 0 disables limiting) and OC_RATE_BURST,
+or per key from the json file named by OC_RATE_LIMIT_CONFIG:
+
+    {"default": {"rate": 10, "burst": 20},
+     "https://api.compute.example.com|mydomain": {"rate": 5, "burst": 5}}
+
+Bucket state is kept in the SQLite database named by OC_RATE_LIMIT_DB so that
+parallel processes, such as backgrounded ansible-playbook runs, share the same
+budget. Set OC_RATE_LIMIT_DB to an empty string to limit per process only.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+__author__ = "Andrew Hopkinson (Oracle Cloud Solutions A-Team)"
+__copyright__ = "Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved."
+__ekitversion__ = "@VERSION@"
+__ekitrelease__ = "@RELEASE@"
+__version__ = "1.0.0.0"
+__date__ = "@BUILDDATE@"
+__status__ = "Development"
+__module__ = "oc_ratelimit"
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from oc_logging import initLogging
+from oc_sessionpool import getPoolKey
+
+
+defaultrate = 0.0
+statefilename = os.path.join(os.path.expanduser('~'), '.oc', 'ratelimit.db')
+domainpattern = re.compile(r'/(?:Compute|Storage)-([^/]+)')
+
+mylogger = initLogging(__name__)
+
+
+def getRateConfig():
+    config = {}
+    configfile = os.getenv('OC_RATE_LIMIT_CONFIG')
+    if configfile is not None and os.path.exists(configfile):
+        try:
+            with open(configfile, 'r') as f:
+                config = json.load(f)
+        except (IOError, ValueError) as e:
+            mylogger.warn('Ignoring unreadable rate limit config {0:s} : {1!s}'.format(configfile, e))
+    if 'default' not in config:
+        try:
+            rate = float(os.getenv('OC_RATE_LIMIT', defaultrate))
+        except ValueError as e:
+            rate = defaultrate
+        try:
+            burst = float(os.getenv('OC_RATE_BURST', max(rate, 1.0)))
+        except ValueError as e:
+            burst = max(rate, 1.0)
+        config['default'] = {'rate': rate, 'burst': burst}
+    return config
+
+
+def getStateFilename():
+    return os.getenv('OC_RATE_LIMIT_DB', statefilename)
+
+
+def getRateLimitKey(url):
+    match = domainpattern.search(str(url))
+    domain = match.group(1) if match is not None else ''
+    return '{0:s}|{1:s}'.format(getPoolKey(url), domain)
+
+
+class TokenBucket(object):
+    """In process token bucket, rate tokens per second up to burst tokens."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst) if burst is not None else max(self.rate, 1.0)
+        self.tokens = self.burst
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def take(self, tokens):
+        # Returns how long to wait before tokens are available, 0 if they were taken.
+        with self.lock:
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            # Requests bigger than the bucket are let through once it is full.
+            needed = min(tokens, self.burst)
+            if self.tokens >= needed:
+                self.tokens -= tokens
+                return 0.0
+            return (needed - self.tokens) / self.rate
+
+    def acquire(self, tokens=1):
+        if self.rate <= 0:
+            return 0.0
+        waited = 0.0
+        wait = self.take(tokens)
+        while wait > 0:
+            time.sleep(wait)
+            waited += wait
+            wait = self.take(tokens)
+        return waited
+
+
+class SharedTokenBucket(TokenBucket):
+    """Token bucket whose state lives in a SQLite database shared between processes."""
+
+    def __init__(self, rate, burst=None, filename=None, key=''):
+        TokenBucket.__init__(self, rate, burst)
+        self.filename = filename if filename is not None else getStateFilename()
+        self.key = key
+        statedir = os.path.dirname(self.filename)
+        if statedir != '' and not os.path.exists(statedir):
+            try:
+                os.makedirs(statedir, 0o700)
+            except OSError as e:
+                if not os.path.isdir(statedir):
+                    raise
+        connection = self.connect()
+        try:
+            connection.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL, updated REAL)')
+            connection.commit()
+        finally:
+            connection.close()
+
+    def connect(self):
+        connection = sqlite3.connect(self.filename, timeout=30, isolation_level=None)
+        return connection
+
+    def take(self, tokens):
+        try:
+            return self.takeShared(tokens)
+        except sqlite3.Error as e:
+            mylogger.warn('Rate limit state {0:s} unavailable, limiting per process : {1!s}'.format(self.filename, e))
+            return TokenBucket.take(self, tokens)
+
+    def takeShared(self, tokens):
+        connection = self.connect()
+        try:
+            # BEGIN IMMEDIATE takes the write lock up front so the read-modify-write is atomic.
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (self.key,)).fetchone()
+            now = time.time()
+            if row is None:
+                available = self.burst
+            else:
+                available = min(self.burst, row[0] + max(now - row[1], 0.0) * self.rate)
+            needed = min(tokens, self.burst)
+            if available >= needed:
+                available -= tokens
+                wait = 0.0
+            else:
+                wait = (needed - available) / self.rate
+            connection.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)', (self.key, available, now))
+            connection.execute('COMMIT')
+        finally:
+            connection.close()
+        return wait
+
+
+class RateLimiter(object):
+
+    def __init__(self, config=None, filename=None):
+        self.config = config if config is not None else getRateConfig()
+        self.filename = filename if filename is not None else getStateFilename()
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def getBucket(self, key):
+        with self.lock:
+            if key not in self.buckets:
+                limits = self.config.get(key, self.config.get('default', {}))
+                rate = float(limits.get('rate', defaultrate))
+                burst = limits.get('burst')
+                if rate <= 0:
+                    bucket = None
+                elif self.filename:
+                    try:
+                        bucket = SharedTokenBucket(rate, burst, self.filename, key)
+                    except sqlite3.Error as e:
+                        mylogger.warn('Rate limit state {0:s} unavailable, limiting per process : {1!s}'.format(self.filename, e))
+                        bucket = TokenBucket(rate, burst)
+                else:
+                    bucket = TokenBucket(rate, burst)
+                self.buckets[key] = bucket
+            return self.buckets[key]
+
+    def acquire(self, url, tokens=1):
+        key = getRateLimitKey(url)
+        bucket = self.getBucket(key)
+        waited = 0.0
+        if bucket is not None:
+            waited = bucket.acquire(tokens)
+            if waited > 0:
+                mylogger.debug('Rate limited {0:s} for {1:.2f}s'.format(key, waited))
+        return waited
@@ -0,0 +1,62 @@
+#
+# Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved.
+
+
+"""Request sending shared by the REST utility modules.
+
+A RequestSender sends each request from a session pool under a retry policy,
+spending a rate limiter token on every attempt and recording the outcome in
+a metrics recorder. The parts of the connection active on the calling thread
+are used in preference to the sender's own.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+__author__ = "Andrew Hopkinson (Oracle Cloud Solutions A-Team)"
+__copyright__ = "Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved."
+__ekitversion__ = "@VERSION@"
+__ekitrelease__ = "@RELEASE@"
+__version__ = "1.0.0.0"
+__date__ = "@BUILDDATE@"
+__status__ = "Development"
+__module__ = "oc_request"
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+
+from oc_context import getActiveAttribute
+
+
+class RequestSender(object):
+
+    def __init__(self, sessionpool, retrypolicy, ratelimiter, metrics):
+        self.sessionpool = sessionpool
+        self.retrypolicy = retrypolicy
+        self.ratelimiter = ratelimiter
+        self.metrics = metrics
+
+    def getSessionPool(self):
+        return getActiveAttribute('sessionpool', self.sessionpool)
+
+    def getRetryPolicy(self):
+        return getActiveAttribute('retrypolicy', self.retrypolicy)
+
+    def getRateLimiter(self):
+        return getActiveAttribute('ratelimiter', self.ratelimiter)
+
+    def getMetrics(self):
+        return getActiveAttribute('metrics', self.metrics)
+
+    def send(self, method, url, data=None, **kwargs):
+        metrics = self.getMetrics()
+        ratelimiter = self.getRateLimiter()
+        sessionpool = self.getSessionPool()
+        attempts = []
+        def attempt():
+            if len(attempts) > 0:
+                metrics.countRetry()
+            attempts.append(url)
+            # Every attempt, including retries, spends a token.
+            ratelimiter.acquire(url)
+            return sessionpool.request(method, url, data=data, **kwargs)
+        response = self.getRetryPolicy().execute(method, attempt, data)
+        metrics.recordResponse(response)
+        return response
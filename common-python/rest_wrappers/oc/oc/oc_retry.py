@@ -0,0 +1,153 @@
+#
+# Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved.
+
+
+"""Retry policy for the REST utility modules.
+
+Transient failures (throttling, 5xx from the front end, dropped connections)
+are retried with exponentially growing, decorrelated jittered delays. A
+Retry-After header on the response takes precedence over the computed delay
+and the whole call is abandoned once maxelapsed seconds have passed.
+
+Only idempotent methods are retried on server errors. Other methods, i.e.
+POST, are only retried when the request is known not to have been acted on:
+the connection could not be established or the server rejected it with 429.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+__author__ = "Andrew Hopkinson (Oracle Cloud Solutions A-Team)"
+__copyright__ = "Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved."
+__ekitversion__ = "@VERSION@"
+__ekitrelease__ = "@RELEASE@"
+__version__ = "1.0.0.0"
+__date__ = "@BUILDDATE@"
+__status__ = "Development"
+__module__ = "oc_retry"
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+
+import email.utils
+import os
+import random
+import time
+import requests
+
+from oc_logging import initLogging
+from oc_sessionpool import getDataPosition
+from oc_sessionpool import isReplayable
+from oc_sessionpool import rewindData
+
+
+defaultmaxattempts = 5
+defaultbasedelay = 1.0
+defaultmaxdelay = 30.0
+defaultmaxelapsed = 300.0
+retrystatuses = [429, 500, 502, 503, 504]
+nonidempotentretrystatuses = [429]
+idempotentmethods = ['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE']
+
+mylogger = initLogging(__name__)
+
+
+def getEnvNumber(name, default, convert=float):
+    try:
+        value = convert(os.getenv(name, default))
+    except ValueError as e:
+        value = default
+    return value
+
+
+def parseRetryAfter(response):
+    delay = None
+    if response is not None and response.headers is not None:
+        value = response.headers.get('Retry-After')
+        if value is not None:
+            try:
+                delay = float(value)
+            except ValueError as e:
+                parsed = email.utils.parsedate_tz(value)
+                if parsed is not None:
+                    delay = email.utils.mktime_tz(parsed) - time.time()
+            if delay is not None:
+                delay = max(delay, 0.0)
+    return delay
+
+
+class RetryPolicy(object):
+
+    def __init__(self, maxattempts=None, basedelay=None, maxdelay=None, maxelapsed=None, statuses=None,
+                 nonidempotentstatuses=None, methods=None, envprefix='OC'):
+        self.maxattempts = maxattempts if maxattempts is not None else getEnvNumber(envprefix + '_RETRY_MAX_ATTEMPTS', defaultmaxattempts, int)
+        self.basedelay = basedelay if basedelay is not None else getEnvNumber(envprefix + '_RETRY_BASE_DELAY', defaultbasedelay)
+        self.maxdelay = maxdelay if maxdelay is not None else getEnvNumber(envprefix + '_RETRY_MAX_DELAY', defaultmaxdelay)
+        self.maxelapsed = maxelapsed if maxelapsed is not None else getEnvNumber(envprefix + '_RETRY_MAX_ELAPSED', defaultmaxelapsed)
+        self.statuses = statuses if statuses is not None else retrystatuses
+        self.nonidempotentstatuses = nonidempotentstatuses if nonidempotentstatuses is not None else nonidempotentretrystatuses
+        self.methods = methods if methods is not None else idempotentmethods
+
+    def isIdempotent(self, method):
+        return method.upper() in self.methods
+
+    def shouldRetry(self, method, response=None, exception=None):
+        if exception is not None:
+            if isinstance(exception, requests.exceptions.ConnectTimeout):
+                return True
+            return self.isIdempotent(method) and isinstance(exception, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+        if response is not None:
+            if self.isIdempotent(method):
+                return response.status_code in self.statuses
+            return response.status_code in self.nonidempotentstatuses
+        return False
+
+    def nextDelay(self, previousdelay, response=None):
+        retryafter = parseRetryAfter(response)
+        if retryafter is not None:
+            return retryafter
+        # Decorrelated jitter
+        return min(self.maxdelay, random.uniform(self.basedelay, max(previousdelay, self.basedelay) * 3))
+
+    def execute(self, method, send, data=None):
+        """Call send() until it returns a response that should not be retried.
+
+        Returns the last response, or raises the last exception, once attempts or
+        elapsed time are exhausted.
+        """
+        method = method.upper()
+        position = getDataPosition(data)
+        maxattempts = self.maxattempts if isReplayable(data) else 1
+        start = time.time()
+        delay = self.basedelay
+        attempt = 1
+        while True:
+            response = None
+            lasterror = None
+            try:
+                response = send()
+            except requests.exceptions.RequestException as e:
+                lasterror = e
+                if attempt >= maxattempts or not self.shouldRetry(method, exception=e):
+                    raise
+                reason = type(e).__name__
+            else:
+                if attempt >= maxattempts or not self.shouldRetry(method, response=response):
+                    return response
+                reason = response.status_code
+            delay = self.nextDelay(delay, response)
+            if time.time() - start + delay > self.maxelapsed:
+                mylogger.warn('{0:s} giving up after {1:d} attempts, retry would exceed {2:.0f}s'.format(method, attempt, self.maxelapsed))
+                if lasterror is not None:
+                    raise lasterror
+                return response
+            if response is not None:
+                # Discarded, let a streamed response give its connection back
+                response.close()
+            mylogger.info('{0:s} attempt {1:d} failed ({2!s}), retrying in {3:.2f}s'.format(method, attempt, reason, delay))
+            time.sleep(delay)
+            rewindData(data, position)
+            attempt += 1
+
+
+class NoRetryPolicy(RetryPolicy):
+
+    def __init__(self):
+        RetryPolicy.__init__(self, maxattempts=1)
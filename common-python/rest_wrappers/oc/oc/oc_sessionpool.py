@@ -0,0 +1,216 @@
+#
+# Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved.
+
+
+"""Pool of keep-alive HTTP sessions shared by the REST utility modules.
+
+Sessions are checked out per call and returned to an idle list keyed by the
+scheme and host of the endpoint, so consecutive calls against the same
+endpoint reuse the same TCP/TLS connection instead of handshaking again.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+__author__ = "Andrew Hopkinson (Oracle Cloud Solutions A-Team)"
+__copyright__ = "Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved."
+__ekitversion__ = "@VERSION@"
+__ekitrelease__ = "@RELEASE@"
+__version__ = "1.0.0.0"
+__date__ = "@BUILDDATE@"
+__status__ = "Development"
+__module__ = "oc_sessionpool"
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+
+import os
+import threading
+import time
+import requests
+
+try:
+    from urlparse import urlparse
+except ImportError:
+    from urllib.parse import urlparse
+
+from oc_logging import initLogging
+
+
+defaultpoolsize = 10
+defaultidletimeout = 60.0
+# Only these can be sent twice without risk of the server acting on both.
+replayablemethods = ['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE']
+
+mylogger = initLogging(__name__)
+
+
+def getPoolSize(envprefix='OC'):
+    try:
+        poolsize = int(os.getenv(envprefix + '_HTTP_POOL_SIZE', defaultpoolsize))
+    except ValueError as e:
+        poolsize = defaultpoolsize
+    return max(poolsize, 1)
+
+
+def getIdleTimeout(envprefix='OC'):
+    try:
+        idletimeout = float(os.getenv(envprefix + '_HTTP_IDLE_TIMEOUT', defaultidletimeout))
+    except ValueError as e:
+        idletimeout = defaultidletimeout
+    return idletimeout
+
+
+def getPoolKey(url):
+    parsed = urlparse(str(url))
+    return '{0:s}://{1:s}'.format(parsed.scheme.lower(), parsed.netloc.lower())
+
+
+def rewindData(data, position):
+    if position is not None:
+        data.seek(position)
+    return
+
+
+def getDataPosition(data):
+    position = None
+    if data is not None and hasattr(data, 'seek') and hasattr(data, 'tell'):
+        try:
+            position = data.tell()
+        except (IOError, OSError) as e:
+            position = None
+    return position
+
+
+def isReplayable(data):
+    # Streams we cannot rewind can only be sent once.
+    if data is None or isinstance(data, (str, bytes, dict, list, tuple)):
+        return True
+    try:
+        if isinstance(data, unicode):
+            return True
+    except NameError as e:
+        pass
+    return getDataPosition(data) is not None
+
+
+class HTTPSessionPool(object):
+    """Thread safe pool of requests sessions keyed by endpoint.
+
+    poolsize is the number of idle sessions kept per endpoint; sessions beyond
+    that are closed when released. Idle sessions older than idletimeout seconds
+    are closed rather than reused because the server will have dropped the
+    keep-alive connection by then. Unset sizes are read from the
+    <envprefix>_HTTP_POOL_SIZE and <envprefix>_HTTP_IDLE_TIMEOUT variables.
+    """
+
+    def __init__(self, headers=None, poolsize=None, idletimeout=None, envprefix='OC'):
+        self.headers = dict(headers) if headers is not None else {}
+        self.poolsize = poolsize if poolsize is not None else getPoolSize(envprefix)
+        self.idletimeout = idletimeout if idletimeout is not None else getIdleTimeout(envprefix)
+        self.lock = threading.Lock()
+        self.idle = {}
+
+    def newsession(self):
+        session = requests.Session()
+        session.headers.update(self.headers)
+        return session
+
+    def acquire(self, url):
+        key = getPoolKey(url)
+        now = time.time()
+        stale = []
+        session = None
+        with self.lock:
+            idlelist = self.idle.get(key, [])
+            while len(idlelist) > 0 and session is None:
+                candidate, lastused = idlelist.pop()
+                if now - lastused > self.idletimeout:
+                    stale.append(candidate)
+                else:
+                    session = candidate
+        for candidate in stale:
+            candidate.close()
+        if session is None:
+            session = self.newsession()
+            reused = False
+        else:
+            reused = True
+        return session, reused
+
+    def release(self, url, session, discard=False):
+        key = getPoolKey(url)
+        # Never carry cookies from one call to the next, identity is per call.
+        session.cookies.clear()
+        if not discard:
+            with self.lock:
+                idlelist = self.idle.setdefault(key, [])
+                if len(idlelist) < self.poolsize:
+                    idlelist.append((session, time.time()))
+                    session = None
+        if session is not None:
+            session.close()
+        return
+
+    def evict(self):
+        now = time.time()
+        stale = []
+        with self.lock:
+            for key in self.idle:
+                keep = []
+                for session, lastused in self.idle[key]:
+                    if now - lastused > self.idletimeout:
+                        stale.append(session)
+                    else:
+                        keep.append((session, lastused))
+                self.idle[key] = keep
+        for session in stale:
+            session.close()
+        return len(stale)
+
+    def clear(self):
+        with self.lock:
+            sessions = [session for idlelist in self.idle.values() for session, lastused in idlelist]
+            self.idle = {}
+        for session in sessions:
+            session.close()
+        return
+
+    def releaseOnClose(self, url, session, response):
+        # A streamed body is still on the session's connection, only hand the
+        # session back once the caller has closed the response.
+        close = response.close
+        released = []
+        def closeAndRelease():
+            try:
+                close()
+            finally:
+                if len(released) == 0:
+                    released.append(session)
+                    self.release(url, session)
+        response.close = closeAndRelease
+        return response
+
+    def request(self, method, url, data=None, **kwargs):
+        position = getDataPosition(data)
+        session, reused = self.acquire(url)
+        try:
+            response = session.request(method, url, data=data, **kwargs)
+        except requests.exceptions.ConnectionError as e:
+            session.close()
+            if not reused or method.upper() not in replayablemethods or not isReplayable(data):
+                raise
+            # A pooled connection can be closed by the server while idle, replace the
+            # session and send once more rather than failing the call.
+            mylogger.info('Stale pooled session for {0:s}, retrying on a new connection'.format(getPoolKey(url)))
+            rewindData(data, position)
+            session = self.newsession()
+            try:
+                response = session.request(method, url, data=data, **kwargs)
+            except Exception:
+                session.close()
+                raise
+        except Exception:
+            session.close()
+            raise
+        if kwargs.get('stream', False):
+            return self.releaseOnClose(url, session, response)
+        self.release(url, session)
+        return response
@@ -0,0 +1,89 @@
+#
+# Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved.
+
+
+"""Coalesce identical concurrent REST reads.
+
+While a call for a key is in flight, other threads asking for the same key
+wait for it and share its result, or its exception, instead of issuing the
+same request again. Coalescing is off unless OC_SINGLE_FLIGHT is set to
+true. Every caller sharing a call gets the same response and parsed json, so
+it is only safe for callers that treat the result as read only.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+__author__ = "Andrew Hopkinson (Oracle Cloud Solutions A-Team)"
+__copyright__ = "Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved."
+__ekitversion__ = "@VERSION@"
+__ekitrelease__ = "@RELEASE@"
+__version__ = "1.0.0.0"
+__date__ = "@BUILDDATE@"
+__status__ = "Development"
+__module__ = "oc_singleflight"
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+
+import os
+import threading
+
+from oc_logging import initLogging
+
+
+mylogger = initLogging(__name__)
+
+
+def isSingleFlightEnabled():
+    return os.getenv('OC_SINGLE_FLIGHT', 'false').lower() in ['true', 'yes', '1']
+
+
+class InFlightCall(object):
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.exception = None
+        self.waiters = 0
+
+
+class SingleFlight(object):
+
+    def __init__(self, enabled=None):
+        self.enabled = enabled if enabled is not None else isSingleFlightEnabled()
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.stats = {'calls': 0, 'deduplicated': 0}
+
+    def getStats(self):
+        with self.lock:
+            return dict(self.stats)
+
+    def do(self, key, function, *args, **kwargs):
+        if not self.enabled:
+            return function(*args, **kwargs)
+        with self.lock:
+            self.stats['calls'] += 1
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = InFlightCall()
+                self.calls[key] = call
+            else:
+                call.waiters += 1
+                self.stats['deduplicated'] += 1
+        if not leader:
+            call.event.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+        try:
+            call.result = function(*args, **kwargs)
+        except Exception as e:
+            call.exception = e
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.event.set()
+            if call.waiters > 0:
+                mylogger.debug('{0!s} shared with {1:d} waiting calls'.format(key[0] if isinstance(key, tuple) else key, call.waiters))
+        return call.result
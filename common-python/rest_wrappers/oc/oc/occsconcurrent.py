@@ -0,0 +1,186 @@
+#
+# Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved.
+
+
+"""Concurrent Oracle Compute Cloud client.
+
+Runs the create, list, update and delete wrappers for instances, storage
+volumes, security lists, rules, applications and associations, orchestrations
+and IP reservations on a bounded pool of worker threads. Each call returns an
+AsyncResult immediately; get() returns the wrapper result or raises its
+exception.
+
+    client = ConcurrentOCCSClient(endpoint, cookie, concurrency=16, timeout=60)
+    results = [client.createSecurityRule(name, name, srclist, dstlist, app) for ...]
+    jsonObjs = [result.get() for result in results]
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+__author__ = "Andrew Hopkinson (Oracle Cloud Solutions A-Team)"
+__copyright__ = "Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved."
+__ekitversion__ = "@VERSION@"
+__ekitrelease__ = "@RELEASE@"
+__version__ = "1.0.0.0"
+__date__ = "@BUILDDATE@"
+__status__ = "Development"
+__module__ = "occsconcurrent"
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+
+import functools
+import os
+from multiprocessing.pool import ThreadPool
+
+# Import utility methods
+
+
+from oc_context import activeConnection
+from oc_context import getActiveConnection
+from oc_logging import initLogging
+
+from add_orchestration import addOrchestration
+from create_launch_plan import addLaunchplan
+from create_ip_reservation import createIPReservation
+from create_security_application import createSecurityApplication
+from create_security_association import createSecurityAssociation
+from create_security_list import createSecurityList
+from create_security_rule import createSecurityRule
+from create_storage_volume import createStorageVolume
+from delete_instance import deleteInstance
+from delete_ip_reservation import deleteIPReservation
+from delete_orchestration import deleteOrchestration
+from delete_security_application import deleteSecurityApplication
+from delete_security_association import deleteSecurityAssociation
+from delete_security_list import deleteSecurityList
+from delete_security_rule import deleteSecurityRule
+from delete_storage_volume import deleteStorageVolume
+from list_instances import listInstances
+from list_ip_reservations import listIPReservations
+from list_orchestrations import listOrchestrations
+from list_security_applications import listSecurityApplications
+from list_security_associations import listSecurityAssociations
+from list_security_lists import listSecurityLists
+from list_security_rules import listSecurityRules
+from list_storage_volumes import listStorageVolumes
+from start_orchestration import startOrchestration
+from stop_orchestration import stopOrchestration
+from update_ip_reservation import updateIPReservation
+from update_orchestration import updateOrchestration
+from update_security_list import updateSecurityList
+from update_security_rule import updateSecurityRule
+from update_storage_volume import updateStorageVolume
+
+
+defaultconcurrency = 8
+defaulttimeout = 120
+
+mylogger = initLogging(__name__)
+
+# All operations take (endpoint, resourcename, cookie, ...) as their leading arguments.
+operations = {
+    'createLaunchPlan': addLaunchplan,
+    'listInstances': listInstances,
+    'deleteInstance': deleteInstance,
+    'createStorageVolume': createStorageVolume,
+    'listStorageVolumes': listStorageVolumes,
+    'updateStorageVolume': updateStorageVolume,
+    'deleteStorageVolume': deleteStorageVolume,
+    'createSecurityList': createSecurityList,
+    'listSecurityLists': listSecurityLists,
+    'updateSecurityList': updateSecurityList,
+    'deleteSecurityList': deleteSecurityList,
+    'createSecurityRule': createSecurityRule,
+    'listSecurityRules': listSecurityRules,
+    'updateSecurityRule': updateSecurityRule,
+    'deleteSecurityRule': deleteSecurityRule,
+    'createSecurityApplication': createSecurityApplication,
+    'listSecurityApplications': listSecurityApplications,
+    'deleteSecurityApplication': deleteSecurityApplication,
+    'createSecurityAssociation': createSecurityAssociation,
+    'listSecurityAssociations': listSecurityAssociations,
+    'deleteSecurityAssociation': deleteSecurityAssociation,
+    'addOrchestration': addOrchestration,
+    'listOrchestrations': listOrchestrations,
+    'updateOrchestration': updateOrchestration,
+    'deleteOrchestration': deleteOrchestration,
+    'startOrchestration': startOrchestration,
+    'stopOrchestration': stopOrchestration,
+    'createIPReservation': createIPReservation,
+    'listIPReservations': listIPReservations,
+    'updateIPReservation': updateIPReservation,
+    'deleteIPReservation': deleteIPReservation
+}
+
+
+def getConcurrency():
+    try:
+        concurrency = int(os.getenv('OC_CONCURRENCY', defaultconcurrency))
+    except ValueError as e:
+        concurrency = defaultconcurrency
+    return max(concurrency, 1)
+
+
+def runOperation(function, connection, timeout, endpoint, resourcename, cookie, args, kwargs):
+    # Workers run with the connection that was active when the client was created.
+    with activeConnection(connection, timeout):
+        try:
+            return function(endpoint, resourcename, cookie, *args, **kwargs)
+        except Exception as e:
+            mylogger.warn('{0:s} {1!s} failed : {2!s}'.format(function.__name__, resourcename, e))
+            raise
+
+
+class ConcurrentOCCSClient(object):
+    """Issue Compute Cloud REST calls with at most concurrency calls in flight.
+
+    timeout is applied to each HTTP request made by a call.
+    """
+
+    def __init__(self, endpoint, cookie, concurrency=None, timeout=defaulttimeout):
+        self.endpoint = endpoint
+        self.cookie = cookie
+        self.concurrency = concurrency if concurrency is not None else getConcurrency()
+        self.timeout = timeout
+        self.connection = getActiveConnection()
+        self.pool = ThreadPool(self.concurrency)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+    def __getattr__(self, name):
+        if name in operations:
+            return functools.partial(self.submit, name)
+        raise AttributeError(name)
+
+    def submit(self, operation, resourcename, *args, **kwargs):
+        function = operations[operation]
+        return self.pool.apply_async(runOperation, (function, self.connection, self.timeout, self.endpoint, resourcename, self.cookie, args, kwargs))
+
+    def map(self, operation, calls):
+        """Run operation once per (resourcename, args, kwargs) tuple and wait for all of them.
+
+        Returns a list of (result, exception) tuples in the order of calls so one
+        failure does not hide the outcome of the others.
+        """
+        pending = []
+        for call in calls:
+            resourcename = call[0]
+            args = call[1] if len(call) > 1 else ()
+            kwargs = call[2] if len(call) > 2 else {}
+            pending.append(self.submit(operation, resourcename, *args, **kwargs))
+        results = []
+        for asyncresult in pending:
+            try:
+                results.append((asyncresult.get(), None))
+            except Exception as e:
+                results.append((None, e))
+        return results
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+        return
@@ -19,9 +19,30 @@ __module__ = "occsutils"
 
 import getpass
 import json
+import logging
 import requests
+import threading
 
 from oc_logging import initLogging
+from oc_logging import truncateBody
+from oc_sessionpool import HTTPSessionPool
+from oc_retry import RetryPolicy
+from oc_ratelimit import RateLimiter
+from oc_metrics import getMetricsRecorder
+from oc_request import RequestSender
+from oc_cache import ResponseCache
+from oc_cache import getResponseJSON
+from oc_cache import getRequestKey
+from oc_cache import CacheEntry
+from oc_singleflight import SingleFlight
+from oc_context import callContext
+from oc_context import getActiveAttribute
+from oc_context import getRequestTimeout
+from oc_authcache import getCredentials
+from oc_authcache import getCurrentCookie
+from oc_authcache import isCookieExpiring
+from oc_authcache import registerReplacement
+from oc_authcache import removeCookie
 
 from oc_exceptions import RESTException
 from oc_exceptions import OCAlreadyStarted
@@ -49,24 +70,98 @@ def showVersionHistory():
 
 
 mylogger = initLogging(__name__)
-httpSession = None
+sessionHeaders = {'Accept': 'application/oracle-compute-v3+json', 'Accept-Encoding': 'gzip;q=1.0, identity; q=0.5',
+                  'Content-Type': 'application/oracle-compute-v3+json'}
+requestSender = RequestSender(HTTPSessionPool(sessionHeaders), RetryPolicy(), RateLimiter(), getMetricsRecorder())
+responseCache = ResponseCache()
+singleFlight = SingleFlight()
+refreshLock = threading.RLock()
 restEndpoint = None
 
 
 def clearHTTPSession():
-    global httpSession
-    httpSession = None
+    # Pooled sessions are returned without cookies so there is no per call state
+    # to clear, just drop the connections that have been idle too long.
+    requestSender.sessionpool.evict()
     return
 
 
-def getHTTPSession():
-    global httpSession
-    headers = {'Accept': 'application/oracle-compute-v3+json', 'Accept-Encoding': 'gzip;q=1.0, identity; q=0.5',
-               'Content-Type': 'application/oracle-compute-v3+json'}
-    if httpSession is None:
-        httpSession = requests.Session()
-        httpSession.headers.update(headers)
-    return httpSession
+def closeHTTPSessions():
+    requestSender.sessionpool.clear()
+    return
+
+
+def getSessionPool():
+    return requestSender.getSessionPool()
+
+
+def getRetryPolicy():
+    return requestSender.getRetryPolicy()
+
+
+def setRetryPolicy(policy):
+    requestSender.retrypolicy = policy
+    return
+
+
+def getRateLimiter():
+    return requestSender.getRateLimiter()
+
+
+def getMetrics():
+    return requestSender.getMetrics()
+
+
+def sendRequest(method, url, data=None, **kwargs):
+    return requestSender.send(method, url, data, **kwargs)
+
+
+def getResponseCache():
+    return getActiveAttribute('responsecache', responseCache)
+
+
+def setResponseCache(cache):
+    global responseCache
+    responseCache = cache
+    return
+
+
+def sendCachedGet(url, params, cookie, **kwargs):
+    responsecache = getResponseCache()
+    if not responsecache.enabled:
+        return sendRequest('GET', url, params=params, **kwargs)
+    key = responsecache.getKey(url, params, cookie)
+    entry = responsecache.lookup(key)
+    if entry is not None and responsecache.isFresh(entry):
+        responsecache.count('hits')
+        return entry.response
+    headers = entry.getValidators() if entry is not None else None
+    response = sendRequest('GET', url, params=params, headers=headers, **kwargs)
+    if response.status_code == 304 and entry is not None:
+        return responsecache.revalidated(entry, response)
+    responsecache.count('misses')
+    responsecache.store(key, response)
+    return response
+
+
+def getSingleFlight():
+    return getActiveAttribute('singleflight', singleFlight)
+
+
+def sendSharedGet(url, params, cookie, **kwargs):
+    def leader():
+        response = sendCachedGet(url, params, cookie, **kwargs)
+        # Let every caller sharing this response reuse one parse of it.
+        if getattr(response, 'cacheentry', None) is None:
+            response.cacheentry = CacheEntry(response)
+        return response
+    return getSingleFlight().do(getRequestKey(url, params, cookie), leader)
+
+
+def setRequestTimeout(timeout):
+    # Timeout applies to calls made from the current thread only.
+    callContext.timeout = timeout
+    return
 
 
 def getRESTEndpoint():
@@ -79,35 +174,86 @@ def setRESTEndpoint(url):
     return
 
 
-def callRESTApi(endpoint, basepath, resourcename='', data=None, method='GET', params=None, cookie=None, **kwargs):
+def refreshCookie(cookie):
+    # Import here, authenticate is built on this module.
+    from authenticate import authenticate
+    with refreshLock:
+        # Another thread may already have replaced this cookie.
+        newcookie = getCurrentCookie(cookie)
+        if newcookie == cookie:
+            newcookie = None
+            credentials = getCredentials(cookie)
+            if credentials is not None:
+                mylogger.info('Refreshing authentication cookie for {0:s}'.format(str(credentials['user'])))
+                getMetrics().countRefresh()
+                newcookie = authenticate(credentials['endpoint'], credentials['user'], credentials['password'], refresh=True)
+                if newcookie is not None and newcookie != '':
+                    registerReplacement(cookie, newcookie)
+    return newcookie
+
+
+def callRESTApi(endpoint, basepath, resourcename='', data=None, method='GET', params=None, cookie=None, reauthenticate=True, **kwargs):
+    metrics = getMetrics()
+    record = metrics.startCall(method, basepath)
+    try:
+        response = callAuthenticatedRESTApi(endpoint, basepath, resourcename, data, method, params, cookie, reauthenticate)
+    except Exception as e:
+        metrics.finishCall(record, exception=e)
+        raise
+    metrics.finishCall(record, response)
+    return response
+
+
+def callAuthenticatedRESTApi(endpoint, basepath, resourcename='', data=None, method='GET', params=None, cookie=None, reauthenticate=True, **kwargs):
+    if reauthenticate and cookie is not None:
+        cookie = getCurrentCookie(cookie)
+        # Refresh ahead of expiry rather than waiting for a 401.
+        if isCookieExpiring(cookie):
+            cookie = refreshCookie(cookie) or cookie
+    try:
+        return sendRESTRequest(endpoint, basepath, resourcename, data, method, params, cookie)
+    except OCActionNotPermitted:
+        raise
+    except REST401Exception:
+        # Stop other callers picking the rejected cookie out of the shared cache,
+        # then re-authenticate once if we know the credentials behind it.
+        removeCookie(cookie)
+        newcookie = None
+        if reauthenticate and cookie is not None:
+            newcookie = refreshCookie(cookie)
+        if newcookie is None or newcookie == '':
+            raise
+        return sendRESTRequest(endpoint, basepath, resourcename, data, method, params, newcookie)
+
+
+def sendRESTRequest(endpoint, basepath, resourcename='', data=None, method='GET', params=None, cookie=None, **kwargs):
     response = {}
-    client = getHTTPSession()
+    cookies = None
     if cookie is not None:
-        client.cookies['nimbula'] = cookie
+        cookies = {'nimbula': cookie}
     url = generateRESTurl(endpoint, basepath, resourcename)
+    timeout = getRequestTimeout()
     #print('url     : ' + str(url))
     #print('params  : ' + str(params))
     #print('data    : ' + str(data))
-    #print('headers : ' + str(headers))
     requests.packages.urllib3.disable_warnings()
     if method.upper() == 'GET':
-        response = client.get(url, params=params, verify=False)
+        response = sendSharedGet(url, params, cookie, cookies=cookies, timeout=timeout, verify=False)
     elif method.upper() == 'POST':
-        response = client.post(url, data=json.dumps(data), verify=False)
+        response = sendRequest('POST', url, data=json.dumps(data), cookies=cookies, timeout=timeout, verify=False)
     elif method.upper() == 'PUT':
-        response = client.put(url, params=params, verify=False)
+        response = sendRequest('PUT', url, params=params, data=json.dumps(data) if data is not None else None, cookies=cookies, timeout=timeout, verify=False)
     elif method.upper() == 'DELETE':
-        response = client.delete(url, verify=False)
-    # Clean because it seems reusing the session fails
-    clearHTTPSession()
+        response = sendRequest('DELETE', url, cookies=cookies, timeout=timeout, verify=False)
     #print('response headers : ' + str(response.headers))
     #print('response status  : ' + str(response.status_code))
     #print('response text    : ' + str(response.text))
 
     # Check response and raise exception if necessary
-    mylogger.debug("Response ({0:d}) : {1:s}".format(response.status_code, response.text))
+    if mylogger.isEnabledFor(logging.DEBUG):
+        mylogger.debug("Response ({0:d}) : {1:s}".format(response.status_code, truncateBody(response.text)))
     if response.status_code == 401:
-        mylogger.warn("Response ({0:d}) : {1:s}".format(response.status_code, response.text))
+        mylogger.warn("Response ({0:d}) : {1:s}".format(response.status_code, truncateBody(response.text)))
         # Attempt to convert generic response to meaningful Exception.
         if 'is not permitted to perform' in response.text:
             raise OCActionNotPermitted(str(response.text))
@@ -116,7 +262,7 @@ def callRESTApi(endpoint, basepath, resourcename='', data=None, method='GET', pa
         else:
             raise REST401Exception('{0:s} : {1:s}'.format(str(response.status_code), str(response.text)))
     elif response.status_code == 404:
-        mylogger.warn("Response ({0:d}) : {1:s}".format(response.status_code, response.text))
+        mylogger.warn("Response ({0:d}) : {1:s}".format(response.status_code, truncateBody(response.text)))
         if 'not found' in response.text:
             raise OCObjectDoesNotExist(str(response.text))
         elif 'does not exist' in response.text:
@@ -124,7 +270,7 @@ def callRESTApi(endpoint, basepath, resourcename='', data=None, method='GET', pa
         else:
             raise REST404Exception('{0:s} : {1:s}'.format(str(response.status_code), str(response.text)))
     elif response.status_code == 409:
-        mylogger.warn("Response ({0:d}) : {1:s}".format(response.status_code, response.text))
+        mylogger.warn("Response ({0:d}) : {1:s}".format(response.status_code, truncateBody(response.text)))
         if 'already exists' in response.text:
             raise OCObjectAlreadyExists(str(response.text))
         elif 'does not exist' in response.text:
@@ -132,7 +278,7 @@ def callRESTApi(endpoint, basepath, resourcename='', data=None, method='GET', pa
         else:
             raise REST409Exception('{0:s} : {1:s}'.format(str(response.status_code), str(response.text)))
     elif response.status_code >= 400 and response.status_code < 600:
-        mylogger.warn("Response ({0:d}) : {1:s}".format(response.status_code, response.text))
+        mylogger.warn("Response ({0:d}) : {1:s}".format(response.status_code, truncateBody(response.text)))
         if 'is already started' in response.text:
             raise OCAlreadyStarted(str(response.text))
         elif 'is already stopped' in response.text:
@@ -140,9 +286,26 @@ def callRESTApi(endpoint, basepath, resourcename='', data=None, method='GET', pa
         else:
             raise RESTException('{0:s} : {1:s}'.format(str(response.status_code), str(response.text)))
 
+    if method.upper() != 'GET' and getResponseCache().enabled:
+        # Anything cached under the changed resource type is now suspect.
+        getResponseCache().invalidate(generateRESTurl(endpoint, basepath))
     return response
 
 
+def iterRESTResults(endpoint, basepath, resourcename='', params=None, cookie=None, **kwargs):
+    # Compute Cloud does not paginate, the whole collection arrives in one
+    # response. Parse it once, drop the raw text and hand out the entries one
+    # at a time; a GET of a single object yields that object.
+    response = callRESTApi(endpoint, basepath, resourcename, None, 'GET', params, cookie)
+    jsonResponse = getResponseJSON(response)
+    del response
+    if isinstance(jsonResponse, dict) and 'result' in jsonResponse:
+        results = jsonResponse['result']
+    else:
+        results = [jsonResponse]
+    return iter(results)
+
+
 def generateRESTurl(endpoint, basepath, resourcename='', **kwargs):
     url = str(endpoint).strip('/') + '/'
     if basepath is not None and basepath != '':
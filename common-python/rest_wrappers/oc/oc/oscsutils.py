@@ -21,6 +21,13 @@ import getpass
 import json
 import requests
 
+from oc_sessionpool import HTTPSessionPool
+from oc_retry import RetryPolicy
+from oc_ratelimit import RateLimiter
+from oc_metrics import getMetricsRecorder
+from oc_request import RequestSender
+from oc_context import getRequestTimeout
+
 from oc_exceptions import RESTException
 from oc_exceptions import REST401Exception
 from oc_exceptions import REST409Exception
@@ -38,25 +45,47 @@ def showVersionHistory():
     return
 
 
-httpSession = None
+sessionHeaders = {'Accept': 'application/oracle-compute-v3+json', 'Accept-Encoding': 'gzip;q=1.0, identity; q=0.5',
+                  'Content-Type': 'application/oracle-compute-v3+json'}
+requestSender = RequestSender(HTTPSessionPool(sessionHeaders), RetryPolicy(), RateLimiter(), getMetricsRecorder())
 restEndpoint = None
 
 
 def clearHTTPSession():
-    global httpSession
-    httpSession = None
+    # Pooled sessions are returned without cookies and request headers are sent
+    # per call, just drop the connections that have been idle too long.
+    requestSender.sessionpool.evict()
     return
 
 
-def getHTTPSession():
-    #global httpSession
-    httpSession = None
-    headers = {'Accept': 'application/oracle-compute-v3+json', 'Accept-Encoding': 'gzip;q=1.0, identity; q=0.5',
-               'Content-Type': 'application/oracle-compute-v3+json'}
-    if httpSession is None:
-        httpSession = requests.Session()
-        httpSession.headers.update(headers)
-    return httpSession
+def closeHTTPSessions():
+    requestSender.sessionpool.clear()
+    return
+
+
+def getSessionPool():
+    return requestSender.getSessionPool()
+
+
+def getRetryPolicy():
+    return requestSender.getRetryPolicy()
+
+
+def setRetryPolicy(policy):
+    requestSender.retrypolicy = policy
+    return
+
+
+def getRateLimiter():
+    return requestSender.getRateLimiter()
+
+
+def getMetrics():
+    return requestSender.getMetrics()
+
+
+def sendRequest(method, url, data=None, **kwargs):
+    return requestSender.send(method, url, data, **kwargs)
 
 
 def getRESTEndpoint():
@@ -70,39 +99,57 @@ def setRESTEndpoint(url):
 
 
 def callRESTApi(endpoint, basepath, resourcename='', method='GET', authtoken=None, headers=None, params=None, data=None, files=None, **kwargs):
+    metrics = getMetrics()
+    record = metrics.startCall(method, basepath, generateRESTurl(endpoint, basepath, resourcename))
+    try:
+        response = sendRESTRequest(endpoint, basepath, resourcename, method, authtoken, headers, params, data, files, **kwargs)
+    except Exception as e:
+        metrics.finishCall(record, exception=e)
+        raise
+    metrics.finishCall(record, response)
+    return response
+
+
+def sendRESTRequest(endpoint, basepath, resourcename='', method='GET', authtoken=None, headers=None, params=None, data=None, files=None, **kwargs):
     response = {}
-    client = getHTTPSession()
+    requestheaders = {}
     if headers is not None:
-        client.headers.update(headers)
+        requestheaders.update(headers)
     if authtoken is not None:
-        client.headers.update({'X-Auth-Token': authtoken})
+        requestheaders.update({'X-Auth-Token': authtoken})
     url = generateRESTurl(endpoint, basepath, resourcename)
+    timeout = getRequestTimeout()
     #print('url     : ' + str(url))
     #print('params  : ' + str(params))
     #print('data    : ' + str(data))
-    #print('headers : ' + str(headers))
+    #print('headers : ' + str(requestheaders))
     requests.packages.urllib3.disable_warnings()
     if method.upper() == 'GET':
-        response = client.get(url, params=params, verify=False)
+        # stream leaves large bodies on the socket for the caller to read in blocks
+        response = sendRequest('GET', url, params=params, headers=requestheaders, timeout=timeout, verify=False, stream=kwargs.get('stream', False))
     elif method.upper() == 'POST':
-        response = client.post(url, data=data, verify=False)
+        response = sendRequest('POST', url, params=params, data=data, headers=requestheaders, timeout=timeout, verify=False)
     elif method.upper() == 'PUT':
-        response = client.put(url, params=params, data=data, verify=False)
+        response = sendRequest('PUT', url, params=params, data=data, headers=requestheaders, timeout=timeout, verify=False)
     elif method.upper() == 'DELETE':
-        response = client.delete(url, verify=False)
-    # Clean because it seems reusing the session fails
-    clearHTTPSession()
+        response = sendRequest('DELETE', url, params=params, headers=requestheaders, timeout=timeout, verify=False)
+    elif method.upper() == 'HEAD':
+        response = sendRequest('HEAD', url, params=params, headers=requestheaders, timeout=timeout, verify=False)
     #print('response headers : ' + str(response.headers))
     #print('response status  : ' + str(response.status_code))
     #print('response text    : ' + str(response.text))
 
     # Check response and raise exception if necessary
-    if response.status_code == 401:
-        raise REST401Exception(str(response.text))
-    elif response.status_code == 409:
-        raise REST409Exception(str(response.text))
-    elif response.status_code >= 400 and response.status_code < 600:
-        raise RESTException(str(response.status_code) + ' - ' + str(response.text))
+    if response.status_code >= 400 and response.status_code < 600:
+        # Read the error body, then let a streamed response give its connection back
+        text = str(response.text)
+        response.close()
+        if response.status_code == 401:
+            raise REST401Exception(text)
+        elif response.status_code == 409:
+            raise REST409Exception(text)
+        else:
+            raise RESTException(str(response.status_code) + ' - ' + text)
 
     return response
 
@@ -0,0 +1,261 @@
+#!/usr/bin/python
+# Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved.
+
+
+"""Incremental sync of a local directory to a storage container.
+
+Every file under the directory becomes the object prefix + its relative path.
+A local index of each file's size, mtime and MD5 means only files whose size
+or mtime changed are read again; the index is compared with one listing of the
+container and only new or changed files are uploaded. Small files go up in
+parallel, files over splitsize MB one at a time with their segments in
+parallel. With delete objects under the prefix that have no local file are
+removed, large objects with their segments; a static large object lists like
+an ordinary object, so each object to delete is checked with a HEAD first.
+"""
+
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+__author__ = "Andrew Hopkinson (Oracle Cloud Solutions A-Team)"
+__copyright__ = "Copyright (c) 2013, 2014-2017 Oracle and/or its affiliates. All rights reserved."
+__ekitversion__ = "@VERSION@"
+__ekitrelease__ = "@RELEASE@"
+__version__ = "1.0.0.0"
+__date__ = "@BUILDDATE@"
+__status__ = "Development"
+__module__ = "sync_storage_objects"
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~#
+
+
+import getopt
+import hashlib
+import json
+import logging
+import os
+import sys
+from contextlib import closing
+
+# Import utility methods
+
+
+from oscsutils import callRESTApi
+from oscsutils import getPassword
+from oscsutils import printJSON
+from authenticate_oscs import authenticate
+from bulk_storage_objects import bulkDeleteLargeObject
+from bulk_storage_objects import bulkDeletePaths
+from list_storage_objects import iterStorageObjects
+from oc_adaptive import AdaptiveExecutor
+from oc_logging import initLogging
+from upload_storage_object import getbandwidthlimiter
+from upload_storage_object import md5
+from upload_storage_object import uploadStorageObject
+from upload_storage_object import writecheckpoint
+
+indexdir = os.path.join(os.path.expanduser('~'), '.oc', 'sync')
+
+mylogger = initLogging(__name__)
+
+
+# Define methods
+def getindexfilename(directory, container, prefix):
+    # One index per directory and destination
+    key = hashlib.sha1('{0:s}|{1:s}|{2:s}'.format(os.path.abspath(directory), container, prefix).encode('utf-8')).hexdigest()
+    return os.path.join(os.getenv('OC_SYNC_INDEX_DIR', indexdir), key + '.json')
+
+
+def readindex(indexfilename):
+    if os.path.exists(indexfilename):
+        try:
+            with closing(open(indexfilename, 'r')) as f:
+                return json.load(f)
+        except (IOError, ValueError) as e:
+            print('Ignoring unreadable index : ' + indexfilename)
+    return {}
+
+
+def scandirectory(directory, index):
+    # relative path -> {size, mtime, md5}, reusing the indexed MD5 of files whose size and mtime are unchanged
+    files = {}
+    hashed = 0
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = os.path.join(dirpath, filename)
+            relpath = os.path.relpath(path, directory).replace(os.sep, '/')
+            stat = os.stat(path)
+            entry = {'size': stat.st_size, 'mtime': stat.st_mtime}
+            indexed = index.get(relpath)
+            if indexed is not None and indexed.get('size') == entry['size'] and indexed.get('mtime') == entry['mtime']:
+                entry['md5'] = indexed.get('md5')
+                entry['remote'] = indexed.get('remote')
+            else:
+                entry['md5'] = md5(path)
+                entry['remote'] = None
+                hashed += 1
+            files[relpath] = entry
+    mylogger.info('Scanned {0:d} files under {1:s}, {2:d} hashed'.format(len(files), directory, hashed))
+    return files
+
+
+def isuptodate(entry, remote):
+    # The object as this index last uploaded it, or a plain object with the same content
+    if remote is None:
+        return False
+    if entry['remote'] is not None and [remote.get('bytes'), remote.get('hash')] == entry['remote']:
+        return True
+    return remote.get('bytes') == entry['size'] and remote.get('hash') == entry['md5']
+
+
+def getstaticlargeobjects(endpoint, container, authtoken, names, poolsize=4):
+    # Only the object headers tell a static large object's manifest from an ordinary object
+    def isstaticlargeobject(name):
+        response = callRESTApi(endpoint, container, name, method='HEAD', authtoken=authtoken)
+        return response.headers.get('X-Static-Large-Object', '').lower() == 'true'
+
+    executor = AdaptiveExecutor(initial=poolsize)
+    return set(name for name, found, exception, elapsed in executor.run(isstaticlargeobject, names) if exception is None and found)
+
+
+def syncStorageObjects(endpoint, resourcename, authtoken, directory, prefix='', delete=False, splitsize=4000, poolsize=4, authendpoint=None, user=None, password=None, maxpoolsize=None, bandwidth=None, **kwargs):
+    container = resourcename
+    # One limit for all the files uploading at once
+    throttle = getbandwidthlimiter(bandwidth)
+    indexfilename = getindexfilename(directory, container, prefix)
+    files = scandirectory(directory, readindex(indexfilename))
+    remote = dict((entry['name'], entry) for entry in iterStorageObjects(endpoint, container, authtoken, prefix=prefix))
+    result = {'uploaded': [], 'skipped': 0, 'deleted': [], 'failed': [], 'bytes': 0}
+    pending = []
+    for relpath, entry in sorted(files.items()):
+        if isuptodate(entry, remote.get(prefix + relpath)):
+            result['skipped'] += 1
+        else:
+            pending.append(relpath)
+    print('Syncing ' + directory + ' : ' + str(len(pending)) + ' of ' + str(len(files)) + ' files to upload')
+    splitbytes = splitsize * 1024 * 1024
+
+    def upload(relpath):
+        # Segments are uploaded in parallel, so files large enough to be split are uploaded on their own
+        return uploadStorageObject(endpoint, container, authtoken, os.path.join(directory, relpath), splitsize, poolsize if files[relpath]['size'] > splitbytes else 1,
+                                   authendpoint, user, password, maxpoolsize=maxpoolsize, objectname=prefix + relpath, bandwidth=throttle)
+
+    try:
+        small = [relpath for relpath in pending if files[relpath]['size'] <= splitbytes]
+        large = [relpath for relpath in pending if files[relpath]['size'] > splitbytes]
+        outcomes = list(AdaptiveExecutor(initial=poolsize, maximum=maxpoolsize).run(upload, small, lambda relpath: files[relpath]['size']))
+        outcomes.extend(AdaptiveExecutor(initial=1, maximum=1).run(upload, large))
+        for relpath, response, exception, elapsed in outcomes:
+            if exception is None:
+                result['uploaded'].append(prefix + relpath)
+                result['bytes'] += files[relpath]['size']
+            else:
+                print('Failed    : ' + relpath + ' : ' + str(exception))
+                result['failed'].append([prefix + relpath, str(exception)])
+        if len(result['uploaded']) > 0:
+            # Record the uploaded objects as the listing shows them, manifests list differently from their content
+            uploaded = set(result['uploaded'])
+            for entry in iterStorageObjects(endpoint, container, authtoken, prefix=prefix):
+                if entry['name'] in uploaded:
+                    files[entry['name'][len(prefix):]]['remote'] = [entry.get('bytes'), entry.get('hash')]
+        if delete:
+            extra = sorted(name for name in remote if name[len(prefix):] not in files)
+            # Empty objects may be dynamic large object manifests
+            manifests = set(name for name in extra if remote[name].get('bytes') == 0)
+            manifests.update(getstaticlargeobjects(endpoint, container, authtoken, [name for name in extra if name not in manifests], poolsize))
+            plain = [('/' + container + '/' + name, remote[name].get('bytes', 0)) for name in extra if name not in manifests]
+            if len(plain) > 0:
+                deleted = bulkDeletePaths(endpoint, authtoken, plain, poolsize)
+                failed = set(path for path, error in deleted['failed'])
+                result['deleted'].extend(path[len(container) + 2:] for path, size in plain if path.lstrip('/') not in failed)
+                result['failed'].extend(deleted['failed'])
+            # Manifests take their segments with them
+            for name in extra:
+                if name in manifests:
+                    deleted = bulkDeleteLargeObject(endpoint, name, authtoken, container, poolsize)
+                    result['failed'].extend(deleted['failed'])
+                    if len(deleted['failed']) == 0:
+                        result['deleted'].append(name)
+    finally:
+        # Files that failed to upload keep their hash but not an uploaded object, so they are tried again
+        failed = set(path for path, error in result['failed'])
+        for relpath, entry in files.items():
+            if prefix + relpath in failed:
+                entry['remote'] = None
+        writecheckpoint(indexfilename, files)
+    print('Synced ' + directory + ' : ' + str(len(result['uploaded'])) + ' uploaded, ' + str(result['skipped']) + ' unchanged, ' + str(len(result['deleted'])) + ' deleted, ' + str(len(result['failed'])) + ' failed')
+    return result
+
+
+# Read Module Arguments
+def readModuleArgs(opts, args):
+    moduleArgs = {}
+    moduleArgs['endpoint'] = None
+    moduleArgs['user'] = None
+    moduleArgs['password'] = None
+    moduleArgs['pwdfile'] = None
+    moduleArgs['container'] = None
+    moduleArgs['directory'] = None
+    moduleArgs['prefix'] = ''
+    moduleArgs['delete'] = False
+    moduleArgs['poolsize'] = 4
+
+    # Read Module Command Line Arguments.
+    for opt, arg in opts:
+        if opt in ("-e", "--endpoint"):
+            moduleArgs['endpoint'] = arg
+        elif opt in ("-u", "--user"):
+            moduleArgs['user'] = arg
+        elif opt in ("-p", "--password"):
+            moduleArgs['password'] = arg
+        elif opt in ("-P", "--pwdfile"):
+            moduleArgs['pwdfile'] = arg
+        elif opt in ("-c", "--container"):
+            moduleArgs['container'] = arg
+        elif opt in ("-d", "--directory"):
+            moduleArgs['directory'] = arg
+        elif opt in ("-x", "--prefix"):
+            moduleArgs['prefix'] = arg
+        elif opt in ("-D", "--delete"):
+            moduleArgs['delete'] = True
+        elif opt in ("-t", "--poolsize"):
+            moduleArgs['poolsize'] = int(arg)
+    return moduleArgs
+
+
+# Main processing function
+def main(argv):
+    # Configure Parameters and Options
+    options = 'e:u:p:P:c:d:x:Dt:'
+    longOptions = ['endpoint=', 'user=', 'password=', 'pwdfile=', 'container=', 'directory=', 'prefix=', 'delete',
+                   'poolsize=']
+    # Get Options & Arguments
+    try:
+        opts, args = getopt.getopt(argv, options, longOptions)
+        # Read Module Arguments
+        moduleArgs = readModuleArgs(opts, args)
+
+        if moduleArgs['endpoint'] is not None and moduleArgs['user'] is not None and moduleArgs['container'] is not None and moduleArgs['directory'] is not None:
+            if moduleArgs['password'] is None and moduleArgs['pwdfile'] is None:
+                moduleArgs['password'] = getPassword(moduleArgs['user'])
+            elif moduleArgs['pwdfile'] is not None:
+                with open(moduleArgs['pwdfile'], 'r') as f:
+                    moduleArgs['password'] = f.read().rstrip('\n')
+            authtoken, storageurl = authenticate(moduleArgs['endpoint'], moduleArgs['user'], moduleArgs['password'])
+            jsonObj = syncStorageObjects(storageurl, moduleArgs['container'], authtoken, moduleArgs['directory'], moduleArgs['prefix'],
+                                         moduleArgs['delete'], poolsize=moduleArgs['poolsize'], authendpoint=moduleArgs['endpoint'],
+                                         user=moduleArgs['user'], password=moduleArgs['password'])
+            printJSON(jsonObj)
+        else:
+            print ('Incorrect parameters')
+    except getopt.GetoptError:
+        usage()
+    except Exception as e:
+        print('Unknown Exception please check log file')
+        logging.exception(e)
+        sys.exit(1)
+
+    return
+
+
+# Main function to kick off processing
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -23,15 +23,19 @@ import hashlib
 import json
 import locale
 import logging
-import multiprocessing
 import operator
 import os
 import requests
-import shutil
 import subprocess
 import sys
 import tempfile
+import threading
+import time
 from contextlib import closing
+try:
+    from shutil import which as find_executable
+except ImportError:
+    from distutils.spawn import find_executable
 
 # Import utility methods
 
@@ -40,7 +44,31 @@ from oscsutils import callRESTApi
 from oscsutils import getPassword
 from oscsutils import printJSON
 from authenticate_oscs import authenticate
+from list_storage_objects import iterStorageObjects
+from oc_exceptions import RESTException
 from oc_exceptions import REST401Exception
+from oc_exceptions import OCSegmentOverflow
+from oc_adaptive import AdaptiveExecutor
+from oc_adaptive import formatRate
+from oc_filesegment import FileSegment
+from oc_filesegment import StreamSegment
+from oc_filesegment import defaultblocksize
+from oc_filesegment import getSegmentRanges
+from oc_filesegment import getSegmentSuffix
+from oc_logging import initLogging
+from oc_progress import TransferProgress
+from oc_ratelimit import TokenBucket
+
+checkpointdir = os.path.join(os.path.expanduser('~'), '.oc', 'uploads')
+# Sends of an object whose ETag does not match what we sent
+maxsendattempts = 3
+# Swift's default limit on the segments of a static large object
+maxslosegments = 1000
+# Compressors tried in turn for compressed uploads
+compressors = ['pigz', 'gzip']
+
+mylogger = initLogging(__name__)
+
 
 # Define methods
 def md5(fname, readbuf=104857600, **kwargs):
@@ -58,51 +86,336 @@ def getsplitprefix(filename):
     return os.path.split(filename)[-1] + '-'
 
 
-def getsplitdir(filename):
-    return filename + '.split'
+def getsegments(filename, segmentsize):
+    # (resourcename, offset, length) of each segment, named as split(1) would have named them
+    prefix = getsplitprefix(filename)
+    ranges = getSegmentRanges(os.path.getsize(filename), segmentsize)
+    return [(prefix + getSegmentSuffix(index, len(ranges)), offset, length) for index, (offset, length) in enumerate(ranges)]
 
 
-def splitfile(filename, size='5GB', **kwargs):
-    files = []
-    if filename is not None:
-        splitdir = getsplitdir(filename)
-        os.makedirs(splitdir)
-        prefix = os.path.join(splitdir, getsplitprefix(filename))
-        cmd = ['split', '-b', size, filename, prefix]
-        cmdEnv = dict(os.environ)
-        outputLines = []
-        with closing(tempfile.TemporaryFile()) as fout:
-            try:
-                outputLines = subprocess.check_output(cmd, env=cmdEnv, stderr=fout).splitlines()
-            except subprocess.CalledProcessError as e:
-                fout.flush()
-                fout.seek(0)
-                print(fout.read())
-                print('\n'.join(outputLines))
-                raise e
-        return [os.path.join(splitdir, fn) for fn in os.listdir(splitdir)]
-
-
-def uploadfile((endpoint, basepath, authtoken, filename, authendpoint, user, password, headers, params)):
-    print('Uploading : ' + filename)
+def getcheckpointfilename(operation, filename, target):
+    # One checkpoint per operation, local file and container or object, so an
+    # upload and a download of the same pair keep apart
+    key = hashlib.sha1('{0:s}|{1:s}|{2:s}'.format(operation, os.path.abspath(filename), target).encode('utf-8')).hexdigest()
+    return os.path.join(os.getenv('OC_UPLOAD_CHECKPOINT_DIR', checkpointdir), key + '.json')
+
+
+def readcheckpoint(checkpointfilename, filename, segments, segmentsize, basepath):
+    stat = os.stat(filename)
+    source = {'filename': os.path.abspath(filename), 'size': stat.st_size, 'mtime': stat.st_mtime,
+              'segmentsize': segmentsize, 'basepath': basepath}
+    checkpoint = None
+    if os.path.exists(checkpointfilename):
+        try:
+            with closing(open(checkpointfilename, 'r')) as f:
+                checkpoint = json.load(f)
+        except (IOError, ValueError) as e:
+            print('Ignoring unreadable checkpoint : ' + checkpointfilename)
+            checkpoint = None
+    # A changed source file, or segment layout, invalidates every recorded segment
+    if checkpoint is None or checkpoint.get('source') != source:
+        checkpoint = {'source': source, 'segments': {}}
+        for segmentname, offset, length in segments:
+            checkpoint['segments'][segmentname] = {'offset': offset, 'length': length, 'md5': None, 'etag': None}
+    return checkpoint
+
+
+def writecheckpoint(checkpointfilename, checkpoint):
+    checkpointdirname = os.path.dirname(checkpointfilename)
+    if not os.path.exists(checkpointdirname):
+        os.makedirs(checkpointdirname, 0o700)
+    tmpfilename = '{0:s}.{1:d}.tmp'.format(checkpointfilename, os.getpid())
+    with closing(open(tmpfilename, 'w')) as f:
+        json.dump(checkpoint, f)
+    os.rename(tmpfilename, checkpointfilename)
+    return
+
+
+def removecheckpoint(checkpointfilename):
+    if os.path.exists(checkpointfilename):
+        os.remove(checkpointfilename)
+    return
+
+
+def listsegments(credentials, container, prefix):
+    authtoken = credentials['authtoken']
+    try:
+        return list(iterStorageObjects(credentials['endpoint'], container, authtoken, prefix=prefix))
+    except REST401Exception as e:
+        # Reauthenticate and retry, unless another thread already has
+        if credentials['authendpoint'] is not None and credentials['user'] is not None and credentials['password'] is not None:
+            with credentials['lock']:
+                if credentials['authtoken'] == authtoken:
+                    credentials['authtoken'], credentials['endpoint'] = authenticate(credentials['authendpoint'], credentials['user'], credentials['password'])
+            return list(iterStorageObjects(credentials['endpoint'], container, credentials['authtoken'], prefix=prefix))
+        else:
+            raise
+
+
+def getconfirmedsegments(credentials, container, prefix, checkpoint):
+    # Segments recorded as uploaded that the container still holds unchanged
+    confirmed = set()
+    recorded = dict((prefix + segmentname, segmentname) for segmentname, segment in checkpoint['segments'].items() if segment['etag'] is not None)
+    if len(recorded) == 0:
+        return confirmed
+    try:
+        for entry in listsegments(credentials, container, prefix):
+            segmentname = recorded.get(entry.get('name'))
+            if segmentname is not None:
+                segment = checkpoint['segments'][segmentname]
+                if entry.get('bytes') == segment['length'] and entry.get('hash') == segment['etag']:
+                    confirmed.add(segmentname)
+    except (RESTException, REST401Exception) as e:
+        print('Unable to verify uploaded segments, uploading all : ' + str(e))
+        confirmed = set()
+    return confirmed
+
+
+def getetag(response):
+    # Swift quotes the ETag of manifests
+    etag = response.headers.get('ETag')
+    return etag.strip('"') if etag is not None else None
+
+
+def getmanifestetag(segmentmd5s):
+    # What Swift reports as the ETag of a segmented object
+    return hashlib.md5(''.join(segmentmd5s).encode('utf-8')).hexdigest()
+
+
+def getslomanifest(basepath, segmentlist):
+    # Explicit segment paths, sizes and ETags, in order
+    manifest = []
+    for segmentname, length, etag in segmentlist:
+        manifest.append({'path': '/' + basepath + '/' + segmentname, 'etag': etag, 'size_bytes': length})
+    return manifest
+
+
+def putmanifest(credentials, container, resourcename, basepath, splitprefix, segmentlist, manifesttype='dlo', params=None, metadata=None):
+    # Tie the uploaded segments, [(segmentname, length, etag)], together as container/resourcename
     files = None
-    resourcename = os.path.split(filename)[-1]
+    if manifesttype == 'slo':
+        # Static large object, the segments are named rather than found by listing
+        data = json.dumps(getslomanifest(basepath, segmentlist))
+        headers = {'Content-Type': 'application/json'}
+        params = dict(params or {})
+        params['multipart-manifest'] = 'put'
+    else:
+        manifest = basepath + '/' + splitprefix
+        headers = {'Content-Length': "0", 'X-Object-Manifest': manifest}
+        data = None
+    if metadata is not None:
+        headers.update(metadata)
+    printJSON(headers)
+    authtoken = credentials['authtoken']
     try:
-        with closing(open(filename, 'rb')) as f:
-            response = callRESTApi(endpoint, basepath, resourcename, method='PUT', authtoken=authtoken, headers=headers, params=params, data=f, files=files)
+        response = callRESTApi(credentials['endpoint'], container, resourcename, method='PUT', authtoken=authtoken, headers=headers, params=params, data=data, files=files)
     except REST401Exception as e:
         # Reauthenticate and retry
-        if authendpoint is not None and user is not None and password is not None:
-            authtoken, endpoint = authenticate(authendpoint, user, password)
-            with closing(open(filename, 'rb')) as f:
-                response = callRESTApi(endpoint, basepath, resourcename, method='PUT', authtoken=authtoken, headers=headers, params=params, data=f, files=files)
+        if credentials['authendpoint'] is not None and credentials['user'] is not None and credentials['password'] is not None:
+            with credentials['lock']:
+                if credentials['authtoken'] == authtoken:
+                    credentials['authtoken'], credentials['endpoint'] = authenticate(credentials['authendpoint'], credentials['user'], credentials['password'])
+            response = callRESTApi(credentials['endpoint'], container, resourcename, method='PUT', authtoken=credentials['authtoken'], headers=headers, params=params, data=data, files=files)
+        else:
+            raise
+    return response
+
+
+def getbandwidthlimiter(bandwidth=None):
+    # bandwidth in MB/s, or a limiter already shared with other uploads
+    if bandwidth is None:
+        bandwidth = os.getenv('OC_UPLOAD_BANDWIDTH')
+    if bandwidth is None or hasattr(bandwidth, 'acquire'):
+        return bandwidth
+    try:
+        rate = float(bandwidth) * 1024 * 1024
+    except ValueError as e:
+        print('Ignoring invalid bandwidth : ' + str(bandwidth))
+        return None
+    # A second's worth of burst keeps every upload thread under one aggregate rate
+    return TokenBucket(rate, rate) if rate > 0 else None
+
+
+def putobject(endpoint, basepath, authtoken, filename, resourcename, offset, length, headers, params, throttle=None, progress=None):
+    # Send a byte range of filename, hashing it as it is sent, and re-send it
+    # until the server's ETag matches. Returns (response, md5).
+    files = None
+    callback = (lambda position: progress.setPosition(resourcename, position)) if progress is not None else None
+    for attempt in range(1, maxsendattempts + 1):
+        with closing(FileSegment(filename, offset, length, digest=True, throttle=throttle, callback=callback)) as f:
+            response = callRESTApi(endpoint, basepath, resourcename, method='PUT', authtoken=authtoken, headers=headers, params=params, data=f, files=files)
+            md5hash = f.hexdigest()
+        etag = getetag(response)
+        # Nothing to compare against, e.g. for an extracted archive
+        if etag is None or md5hash is None or etag == md5hash:
+            return response, md5hash
+        print('Checksum mismatch : ' + resourcename + ' sent ' + md5hash + ' stored ' + etag + ' (attempt ' + str(attempt) + ')')
+    raise RESTException('{0:s} : stored ETag {1:s} does not match MD5 {2:s} after {3:d} attempts'.format(resourcename, etag, md5hash, maxsendattempts))
+
+
+def uploadfile(credentials, basepath, filename, resourcename, offset, length, headers, params, throttle=None, progress=None):
+    # credentials is shared by the upload threads so a token refreshed by one is used by all
+    print('Uploading : ' + resourcename)
+    if progress is not None:
+        progress.setState(resourcename, 'active')
+    authtoken = credentials['authtoken']
+    try:
+        response, md5hash = putobject(credentials['endpoint'], basepath, authtoken, filename, resourcename, offset, length, headers, params, throttle, progress)
+    except REST401Exception as e:
+        # Reauthenticate and retry, unless another thread already has
+        if credentials['authendpoint'] is not None and credentials['user'] is not None and credentials['password'] is not None:
+            with credentials['lock']:
+                if credentials['authtoken'] == authtoken:
+                    credentials['authtoken'], credentials['endpoint'] = authenticate(credentials['authendpoint'], credentials['user'], credentials['password'])
+            response, md5hash = putobject(credentials['endpoint'], basepath, credentials['authtoken'], filename, resourcename, offset, length, headers, params, throttle, progress)
         else:
             raise
-    print('Uploaded  : ' + filename)
+    return getetag(response), md5hash
+
+
+def getcompressor():
+    # A parallel gzip when installed, it writes the same format
+    for compressor in compressors:
+        path = find_executable(compressor)
+        if path is not None:
+            return path
+    return None
+
+
+def getarchivecommand(filename):
+    if find_executable('tar') is None:
+        raise RESTException('{0:s} : tar is needed to compress the upload'.format(filename))
+    compressor = getcompressor()
+    if compressor is None:
+        raise RESTException('{0:s} : gzip is needed to compress the upload'.format(filename))
+    directory, name = os.path.split(os.path.abspath(filename))
+    # -S stores the holes of a sparse image as holes rather than reading them as zeros
+    return ['tar', '-C', directory, '-cSf', '-', '--use-compress-program=' + compressor, name]
+
+
+def putstream(credentials, basepath, resourcename, segment, headers, params, progress=None):
+    # A streamed body is sent once, there is no resend on a checksum mismatch or a 401
+    if progress is not None:
+        progress.addSegment(resourcename, segment.limit, 'active')
+        segment.callback = lambda position: progress.setPosition(resourcename, position)
+    try:
+        response = callRESTApi(credentials['endpoint'], basepath, resourcename, method='PUT', authtoken=credentials['authtoken'], headers=headers, params=params, data=segment)
+        etag = getetag(response)
+        md5hash = segment.hexdigest()
+        # Nothing to compare against, e.g. for an extracted archive
+        if etag is not None and etag != md5hash:
+            raise RESTException('{0:s} : stored ETag {1:s} does not match MD5 {2:s}'.format(resourcename, etag, md5hash))
+    except Exception as e:
+        if progress is not None:
+            progress.setState(resourcename, 'failed')
+        raise
+    if progress is not None:
+        progress.addSegment(resourcename, segment.length, 'done')
+    return response, etag
+
+
+def checkarchive(process, errors, filename):
+    # A tar that failed part way leaves a truncated archive
+    if process.wait() != 0:
+        errors.seek(0)
+        raise RESTException('{0:s} : tar exited with {1:d} : {2:s}'.format(filename, process.returncode, errors.read().decode('utf-8', 'replace').strip()))
     return
 
 
-def uploadStorageObject(endpoint, container='compute_images', authtoken=None, filename=None, splitsize=4000, poolsize=4, authendpoint=None, user=None, password=None, extractarchive=None, **kwargs):
+def uploadCompressedStorageObject(endpoint, container='compute_images', authtoken=None, filename=None, splitsize=4000, poolsize=4, authendpoint=None, user=None, password=None, extractarchive=None, verify=False, maxpoolsize=None, manifesttype='dlo', objectname=None, bandwidth=None, progress=None, **kwargs):
+    """Upload filename as a tar.gz archive, objectname + '.tar.gz', compressed as it is sent.
+
+    The archive is never written out, not even in part: tar's output is cut
+    into splitsize MB segments that are each sent as a chunked request body
+    while they are read from the pipe. Segments therefore go up one at a time,
+    at the pace of the compressor, and the archive is stored as a large object
+    with X-Object-Meta-Archive-Format tar.gz, to be extracted after download.
+    With extractarchive the archive is sent as a single request instead, as
+    Swift only extracts archives sent whole, and the upload is abandoned before
+    it completes once the archive exceeds splitsize. A streamed body cannot be sent twice, so there is no
+    retry, reauthentication or resume: a failed upload starts again from the
+    beginning.
+    """
+    if objectname is None:
+        objectname = os.path.split(filename)[-1]
+    archivename = objectname + '.tar.gz'
+    throttle = getbandwidthlimiter(bandwidth)
+    if progress is None:
+        progress = TransferProgress(archivename)
+    segmentsize = splitsize * 1024 * 1024
+    # The archive's size is only known once it is sent. The count sets the
+    # width of the segment suffixes, allow for gzip growing data it cannot
+    # compress and for the tar headers.
+    count = len(getSegmentRanges(os.path.getsize(filename) + os.path.getsize(filename) // 100 + 65536, segmentsize))
+    splitbasepath = container + '_segments'
+    basepath = splitbasepath + '/' + archivename + '/_segment_'
+    splitprefix = getsplitprefix(archivename)
+    metadata = {'X-Object-Meta-Archive-Format': 'tar.gz', 'X-Object-Meta-Archive-Member': os.path.split(filename)[-1],
+                'X-Object-Meta-Archive-Source-Bytes': str(os.path.getsize(filename))}
+    credentials = {'endpoint': endpoint, 'authtoken': authtoken, 'authendpoint': authendpoint, 'user': user,
+                   'password': password, 'lock': threading.Lock()}
+    command = getarchivecommand(filename)
+    print('Compressing ' + filename + ' : ' + ' '.join(command))
+    segmentlist = []
+    with tempfile.TemporaryFile() as errors:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=errors)
+        try:
+            if extractarchive is not None:
+                segment = StreamSegment(process.stdout, segmentsize, throttle=throttle, whole=True)
+                try:
+                    response, etag = putstream(credentials, container, archivename, segment, metadata, {'extract-archive': extractarchive}, progress)
+                except OCSegmentOverflow as e:
+                    raise RESTException('{0:s} : archive exceeds the {1:d} MB split size, Swift cannot extract a segmented archive'.format(archivename, splitsize))
+            else:
+                index = 0
+                while True:
+                    # Peek so that an archive filling its last segment exactly does not get an empty one
+                    first = process.stdout.read(min(defaultblocksize, segmentsize))
+                    if len(first) == 0 and index > 0:
+                        break
+                    if index >= count:
+                        raise RESTException('{0:s} : archive has more than the {1:d} segments expected for {2:s}, increase the split size'.format(archivename, count, filename))
+                    segmentname = splitprefix + getSegmentSuffix(index, count)
+                    segment = StreamSegment(process.stdout, segmentsize, first, throttle=throttle)
+                    start = time.time()
+                    response, etag = putstream(credentials, basepath, segmentname, segment, None, None, progress)
+                    elapsed = time.time() - start
+                    segmentlist.append((segmentname, segment.length, etag))
+                    print('Uploaded  : ' + segmentname)
+                    mylogger.info('{0:s} : {1:d} bytes in {2:.2f}s, {3:s}'.format(segmentname, segment.length, elapsed, formatRate(segment.length / max(elapsed, 1e-6))))
+                    index += 1
+                    if segment.ended:
+                        break
+        except Exception as e:
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+            raise
+        finally:
+            process.stdout.close()
+            progress.finish()
+        # tar has finished, a truncated archive is caught before the manifest makes it visible
+        checkarchive(process, errors, filename)
+    if extractarchive is not None:
+        print('Uploaded : ' + archivename)
+        return response.text
+    print('Compressed ' + filename + ' from ' + str(os.path.getsize(filename)) + ' to ' + str(sum(length for segmentname, length, etag in segmentlist)) + ' bytes in ' + str(len(segmentlist)) + ' segments')
+    response = putmanifest(credentials, container, archivename, basepath, splitprefix, segmentlist, manifesttype, metadata=metadata)
+    if verify:
+        expected = getmanifestetag([etag for segmentname, length, etag in segmentlist])
+        etag = getetag(callRESTApi(credentials['endpoint'], container, archivename, method='HEAD', authtoken=credentials['authtoken']))
+        if etag != expected:
+            raise RESTException('{0:s} : manifest ETag {1!s} does not match segments {2:s}'.format(archivename, etag, expected))
+        print('Verified  : ' + archivename + ' ' + etag)
+    return response.text
+
+
+def uploadStorageObject(endpoint, container='compute_images', authtoken=None, filename=None, splitsize=4000, poolsize=4, authendpoint=None, user=None, password=None, extractarchive=None, verify=False, maxpoolsize=None, manifesttype='dlo', objectname=None, bandwidth=None, progress=None, compress=None, **kwargs):
+    if compress is not None and filename is not None and os.path.exists(filename):
+        if compress != 'tar.gz':
+            raise RESTException('{0:s} : unsupported compression {1:s}, only tar.gz'.format(filename, compress))
+        return uploadCompressedStorageObject(endpoint, container, authtoken, filename, splitsize, poolsize, authendpoint, user, password, extractarchive,
+                                             verify, maxpoolsize, manifesttype, objectname, bandwidth, progress)
     basepath = container
     imgbasepath = basepath
     splitbasepath = basepath + '_segments'
@@ -116,49 +429,88 @@ def uploadStorageObject(endpoint, container='compute_images', authtoken=None, fi
     files = None
     jsonResponse = ''
     if filename is not None and os.path.exists(filename):
+        # The object is named after the file unless told otherwise
+        if objectname is None:
+            objectname = os.path.split(filename)[-1]
+        throttle = getbandwidthlimiter(bandwidth)
+        if progress is None:
+            progress = TransferProgress(objectname)
         #md5hash = md5(filename)
         filesize = os.path.getsize(filename)
         filesize /= (1024 * 1024)
         if filesize > splitsize:
-            print('Splitting : ' + filename)
-            filelist = splitfile(filename, str(splitsize) + 'MB')
-            print('Into ' + str(len(filelist)) + ' segments')
-            basepath = splitbasepath + '/' + os.path.split(filename)[-1] + '/_segment_'
-            pool = multiprocessing.Pool(poolsize)
-            # Build tupal list
-            workerdata = []
-            for fn in filelist:
-                workerdata.append([endpoint, basepath, authtoken, fn, authendpoint, user, password, headers, params])
-            #print(workerdata)
-            # Start processes
-            pool.map(uploadfile, workerdata)
+            # Segments are read straight from their byte range of the file
+            segmentsize = splitsize * 1024 * 1024
+            segments = getsegments(filename, segmentsize)
+            if manifesttype == 'slo' and len(segments) > maxslosegments:
+                raise RESTException('{0:s} : {1:d} segments exceeds the {2:d} a static large object may have, increase the split size'.format(filename, len(segments), maxslosegments))
+            basepath = splitbasepath + '/' + objectname + '/_segment_'
+            # Skip segments a previous run uploaded and the container still holds
+            checkpointfilename = getcheckpointfilename('upload', filename, imgbasepath)
+            checkpoint = readcheckpoint(checkpointfilename, filename, segments, segmentsize, basepath)
+            segmentprefix = objectname + '/_segment_/'
+            credentials = {'endpoint': endpoint, 'authtoken': authtoken, 'authendpoint': authendpoint, 'user': user,
+                           'password': password, 'lock': threading.Lock()}
+            confirmed = getconfirmedsegments(credentials, splitbasepath, segmentprefix, checkpoint)
+            print('Uploading ' + filename + ' in ' + str(len(segments)) + ' segments, ' + str(len(confirmed)) + ' already uploaded')
+            for segmentname, offset, length in segments:
+                progress.addSegment(segmentname, length, 'skipped' if segmentname in confirmed else 'pending')
+            # Network bound, so threads rather than processes, starting with poolsize in flight
+            pending = [segment for segment in segments if segment[0] not in confirmed]
+
+            def upload(segment):
+                return uploadfile(credentials, basepath, filename, segment[0], segment[1], segment[2], headers, params, throttle, progress)
+
+            executor = AdaptiveExecutor(initial=poolsize, maximum=maxpoolsize)
+            failed = []
+            # Record each segment as it completes
+            for (segmentname, offset, length), result, exception, elapsed in executor.run(upload, pending, operator.itemgetter(2)):
+                if exception is None:
+                    etag, md5hash = result
+                    checkpoint['segments'][segmentname]['etag'] = etag
+                    checkpoint['segments'][segmentname]['md5'] = md5hash
+                    writecheckpoint(checkpointfilename, checkpoint)
+                    progress.setState(segmentname, 'done')
+                    print('Uploaded  : ' + segmentname)
+                    mylogger.info('{0:s} : {1:d} bytes in {2:.2f}s, {3:s}, concurrency {4:d}'.format(segmentname, length, elapsed, formatRate(length / max(elapsed, 1e-6)), executor.concurrency))
+                else:
+                    progress.setState(segmentname, 'failed')
+                    print('Failed    : ' + segmentname + ' : ' + str(exception))
+                    failed.append(segmentname)
+            progress.finish()
+            if len(failed) > 0:
+                # The manifest is only written once every segment is in place
+                raise RESTException('{0:d} of {1:d} segments failed to upload, rerun to resume : {2:s}'.format(len(failed), len(segments), ', '.join(sorted(failed))))
             # Upload manifest file to point to parts
-            manifest = basepath + '/' + getsplitprefix(filename)
-            resourcename = os.path.split(filename)[-1]
-            headers = {'Content-Length': "0", 'X-Object-Manifest': manifest}
-            printJSON(headers)
-            data = None
+            resourcename = objectname
+            segmentlist = [(segmentname, length, checkpoint['segments'][segmentname]['etag']) for segmentname, offset, length in segments]
+            response = putmanifest(credentials, imgbasepath, resourcename, basepath, getsplitprefix(filename), segmentlist, manifesttype, params)
+            endpoint = credentials['endpoint']
+            authtoken = credentials['authtoken']
             basepath = imgbasepath
-            try:
-                response = callRESTApi(endpoint, basepath, resourcename, method='PUT', authtoken=authtoken, headers=headers, params=params, data=data, files=files)
-            except REST401Exception as e:
-                # Reauthenticate and retry
-                if authendpoint is not None and user is not None and password is not None:
-                    authtoken, endpoint = authenticate(authendpoint, user, password)
-                    response = callRESTApi(endpoint, basepath, resourcename, method='PUT', authtoken=authtoken, headers=headers, params=params, data=data, files=files)
-                else:
-                    raise
-            # Remove splitfiles
-            splitdir = getsplitdir(filename)
-            shutil.rmtree(splitdir)
+            if verify:
+                # The whole object digest follows from the segment digests without reading the file again
+                expected = getmanifestetag([etag for segmentname, length, etag in segmentlist])
+                etag = getetag(callRESTApi(endpoint, basepath, resourcename, method='HEAD', authtoken=authtoken))
+                if etag != expected:
+                    raise RESTException('{0:s} : manifest ETag {1!s} does not match segments {2:s}, rerun to resume'.format(resourcename, etag, expected))
+                print('Verified  : ' + resourcename + ' ' + etag)
+            removecheckpoint(checkpointfilename)
         else:
             # Simple single file upload
             basepath = imgbasepath
             # Upload file
             print('Uploading : ' + filename)
-            resourcename = os.path.split(filename)[-1]
-            with closing(open(filename, 'rb')) as f:
-                response = callRESTApi(endpoint, basepath, resourcename, method='PUT', authtoken=authtoken, headers=headers, params=params, data=f, files=files)
+            resourcename = objectname
+            progress.addSegment(resourcename, os.path.getsize(filename), 'active')
+            try:
+                response, md5hash = putobject(endpoint, basepath, authtoken, filename, resourcename, 0, os.path.getsize(filename), headers, params, throttle, progress)
+                progress.setState(resourcename, 'done')
+            except Exception as e:
+                progress.setState(resourcename, 'failed')
+                raise
+            finally:
+                progress.finish()
             print('Uploaded : ' + filename)
         jsonResponse = response.text
     return jsonResponse
@@ -171,6 +523,12 @@ def readModuleArgs(opts, args):
     moduleArgs['user'] = None
     moduleArgs['password'] = None
     moduleArgs['pwdfile'] = None
+    moduleArgs['container'] = 'compute_images'
+    moduleArgs['filename'] = None
+    moduleArgs['splitsize'] = 4000
+    moduleArgs['poolsize'] = 4
+    moduleArgs['bandwidth'] = None
+    moduleArgs['compress'] = None
 
     # Read Module Command Line Arguments.
     for opt, arg in opts:
@@ -182,19 +540,48 @@ def readModuleArgs(opts, args):
             moduleArgs['password'] = arg
         elif opt in ("-P", "--pwdfile"):
             moduleArgs['pwdfile'] = arg
+        elif opt in ("-c", "--container"):
+            moduleArgs['container'] = arg
+        elif opt in ("-f", "--filename"):
+            moduleArgs['filename'] = arg
+        elif opt in ("-s", "--splitsize"):
+            moduleArgs['splitsize'] = int(arg)
+        elif opt in ("-t", "--poolsize"):
+            moduleArgs['poolsize'] = int(arg)
+        elif opt in ("-b", "--bandwidth"):
+            moduleArgs['bandwidth'] = arg
+        elif opt in ("-z", "--compress"):
+            moduleArgs['compress'] = 'tar.gz'
     return moduleArgs
 
 
 # Main processing function
 def main(argv):
     # Configure Parameters and Options
-    options = 'e:u:p:P:'
-    longOptions = ['endpoint=', 'user=', 'password=', 'pwdfile=']
+    options = 'e:u:p:P:c:f:s:t:b:z'
+    longOptions = ['endpoint=', 'user=', 'password=', 'pwdfile=', 'container=', 'filename=', 'splitsize=', 'poolsize=',
+                   'bandwidth=', 'compress']
     # Get Options & Arguments
     try:
         opts, args = getopt.getopt(argv, options, longOptions)
         # Read Module Arguments
         moduleArgs = readModuleArgs(opts, args)
+
+        if moduleArgs['endpoint'] is not None and moduleArgs['user'] is not None and moduleArgs['filename'] is not None:
+            if moduleArgs['password'] is None and moduleArgs['pwdfile'] is None:
+                moduleArgs['password'] = getPassword(moduleArgs['user'])
+            elif moduleArgs['pwdfile'] is not None:
+                with open(moduleArgs['pwdfile'], 'r') as f:
+                    moduleArgs['password'] = f.read().rstrip('\n')
+            authtoken, storageurl = authenticate(moduleArgs['endpoint'], moduleArgs['user'], moduleArgs['password'])
+            # Progress goes to stderr, stdout carries the upload output
+            progress = TransferProgress(os.path.split(moduleArgs['filename'])[-1], stream=sys.stderr)
+            uploadStorageObject(storageurl, moduleArgs['container'], authtoken, moduleArgs['filename'], moduleArgs['splitsize'],
+                                moduleArgs['poolsize'], moduleArgs['endpoint'], moduleArgs['user'], moduleArgs['password'],
+                                bandwidth=moduleArgs['bandwidth'], progress=progress, compress=moduleArgs['compress'])
+            printJSON(progress.getSummary())
+        else:
+            print ('Incorrect parameters')
     except getopt.GetoptError:
         usage()
     except Exception as e:
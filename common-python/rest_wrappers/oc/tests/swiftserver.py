@@ -0,0 +1,273 @@
+"""In process stand in for the Storage Cloud (Swift) API used by the tests.
+
+Objects are kept in memory by path, /v1/Storage-d/<container>/<object>.
+Dynamic and static large objects, byte ranges, container listings, token
+authentication, the bulk delete middleware, injected 503 faults and bodies
+corrupted in storage are supported, enough to exercise the upload, download,
+sync and delete code against a real HTTP connection.
+"""
+
+import hashlib
+import json
+import threading
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib import unquote
+    from urlparse import parse_qs
+    from urlparse import urlparse
+except ImportError:
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs
+    from urllib.parse import unquote
+    from urllib.parse import urlparse
+
+
+account = '/v1/Storage-d'
+
+
+def getmd5(data):
+    return hashlib.md5(data).hexdigest()
+
+
+class SwiftHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        return
+
+    def reply(self, status, body=b'', headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+        return
+
+    def readbody(self):
+        # Returns None for a chunked body the client abandoned before its last chunk
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            chunks = []
+            while True:
+                line = self.rfile.readline().strip()
+                if len(line) == 0:
+                    self.close_connection = True
+                    return None
+                size = int(line, 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b''.join(chunks)
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def begin(self):
+        # Returns (path, query, body), or None once an error has been sent
+        parsed = urlparse(self.path)
+        path = parsed.path.rstrip('/')
+        query = dict((name, values[0]) for name, values in parse_qs(parsed.query).items())
+        swift = self.server.swift
+        body = self.readbody() if self.command in ['PUT', 'POST'] else b''
+        with swift.lock:
+            if body is None:
+                swift.log.append((self.command, path, query, None))
+                return None
+            swift.log.append((self.command, path, query, len(body)))
+            if path.startswith('/auth'):
+                return path, query, body
+            if swift.tokens is not None and self.headers.get('X-Auth-Token') not in swift.tokens:
+                self.reply(401, b'Unauthorized')
+                return None
+            if swift.faults.get((self.command, path), 0) > 0:
+                swift.faults[(self.command, path)] -= 1
+                self.reply(503, b'Service Unavailable')
+                return None
+        return path, query, body
+
+    def getcontent(self, path):
+        # Returns (data, etag, headers) with large objects assembled from their segments
+        swift = self.server.swift
+        stored = swift.objects[path]
+        manifest = stored['headers'].get('X-Object-Manifest')
+        if manifest is not None:
+            prefix = account + '/' + manifest
+            names = sorted(name for name in swift.objects if name.startswith(prefix))
+            etag = '"' + getmd5(''.join(swift.objects[name]['etag'] for name in names).encode('utf-8')) + '"'
+            return b''.join(swift.objects[name]['data'] for name in names), etag, {'X-Object-Manifest': manifest}
+        if 'segments' in stored:
+            segments = [swift.objects[account + segment['path']] for segment in stored['segments']]
+            return b''.join(segment['data'] for segment in segments), stored['etag'], {'X-Static-Large-Object': 'True'}
+        return stored['data'], stored['etag'], {}
+
+    def getlistingentry(self, name, stored):
+        # A static large object lists with the size of its content, a dynamic one as empty
+        size = sum(segment['size_bytes'] for segment in stored['segments']) if 'segments' in stored else len(stored['data'])
+        return {'name': name, 'bytes': size, 'hash': stored['etag'].strip('"'), 'last_modified': '2017-01-01T00:00:00.000000'}
+
+    def do_PUT(self):
+        request = self.begin()
+        if request is None:
+            return
+        path, query, body = request
+        swift = self.server.swift
+        with swift.lock:
+            if query.get('multipart-manifest') == 'put':
+                segments = json.loads(body.decode('utf-8'))
+                for segment in segments:
+                    stored = swift.objects.get(account + segment['path'])
+                    if stored is None or stored['etag'] != segment['etag'] or len(stored['data']) != segment['size_bytes']:
+                        return self.reply(400, b'Bad segment ' + segment['path'].encode('utf-8'))
+                etag = '"' + getmd5(''.join(segment['etag'] for segment in segments).encode('utf-8')) + '"'
+                swift.objects[path] = {'data': b'', 'etag': etag, 'headers': {}, 'segments': segments}
+                return self.reply(201, b'', {'ETag': etag})
+            headers = dict((name, self.headers.get(name)) for name in ['X-Object-Manifest'] if self.headers.get(name) is not None)
+            if swift.corruptions.get(path, 0) > 0:
+                # Stored damaged, the ETag reported no longer matches what was sent
+                swift.corruptions[path] -= 1
+                body = body[:-1] + (b'\x00' if body[-1:] != b'\x00' else b'\x01')
+            etag = getmd5(body)
+            swift.objects[path] = {'data': body, 'etag': etag, 'headers': headers}
+        self.reply(201, b'', {'ETag': etag})
+
+    def do_HEAD(self):
+        request = self.begin()
+        if request is None:
+            return
+        path, query, body = request
+        with self.server.swift.lock:
+            if path not in self.server.swift.objects:
+                return self.reply(404)
+            data, etag, headers = self.getcontent(path)
+        headers['ETag'] = etag
+        self.send_response(200)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+
+    def do_GET(self):
+        request = self.begin()
+        if request is None:
+            return
+        path, query, body = request
+        swift = self.server.swift
+        if path.startswith('/auth'):
+            with swift.lock:
+                token = 'token-{0:d}'.format(len(swift.issued) + 1)
+                swift.issued.append(token)
+                if swift.tokens is not None:
+                    swift.tokens.add(token)
+            return self.reply(200, b'', {'X-Auth-Token': token, 'X-Storage-Url': swift.url})
+        with swift.lock:
+            if path in swift.objects:
+                stored = swift.objects[path]
+                if query.get('multipart-manifest') == 'get' and 'segments' in stored:
+                    listing = [{'name': segment['path'], 'bytes': segment['size_bytes'], 'hash': segment['etag']} for segment in stored['segments']]
+                    return self.reply(200, json.dumps(listing).encode('utf-8'))
+                data, etag, headers = self.getcontent(path)
+                requested = self.headers.get('Range')
+                if requested is not None:
+                    first, last = requested.split('=')[1].split('-')
+                    first = int(first)
+                    last = int(last) if last != '' else len(data) - 1
+                    headers.update({'ETag': etag, 'Content-Range': 'bytes {0:d}-{1:d}/{2:d}'.format(first, last, len(data))})
+                    return self.reply(206, data[first:last + 1], headers)
+                headers['ETag'] = etag
+                return self.reply(200, data, headers)
+            # Container listing
+            container = path + '/'
+            prefix = query.get('prefix', '')
+            marker = query.get('marker', '')
+            limit = int(query.get('limit', '10000'))
+            names = sorted(name[len(container):] for name in swift.objects if name.startswith(container))
+            names = [name for name in names if name.startswith(prefix) and name > marker][:limit]
+            listing = [self.getlistingentry(name, swift.objects[container + name]) for name in names]
+        if len(listing) == 0:
+            return self.reply(204)
+        self.reply(200, json.dumps(listing).encode('utf-8'), {'Content-Type': 'application/json'})
+
+    def do_POST(self):
+        request = self.begin()
+        if request is None:
+            return
+        path, query, body = request
+        swift = self.server.swift
+        if not swift.bulkdelete or 'bulk-delete' not in query:
+            # Taken as an account metadata update
+            return self.reply(204)
+        with swift.lock:
+            paths = [account + unquote(line.strip()) for line in body.decode('utf-8').split('\n') if line.strip() != '']
+            deleted = [name for name in paths if swift.objects.pop(name, None) is not None]
+            swift.deleted.extend(deleted)
+        report = {'Number Deleted': len(deleted), 'Number Not Found': len(paths) - len(deleted), 'Errors': [], 'Response Status': '200 OK'}
+        self.reply(200, json.dumps(report).encode('utf-8'), {'Content-Type': 'application/json'})
+
+    def do_DELETE(self):
+        request = self.begin()
+        if request is None:
+            return
+        path, query, body = request
+        swift = self.server.swift
+        with swift.lock:
+            stored = swift.objects.pop(path, None)
+            if stored is None:
+                return self.reply(404)
+            if query.get('multipart-manifest') == 'delete':
+                segments = [account + segment['path'] for segment in stored.get('segments', [])]
+                deleted = [name for name in segments if swift.objects.pop(name, None) is not None]
+                swift.deleted.extend(deleted + [path])
+                report = {'Number Deleted': len(deleted) + 1, 'Number Not Found': len(segments) - len(deleted), 'Errors': [], 'Response Status': '200 OK'}
+                return self.reply(200, json.dumps(report).encode('utf-8'), {'Content-Type': 'application/json'})
+            swift.deleted.append(path)
+        self.reply(204)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+
+    daemon_threads = True
+
+
+class SwiftServer(object):
+
+    def __init__(self, tokens=None, bulkdelete=False):
+        # tokens, when given, are the only X-Auth-Token values accepted
+        self.tokens = set(tokens) if tokens is not None else None
+        self.bulkdelete = bulkdelete
+        self.lock = threading.RLock()
+        self.objects = {}
+        self.log = []
+        self.deleted = []
+        self.faults = {}
+        self.corruptions = {}
+        self.issued = []
+        self.httpserver = ThreadingHTTPServer(('127.0.0.1', 0), SwiftHandler)
+        self.httpserver.swift = self
+        self.authurl = 'http://127.0.0.1:{0:d}'.format(self.httpserver.server_port)
+        self.url = self.authurl + account
+        self.thread = threading.Thread(target=self.httpserver.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        self.httpserver.shutdown()
+        self.httpserver.server_close()
+        return
+
+    def getobject(self, container, name):
+        return self.objects.get(account + '/' + container + '/' + name)
+
+    def putobject(self, container, name, data, headers=None):
+        self.objects[account + '/' + container + '/' + name] = {'data': data, 'etag': getmd5(data), 'headers': dict(headers or {})}
+        return
+
+    def requests(self, method, container=None):
+        prefix = account + '/' + container if container is not None else ''
+        return [entry for entry in self.log if entry[0] == method and entry[1].startswith(prefix)]
@@ -0,0 +1,87 @@
+import io
+import json
+import os
+import sys
+import unittest
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'oc'))
+
+import bulk_security
+import occsconcurrent
+import occsutils
+
+
+container = '/Compute-mydomain/user@example.com/'
+
+
+def newResponse(status_code=200, body='{}'):
+    response = requests.models.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO(body.encode('utf-8'))
+    return response
+
+
+class BulkSecurityTest(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.operations = dict(occsconcurrent.operations)
+        def record(operation):
+            def call(endpoint, resourcename, cookie, **kwargs):
+                self.calls.append((operation, resourcename, kwargs))
+                return {'name': resourcename}
+            return call
+        for operation in ['createSecurityList', 'updateSecurityList', 'deleteSecurityList']:
+            occsconcurrent.operations[operation] = record(operation)
+
+    def tearDown(self):
+        occsconcurrent.operations.clear()
+        occsconcurrent.operations.update(self.operations)
+
+    def listSecurityLists(self, endpoint, resourcename, cookie):
+        return {'result': [{'name': container + 'web', 'policy': 'DENY'}]}
+
+    def bulk(self, operation, seclists, create=False):
+        return bulk_security.bulkOperation('https://api.example.com', container, 'cookie', operation, self.listSecurityLists,
+                                           seclists, create=create, concurrency=2)
+
+    def testCreateSkipsExistingShortName(self):
+        results = self.bulk('createSecurityList', [{'name': 'web'}, {'name': 'db'}], create=True)
+        self.assertEqual([result['status'] for result in results], ['exists', 'created'])
+        self.assertEqual(self.calls, [('createSecurityList', container + 'db', {'name': container + 'db'})])
+
+    def testUpdateAndDeleteFindShortAndFullNames(self):
+        results = self.bulk('updateSecurityList', [{'name': 'web', 'policy': 'PERMIT'}, {'name': 'db'}])
+        self.assertEqual([result['status'] for result in results], ['updated', 'missing'])
+        self.assertEqual(self.calls, [('updateSecurityList', container + 'web', {'name': container + 'web', 'policy': 'PERMIT'})])
+        results = self.bulk('deleteSecurityList', [container + 'web'])
+        self.assertEqual([result['status'] for result in results], ['deleted'])
+
+
+class SendRESTRequestTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+        self.sendRequest = occsutils.sendRequest
+        def sendRequest(method, url, data=None, **kwargs):
+            self.sent.append((method, data))
+            return newResponse()
+        occsutils.sendRequest = sendRequest
+
+    def tearDown(self):
+        occsutils.sendRequest = self.sendRequest
+
+    def testPutSendsBody(self):
+        occsutils.sendRESTRequest('https://api.example.com', '/seclist/', container + 'web', {'name': container + 'web'}, 'PUT')
+        self.assertEqual(self.sent[0][0], 'PUT')
+        self.assertEqual(json.loads(self.sent[0][1]), {'name': container + 'web'})
+
+    def testPutWithoutDataSendsNoBody(self):
+        occsutils.sendRESTRequest('https://api.example.com', '/orchestration/', container + 'orch', None, 'PUT', {'action': 'START'})
+        self.assertEqual(self.sent, [('PUT', None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'oc'))
+
+import oscsutils
+from bulk_storage_objects import bulkDeleteLargeObject
+from bulk_storage_objects import bulkDeletePrefix
+from oc_retry import NoRetryPolicy
+from swiftserver import SwiftServer
+
+
+manifestpath = '/v1/Storage-d/compute_images/img.raw'
+segmentprefix = '/v1/Storage-d/compute_images_segments/img.raw/_segment_/'
+
+
+class BulkDeleteTest(object):
+
+    bulkdelete = None
+
+    def setUp(self):
+        self.swift = SwiftServer(bulkdelete=self.bulkdelete)
+        self.retrypolicy = oscsutils.getRetryPolicy()
+        oscsutils.setRetryPolicy(NoRetryPolicy())
+        # A dynamic large object of five segments
+        for suffix in ['aa', 'ab', 'ac', 'ad', 'ae']:
+            self.swift.putobject('compute_images_segments', 'img.raw/_segment_/img.raw-' + suffix, b'x' * 10)
+        self.swift.putobject('compute_images', 'img.raw', b'', {'X-Object-Manifest': 'compute_images_segments/img.raw/_segment_/img.raw-'})
+
+    def tearDown(self):
+        oscsutils.setRetryPolicy(self.retrypolicy)
+        oscsutils.closeHTTPSessions()
+        self.swift.stop()
+
+    def testSegmentsAreDeletedBeforeTheManifest(self):
+        result = bulkDeleteLargeObject(self.swift.url, 'img.raw', 'token', concurrency=4)
+        self.assertEqual(result['method'], self.method)
+        self.assertEqual((result['objects'], result['deleted'], result['notfound'], result['bytes']), (6, 6, 0, 50))
+        self.assertEqual(result['failed'], [])
+        self.assertEqual(self.swift.objects, {})
+        self.assertEqual(self.swift.deleted[-1], manifestpath)
+        self.assertEqual(sorted(self.swift.deleted[:-1]), [segmentprefix + 'img.raw-' + suffix for suffix in ['aa', 'ab', 'ac', 'ad', 'ae']])
+
+    def testDeletePrefix(self):
+        result = bulkDeletePrefix(self.swift.url, 'compute_images_segments', 'token', prefix='img.raw/_segment_/img.raw-a')
+        self.assertEqual(result['method'], self.method)
+        self.assertEqual((result['deleted'], result['bytes']), (5, 50))
+        self.assertEqual(list(self.swift.objects.keys()), [manifestpath])
+
+
+class BulkMiddlewareTest(BulkDeleteTest, unittest.TestCase):
+
+    bulkdelete = True
+    method = 'bulk'
+
+    def testManifestIsDeletedInARequestOfItsOwn(self):
+        bulkDeleteLargeObject(self.swift.url, 'img.raw', 'token')
+        self.assertEqual([length > 0 for method, path, query, length in self.swift.requests('POST')], [True, True])
+        self.assertEqual(self.swift.requests('DELETE'), [])
+
+
+class ConcurrentFallbackTest(BulkDeleteTest, unittest.TestCase):
+
+    bulkdelete = False
+    method = 'concurrent'
+
+    def testManifestIsKeptWhenASegmentIsNotDeleted(self):
+        self.swift.faults[('DELETE', segmentprefix + 'img.raw-ac')] = 1
+        result = bulkDeleteLargeObject(self.swift.url, 'img.raw', 'token', concurrency=4)
+        self.assertEqual(sorted(path for path, error in result['failed']),
+                         ['compute_images/img.raw', 'compute_images_segments/img.raw/_segment_/img.raw-ac'])
+        self.assertEqual(sorted(self.swift.objects.keys()), [manifestpath, segmentprefix + 'img.raw-ac'])
+        # A rerun removes what was left behind
+        result = bulkDeleteLargeObject(self.swift.url, 'img.raw', 'token', concurrency=4)
+        self.assertEqual(result['failed'], [])
+        self.assertEqual(self.swift.objects, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
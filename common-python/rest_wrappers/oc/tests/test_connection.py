@@ -0,0 +1,97 @@
+import io
+import os
+import sys
+import threading
+import unittest
+from contextlib import contextmanager
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'oc'))
+
+import connection
+import occsutils
+from connection import OCCSConnection
+from connection import OSCSConnection
+
+
+def newResponse(status_code=200, text=b''):
+    response = requests.models.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO(text)
+    return response
+
+
+class OperationsConnectionTest(unittest.TestCase):
+
+    def testCallDispatchesByName(self):
+        calls = []
+        def listThings(endpoint, resourcename, cookie, limit=None):
+            calls.append((endpoint, resourcename, cookie, limit))
+            return 'things'
+        operations = connection.getOperations('cookie')
+        operations['listThings'] = listThings
+        try:
+            compute = OCCSConnection('https://api.example.com', cookie='nimbula')
+            self.assertEqual(compute.call('listThings', '/Compute-d/', limit=2), 'things')
+            self.assertEqual(compute.listThings('/Compute-d/'), 'things')
+        finally:
+            del operations['listThings']
+        self.assertEqual(calls, [('https://api.example.com', '/Compute-d/', 'nimbula', 2),
+                                 ('https://api.example.com', '/Compute-d/', 'nimbula', None)])
+
+    def testStorageCallUsesStorageUrlAndToken(self):
+        storage = OSCSConnection('https://auth.example.com', authtoken='token', storageurl='https://storage.example.com/v1/Storage-d')
+        self.assertEqual(storage.getcredential(), ('https://storage.example.com/v1/Storage-d', 'token'))
+
+    def testStorageOperationsIncludeDownload(self):
+        storage = OSCSConnection('https://auth.example.com', authtoken='token', storageurl='https://storage.example.com/v1/Storage-d')
+        self.assertTrue('downloadStorageObject' in storage.getoperations())
+
+    def testStorageOperationsIncludeSync(self):
+        storage = OSCSConnection('https://auth.example.com', authtoken='token', storageurl='https://storage.example.com/v1/Storage-d')
+        self.assertTrue('syncStorageObjects' in storage.getoperations())
+
+    def testConcurrentCallsGetTheirOwnResponses(self):
+        # The first call is held after its request, until the second call has finished
+        first = threading.Event()
+        second = threading.Event()
+        responses = {'a': newResponse(200, b'a'), 'b': newResponse(200, b'b')}
+        compute = OCCSConnection('https://api.example.com', cookie='nimbula')
+        activate = compute.activate
+        @contextmanager
+        def held():
+            with activate():
+                yield compute
+            if threading.current_thread().name == 'a':
+                first.set()
+                second.wait(5)
+        compute.activate = held
+        results = {}
+        def run(resource):
+            results[resource] = compute.callrest('/instance/', resource)
+            if resource == 'b':
+                second.set()
+        callRESTApi = occsutils.callRESTApi
+        occsutils.callRESTApi = lambda endpoint, basepath, resource, *args: responses[resource]
+        try:
+            threads = [threading.Thread(target=run, args=('a',), name='a')]
+            threads[0].start()
+            first.wait(5)
+            threads.append(threading.Thread(target=run, args=('b',), name='b'))
+            threads[1].start()
+            for thread in threads:
+                thread.join()
+        finally:
+            occsutils.callRESTApi = callRESTApi
+        self.assertTrue(results['a'] is responses['a'])
+        self.assertTrue(results['b'] is responses['b'])
+
+    def testCheckResponseUsesTheGivenResponse(self):
+        compute = OCCSConnection('https://api.example.com', cookie='nimbula')
+        compute.checkresponse(newResponse(200))
+        self.assertRaises(connection.REST409Exception, compute.checkresponse, newResponse(409, b'exists'))
+
+
+if __name__ == '__main__':
+    unittest.main()
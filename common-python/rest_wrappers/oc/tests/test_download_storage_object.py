@@ -0,0 +1,77 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'oc'))
+
+import oscsutils
+from download_storage_object import downloadStorageObject
+from upload_storage_object import getcheckpointfilename
+from oc_exceptions import RESTException
+from oc_retry import NoRetryPolicy
+from swiftserver import SwiftServer
+
+
+objectpath = '/v1/Storage-d/compute_images/img.raw'
+
+
+class DownloadStorageObjectTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.checkpointdir = os.path.join(self.workdir, 'checkpoints')
+        os.environ['OC_UPLOAD_CHECKPOINT_DIR'] = self.checkpointdir
+        self.filename = os.path.join(self.workdir, 'img.raw')
+        self.data = os.urandom(5 * 1024 * 1024 + 12345)
+        self.swift = SwiftServer()
+        self.swift.putobject('compute_images', 'img.raw', self.data)
+        self.retrypolicy = oscsutils.getRetryPolicy()
+        oscsutils.setRetryPolicy(NoRetryPolicy())
+
+    def tearDown(self):
+        oscsutils.setRetryPolicy(self.retrypolicy)
+        oscsutils.closeHTTPSessions()
+        self.swift.stop()
+        del os.environ['OC_UPLOAD_CHECKPOINT_DIR']
+        shutil.rmtree(self.workdir)
+
+    def download(self):
+        return downloadStorageObject(self.swift.url, 'compute_images', 'token', 'img.raw', self.filename, rangesize=1, poolsize=3)
+
+    def interruptedDownload(self):
+        # Fail one range so the first run leaves a checkpoint of the others
+        self.swift.faults[('GET', objectpath)] = 1
+        self.assertRaises(RESTException, self.download)
+        self.assertEqual(len(os.listdir(self.checkpointdir)), 1)
+        del self.swift.log[:]
+
+    def testResumeFetchesOnlyMissingRanges(self):
+        self.interruptedDownload()
+        result = self.download()
+        self.assertEqual((result['ranges'], result['downloaded']), (6, 1))
+        self.assertEqual(len(self.swift.requests('GET', 'compute_images')), 1)
+        self.assertEqual(os.listdir(self.checkpointdir), [])
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def testCheckpointIsNotSharedWithUploads(self):
+        self.interruptedDownload()
+        downloadcheckpoint = getcheckpointfilename('download', self.filename, 'compute_images/img.raw')
+        self.assertEqual(os.listdir(self.checkpointdir), [os.path.basename(downloadcheckpoint)])
+        # An upload of the same file to the same path has a checkpoint of its own
+        self.assertNotEqual(getcheckpointfilename('upload', self.filename, 'compute_images/img.raw'), downloadcheckpoint)
+
+    def testChangedObjectStartsAgain(self):
+        self.interruptedDownload()
+        self.data = os.urandom(len(self.data))
+        self.swift.putobject('compute_images', 'img.raw', self.data)
+        result = self.download()
+        self.assertEqual((result['ranges'], result['downloaded']), (6, 6))
+        with open(self.filename, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
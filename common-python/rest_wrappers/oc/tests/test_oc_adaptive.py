@@ -0,0 +1,52 @@
+import io
+import os
+import sys
+import unittest
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'oc'))
+
+import oscsutils
+from oc_adaptive import AdaptiveExecutor
+from oc_context import activeConnection
+from oc_context import getActiveConnection
+from oc_context import getRequestTimeout
+
+
+class Connection(object):
+    pass
+
+
+class AdaptiveExecutorTest(unittest.TestCase):
+
+    def testWorkersRunInTheSubmittersContext(self):
+        connection = Connection()
+        with activeConnection(connection, timeout=7):
+            outcomes = list(AdaptiveExecutor(initial=3).run(lambda task: (getActiveConnection(), getRequestTimeout()), range(6)))
+        self.assertEqual(len(outcomes), 6)
+        for task, result, exception, elapsed in outcomes:
+            self.assertEqual(exception, None)
+            self.assertTrue(result[0] is connection)
+            self.assertEqual(result[1], 7)
+
+    def testStorageRequestsFromWorkersUseTheTimeout(self):
+        timeouts = []
+        def sendRequest(method, url, data=None, **kwargs):
+            timeouts.append(kwargs.get('timeout'))
+            response = requests.models.Response()
+            response.status_code = 201
+            response.raw = io.BytesIO(b'')
+            return response
+        send = oscsutils.sendRequest
+        oscsutils.sendRequest = sendRequest
+        try:
+            with activeConnection(None, timeout=30):
+                list(AdaptiveExecutor(initial=2).run(lambda task: oscsutils.sendRESTRequest('https://storage.example.com/v1/Storage-d', 'c', task, method='PUT', data=b''), ['a', 'b', 'c']))
+        finally:
+            oscsutils.sendRequest = send
+        self.assertEqual(timeouts, [30, 30, 30])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'oc'))
+
+import occsutils
+from oc_authcache import getCachedCookie
+from oc_authcache import storeCookie
+from oc_exceptions import REST401Exception
+
+
+endpoint = 'https://api.example.com'
+
+
+class RejectedCookieTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.authcache = os.environ.get('OC_AUTH_CACHE')
+        os.environ['OC_AUTH_CACHE'] = os.path.join(self.tmpdir, 'authcache.json')
+        self.sendRESTRequest = occsutils.sendRESTRequest
+        def sendRESTRequest(*args, **kwargs):
+            raise REST401Exception('401 : Unauthorized')
+        occsutils.sendRESTRequest = sendRESTRequest
+
+    def tearDown(self):
+        occsutils.sendRESTRequest = self.sendRESTRequest
+        if self.authcache is None:
+            del os.environ['OC_AUTH_CACHE']
+        else:
+            os.environ['OC_AUTH_CACHE'] = self.authcache
+        shutil.rmtree(self.tmpdir)
+
+    def testRejectedCookieIsRemovedFromTheSharedCache(self):
+        storeCookie(endpoint, '/Compute-d/a', 'rejected')
+        storeCookie(endpoint, '/Compute-d/b', 'fresh')
+        self.assertRaises(REST401Exception, occsutils.callAuthenticatedRESTApi, endpoint, '/instance/', cookie='rejected')
+        self.assertEqual(getCachedCookie(endpoint, '/Compute-d/a')[0], None)
+        self.assertEqual(getCachedCookie(endpoint, '/Compute-d/b')[0], 'fresh')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import logging
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'oc'))
+
+from oc_logging import QueueHandler
+
+
+class CollectingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.setFormatter(logging.Formatter('%(message)s'))
+        self.lines = []
+        self.threads = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+        self.threads.append(threading.current_thread().name)
+
+
+class QueueHandlerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.target = CollectingHandler()
+        self.handler = QueueHandler(self.target)
+        self.logger = logging.getLogger('test_oc_logging')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        self.handler.close()
+
+    def testImmutableArgumentsFormattedByWriter(self):
+        record = logging.makeLogRecord({'msg': '%s of %d', 'args': ('part', 3)})
+        self.handler.prepare(record)
+        self.assertEqual(record.msg, '%s of %d')
+        self.assertEqual(record.args, ('part', 3))
+        self.logger.info('%s of %d', 'part', 3)
+        self.handler.flush()
+        self.assertEqual(self.target.lines, ['part of 3'])
+        self.assertEqual(self.target.threads, ['oc-logging'])
+
+    def testMutableArgumentsCapturedByCaller(self):
+        values = ['a']
+        self.logger.info('values %s', values)
+        values.append('b')
+        self.handler.flush()
+        self.assertEqual(self.target.lines, ["values ['a']"])
+
+    def testTracebackFormattedByWriter(self):
+        try:
+            raise ValueError('bad segment')
+        except ValueError:
+            self.logger.exception('upload failed')
+        self.handler.flush()
+        self.assertTrue(self.target.lines[0].startswith('upload failed\nTraceback'))
+        self.assertTrue('ValueError: bad segment' in self.target.lines[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
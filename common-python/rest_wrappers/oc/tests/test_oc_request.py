@@ -0,0 +1,92 @@
+import io
+import os
+import sys
+import unittest
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'oc'))
+
+import occsutils
+import oscsutils
+from oc_context import activeConnection
+from oc_request import RequestSender
+from oc_retry import RetryPolicy
+
+
+def newResponse(status_code=200):
+    response = requests.models.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO(b'')
+    return response
+
+
+class Pool(object):
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.sent = []
+
+    def request(self, method, url, data=None, **kwargs):
+        self.sent.append((method, url))
+        return newResponse(self.statuses.pop(0))
+
+
+class Limiter(object):
+
+    def __init__(self):
+        self.acquired = []
+
+    def acquire(self, url):
+        self.acquired.append(url)
+
+
+class Metrics(object):
+
+    def __init__(self):
+        self.retries = 0
+        self.statuses = []
+
+    def countRetry(self):
+        self.retries += 1
+
+    def recordResponse(self, response):
+        self.statuses.append(response.status_code)
+
+
+class Connection(object):
+
+    def __init__(self, sessionpool):
+        self.sessionpool = sessionpool
+
+
+class RequestSenderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = Pool([503, 200])
+        self.limiter = Limiter()
+        self.metrics = Metrics()
+        self.sender = RequestSender(self.pool, RetryPolicy(maxattempts=3, basedelay=0.0, maxdelay=0.0), self.limiter, self.metrics)
+
+    def testEveryAttemptSpendsATokenAndRetriesAreCounted(self):
+        response = self.sender.send('GET', 'https://example.com/a')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.pool.sent), 2)
+        self.assertEqual(self.limiter.acquired, ['https://example.com/a', 'https://example.com/a'])
+        self.assertEqual(self.metrics.retries, 1)
+        self.assertEqual(self.metrics.statuses, [200])
+
+    def testActiveConnectionPartsAreUsed(self):
+        connectionpool = Pool([200])
+        with activeConnection(Connection(connectionpool)):
+            self.sender.send('GET', 'https://example.com/a')
+        self.assertEqual(len(connectionpool.sent), 1)
+        self.assertEqual(len(self.pool.sent), 0)
+
+    def testUtilityModulesShareTheImplementation(self):
+        self.assertTrue(isinstance(occsutils.requestSender, RequestSender))
+        self.assertTrue(isinstance(oscsutils.requestSender, RequestSender))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import io
+import os
+import sys
+import unittest
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'oc'))
+
+from oc_retry import RetryPolicy
+
+
+def newResponse(status_code=200):
+    response = requests.models.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO(b'')
+    return response
+
+
+class Sender(object):
+
+    def __init__(self, results, data=None):
+        self.results = list(results)
+        self.data = data
+        self.calls = 0
+        self.bodies = []
+
+    def __call__(self):
+        self.calls += 1
+        if self.data is not None:
+            self.bodies.append(self.data.read())
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class RetryPolicyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = RetryPolicy(maxattempts=3, basedelay=0.0, maxdelay=0.0, maxelapsed=60.0)
+
+    def testIdempotentMethodRetriesServerErrors(self):
+        for method in ['GET', 'HEAD', 'PUT', 'DELETE']:
+            send = Sender([newResponse(503), newResponse(502), newResponse(200)])
+            self.assertEqual(self.policy.execute(method, send).status_code, 200)
+            self.assertEqual(send.calls, 3)
+
+    def testPostIsNotRetriedOnServerError(self):
+        send = Sender([newResponse(503), newResponse(200)])
+        self.assertEqual(self.policy.execute('POST', send).status_code, 503)
+        self.assertEqual(send.calls, 1)
+
+    def testPostIsRetriedWhenThrottled(self):
+        send = Sender([newResponse(429), newResponse(201)])
+        self.assertEqual(self.policy.execute('POST', send).status_code, 201)
+        self.assertEqual(send.calls, 2)
+
+    def testPostIsNotRetriedOnConnectionError(self):
+        send = Sender([requests.exceptions.ConnectionError('reset'), newResponse(201)])
+        self.assertRaises(requests.exceptions.ConnectionError, self.policy.execute, 'POST', send)
+        self.assertEqual(send.calls, 1)
+
+    def testPostIsRetriedWhenConnectFails(self):
+        # Nothing was sent if the connection could not be made
+        send = Sender([requests.exceptions.ConnectTimeout('timeout'), newResponse(201)])
+        self.assertEqual(self.policy.execute('POST', send).status_code, 201)
+        self.assertEqual(send.calls, 2)
+
+    def testGetIsRetriedOnConnectionError(self):
+        send = Sender([requests.exceptions.ConnectionError('reset'), newResponse(200)])
+        self.assertEqual(self.policy.execute('GET', send).status_code, 200)
+        self.assertEqual(send.calls, 2)
+
+    def testLastResponseReturnedWhenAttemptsExhausted(self):
+        send = Sender([newResponse(503), newResponse(503), newResponse(504), newResponse(200)])
+        self.assertEqual(self.policy.execute('GET', send).status_code, 504)
+        self.assertEqual(send.calls, 3)
+
+    def testBodyIsRewoundBetweenAttempts(self):
+        data = io.BytesIO(b'segment')
+        send = Sender([newResponse(503), newResponse(201)], data)
+        self.assertEqual(self.policy.execute('PUT', send, data).status_code, 201)
+        self.assertEqual(send.bodies, [b'segment', b'segment'])
+
+    def testUnrewindableBodyIsSentOnce(self):
+        class Unrewindable(object):
+            def read(self):
+                return b'segment'
+        send = Sender([newResponse(503), newResponse(201)])
+        self.assertEqual(self.policy.execute('PUT', send, Unrewindable()).status_code, 503)
+        self.assertEqual(send.calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,92 @@
+import io
+import os
+import sys
+import unittest
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'oc'))
+
+from oc_sessionpool import HTTPSessionPool
+
+
+url = 'http://storage.example.com/v1/Storage-d/container'
+
+
+class FakeSession(object):
+
+    def __init__(self, results, sent):
+        self.results = results
+        self.sent = sent
+        self.cookies = requests.cookies.RequestsCookieJar()
+        self.closed = False
+
+    def request(self, method, url, data=None, **kwargs):
+        self.sent.append((self, method))
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def close(self):
+        self.closed = True
+
+
+def newResponse(status_code=200):
+    response = requests.models.Response()
+    response.status_code = status_code
+    response.raw = io.BytesIO(b'')
+    return response
+
+
+class HTTPSessionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.results = []
+        self.sent = []
+        self.pool = HTTPSessionPool(poolsize=2, idletimeout=60.0)
+        self.pool.newsession = lambda: FakeSession(self.results, self.sent)
+
+    def pooledSession(self):
+        # Leave one idle session in the pool so the next request reuses it
+        self.results.append(newResponse())
+        self.pool.request('GET', url)
+        del self.sent[:]
+        return self.pool.idle[url[:url.index('/v1')]][0][0]
+
+    def testStaleSessionReplaysIdempotentMethod(self):
+        stale = self.pooledSession()
+        for method in ['GET', 'HEAD', 'PUT', 'DELETE']:
+            self.results.extend([requests.exceptions.ConnectionError('reset'), newResponse(201)])
+            response = self.pool.request(method, url)
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual([m for s, m in self.sent], [method, method])
+            self.assertTrue(stale.closed)
+            stale = self.pool.idle[url[:url.index('/v1')]][0][0]
+            del self.sent[:]
+
+    def testStaleSessionDoesNotReplayPost(self):
+        stale = self.pooledSession()
+        self.results.extend([requests.exceptions.ConnectionError('reset'), newResponse(201)])
+        self.assertRaises(requests.exceptions.ConnectionError, self.pool.request, 'POST', url, data='{}')
+        self.assertEqual([m for s, m in self.sent], ['POST'])
+        self.assertTrue(stale.closed)
+
+    def testNewSessionErrorIsNotReplayed(self):
+        self.results.extend([requests.exceptions.ConnectionError('refused'), newResponse()])
+        self.assertRaises(requests.exceptions.ConnectionError, self.pool.request, 'GET', url)
+        self.assertEqual(len(self.sent), 1)
+
+    def testStreamedSessionReleasedOnClose(self):
+        self.results.append(newResponse())
+        response = self.pool.request('GET', url, stream=True)
+        self.assertEqual(sum(len(idlelist) for idlelist in self.pool.idle.values()), 0)
+        response.close()
+        self.assertEqual(sum(len(idlelist) for idlelist in self.pool.idle.values()), 1)
+        # Closing twice must not pool the session twice
+        response.close()
+        self.assertEqual(sum(len(idlelist) for idlelist in self.pool.idle.values()), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
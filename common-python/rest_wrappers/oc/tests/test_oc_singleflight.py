@@ -0,0 +1,62 @@
+import os
+import sys
+import threading
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'oc'))
+
+from oc_singleflight import SingleFlight
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def setUp(self):
+        self.singleflight = os.environ.pop('OC_SINGLE_FLIGHT', None)
+
+    def tearDown(self):
+        if self.singleflight is not None:
+            os.environ['OC_SINGLE_FLIGHT'] = self.singleflight
+
+    def concurrentCalls(self, singleflight, count):
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+        results = []
+        def call():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return {'items': []}
+        def run():
+            results.append(singleflight.do('key', call))
+        threads = [threading.Thread(target=run)]
+        threads[0].start()
+        started.wait(5)
+        threads.extend(threading.Thread(target=run) for index in range(count - 1))
+        for thread in threads[1:]:
+            thread.start()
+        while singleflight.enabled and singleflight.getStats()['deduplicated'] < count - 1:
+            threading.Event().wait(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        return calls, results
+
+    def testDisabledByDefault(self):
+        singleflight = SingleFlight()
+        self.assertFalse(singleflight.enabled)
+        calls, results = self.concurrentCalls(singleflight, 3)
+        self.assertEqual(len(calls), 3)
+
+    def testEnabledCallersShareOneCall(self):
+        os.environ['OC_SINGLE_FLIGHT'] = 'true'
+        singleflight = SingleFlight()
+        self.assertTrue(singleflight.enabled)
+        calls, results = self.concurrentCalls(singleflight, 3)
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        del os.environ['OC_SINGLE_FLIGHT']
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'oc'))
+
+import oscsutils
+from oc_retry import NoRetryPolicy
+from swiftserver import SwiftServer
+from sync_storage_objects import syncStorageObjects
+from upload_storage_object import uploadStorageObject
+
+
+class SyncStorageObjectsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        os.environ['OC_UPLOAD_CHECKPOINT_DIR'] = os.path.join(self.workdir, 'checkpoints')
+        os.environ['OC_SYNC_INDEX_DIR'] = os.path.join(self.workdir, 'index')
+        self.directory = os.path.join(self.workdir, 'directory')
+        os.makedirs(self.directory)
+        with open(os.path.join(self.directory, 'keep.txt'), 'wb') as f:
+            f.write(b'keep')
+        self.swift = SwiftServer()
+        self.retrypolicy = oscsutils.getRetryPolicy()
+        oscsutils.setRetryPolicy(NoRetryPolicy())
+
+    def tearDown(self):
+        oscsutils.setRetryPolicy(self.retrypolicy)
+        oscsutils.closeHTTPSessions()
+        self.swift.stop()
+        del os.environ['OC_UPLOAD_CHECKPOINT_DIR']
+        del os.environ['OC_SYNC_INDEX_DIR']
+        shutil.rmtree(self.workdir)
+
+    def uploadLargeObject(self, objectname, manifesttype):
+        filename = os.path.join(self.workdir, 'large.img')
+        with open(filename, 'wb') as f:
+            f.write(os.urandom(2 * 1024 * 1024 + 10))
+        uploadStorageObject(self.swift.url, 'backup', 'token', filename, splitsize=1, poolsize=2, manifesttype=manifesttype, objectname=objectname)
+        os.remove(filename)
+
+    def getNames(self, container):
+        prefix = '/v1/Storage-d/' + container + '/'
+        return sorted(path[len(prefix):] for path in self.swift.objects if path.startswith(prefix))
+
+    def testDeleteRemovesLargeObjectsWithTheirSegments(self):
+        self.swift.putobject('backup', 'site/stale.txt', b'stale')
+        self.uploadLargeObject('site/static.img', 'slo')
+        self.uploadLargeObject('site/dynamic.img', 'dlo')
+        self.assertEqual(len(self.getNames('backup_segments')), 6)
+        del self.swift.log[:]
+        result = syncStorageObjects(self.swift.url, 'backup', 'token', self.directory, prefix='site/', delete=True, poolsize=2)
+        self.assertEqual(result['failed'], [])
+        self.assertEqual(sorted(result['deleted']), ['site/dynamic.img', 'site/stale.txt', 'site/static.img'])
+        self.assertEqual(self.getNames('backup'), ['site/keep.txt'])
+        self.assertEqual(self.getNames('backup_segments'), [])
+        manifestdeletes = [path for method, path, query, length in self.swift.requests('DELETE') if query.get('multipart-manifest') == 'delete']
+        self.assertEqual(manifestdeletes, ['/v1/Storage-d/backup/site/static.img'])
+
+
+if __name__ == '__main__':
+    unittest.main()
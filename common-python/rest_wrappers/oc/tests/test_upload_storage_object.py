@@ -0,0 +1,132 @@
+import io
+import os
+import shutil
+import sys
+import tarfile
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'oc'))
+
+import oscsutils
+from oc_exceptions import RESTException
+from oc_retry import NoRetryPolicy
+from swiftserver import SwiftServer
+from upload_storage_object import uploadStorageObject
+
+
+segmentprefix = '/v1/Storage-d/compute_images_segments/img.raw/_segment_/'
+
+
+class UploadStorageObjectTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.mkdtemp()
+        self.checkpointdir = os.path.join(self.workdir, 'checkpoints')
+        os.environ['OC_UPLOAD_CHECKPOINT_DIR'] = self.checkpointdir
+        self.sourcedir = os.path.join(self.workdir, 'source')
+        os.makedirs(self.sourcedir)
+        self.filename = os.path.join(self.sourcedir, 'img.raw')
+        self.data = os.urandom(3 * 1024 * 1024 + 12345)
+        with open(self.filename, 'wb') as f:
+            f.write(self.data)
+        self.swift = SwiftServer(tokens=['token'])
+        self.retrypolicy = oscsutils.getRetryPolicy()
+        oscsutils.setRetryPolicy(NoRetryPolicy())
+
+    def tearDown(self):
+        oscsutils.setRetryPolicy(self.retrypolicy)
+        oscsutils.closeHTTPSessions()
+        self.swift.stop()
+        del os.environ['OC_UPLOAD_CHECKPOINT_DIR']
+        shutil.rmtree(self.workdir)
+
+    def upload(self, **kwargs):
+        return uploadStorageObject(self.swift.url, 'compute_images', kwargs.pop('authtoken', 'token'), self.filename, splitsize=1, poolsize=2, **kwargs)
+
+    def getSegmentNames(self):
+        return sorted(path[len(segmentprefix):] for path in self.swift.objects if path.startswith(segmentprefix))
+
+    def testSegmentsStreamedFromSourceFile(self):
+        self.upload()
+        names = self.getSegmentNames()
+        self.assertEqual(names, ['img.raw-aa', 'img.raw-ab', 'img.raw-ac', 'img.raw-ad'])
+        self.assertEqual(b''.join(self.swift.objects[segmentprefix + name]['data'] for name in names), self.data)
+        manifest = self.swift.getobject('compute_images', 'img.raw')
+        self.assertEqual(manifest['headers']['X-Object-Manifest'], 'compute_images_segments/img.raw/_segment_/img.raw-')
+        # Nothing is split out next to the source
+        self.assertEqual(os.listdir(self.sourcedir), ['img.raw'])
+
+    def interruptedUpload(self):
+        # Fail one segment so the first run leaves a checkpoint of the others
+        self.swift.faults[('PUT', segmentprefix + 'img.raw-ac')] = 1
+        self.assertRaises(RESTException, self.upload)
+        self.assertEqual(len(os.listdir(self.checkpointdir)), 1)
+        self.assertEqual(self.swift.getobject('compute_images', 'img.raw'), None)
+        del self.swift.log[:]
+
+    def getUploaded(self):
+        return [path.rsplit('/', 1)[1] for method, path, query, length in self.swift.requests('PUT')]
+
+    def testResumeUploadsOnlyMissingSegments(self):
+        self.interruptedUpload()
+        self.upload()
+        self.assertEqual(self.getUploaded(), ['img.raw-ac', 'img.raw'])
+        self.assertEqual(os.listdir(self.checkpointdir), [])
+        names = self.getSegmentNames()
+        self.assertEqual(b''.join(self.swift.objects[segmentprefix + name]['data'] for name in names), self.data)
+
+    def testResumeReuploadsChangedSegments(self):
+        self.interruptedUpload()
+        # A segment replaced behind our back no longer matches the checkpoint
+        self.swift.putobject('compute_images_segments', 'img.raw/_segment_/img.raw-aa', b'changed')
+        self.upload()
+        self.assertEqual(sorted(self.getUploaded()), ['img.raw', 'img.raw-aa', 'img.raw-ac'])
+
+    def testResumeReauthenticatesToListSegments(self):
+        self.interruptedUpload()
+        self.swift.tokens.clear()
+        self.upload(authendpoint=self.swift.authurl, user='user', password='password')
+        self.assertEqual(self.swift.issued, ['token-1'])
+        self.assertEqual(self.getUploaded(), ['img.raw-ac', 'img.raw'])
+
+    def testSegmentResentWhenStoredETagDiffers(self):
+        self.swift.corruptions[segmentprefix + 'img.raw-ab'] = 2
+        self.upload()
+        self.assertEqual([name for name in self.getUploaded() if name == 'img.raw-ab'], ['img.raw-ab'] * 3)
+        self.assertEqual(self.swift.objects[segmentprefix + 'img.raw-ab']['data'], self.data[1024 * 1024:2 * 1024 * 1024])
+        self.assertNotEqual(self.swift.getobject('compute_images', 'img.raw'), None)
+
+    def testUploadFailsWhenStoredETagKeepsDiffering(self):
+        self.swift.corruptions[segmentprefix + 'img.raw-ab'] = 3
+        self.assertRaises(RESTException, self.upload)
+        self.assertEqual([name for name in self.getUploaded() if name == 'img.raw-ab'], ['img.raw-ab'] * 3)
+        self.assertEqual(self.swift.getobject('compute_images', 'img.raw'), None)
+
+    def testCompressedSegmentsStreamedFromCompressor(self):
+        # Random data does not compress, the archive is as many segments as the image
+        self.upload(compress='tar.gz', manifesttype='slo', verify=True)
+        manifest = self.swift.getobject('compute_images', 'img.raw.tar.gz')
+        self.assertEqual([segment['path'].rsplit('/', 1)[1] for segment in manifest['segments']],
+                         ['img.raw.tar.gz-aa', 'img.raw.tar.gz-ab', 'img.raw.tar.gz-ac', 'img.raw.tar.gz-ad'])
+        archive = b''.join(self.swift.objects['/v1/Storage-d' + segment['path']]['data'] for segment in manifest['segments'])
+        with tarfile.open(fileobj=io.BytesIO(archive), mode='r:gz') as tar:
+            self.assertEqual(tar.extractfile('img.raw').read(), self.data)
+        # Segment bodies were sent chunked as they were read, not from files
+        self.assertEqual(os.listdir(self.sourcedir), ['img.raw'])
+
+    def testExtractArchiveOverSplitSizeIsAbandoned(self):
+        # Random data does not compress, the archive is over the 1 MB split size
+        self.assertRaises(RESTException, self.upload, compress='tar.gz', extractarchive='tar.gz')
+        self.assertEqual(self.swift.getobject('compute_images', 'img.raw.tar.gz'), None)
+        # The body was cut off, not ended with a last chunk for Swift to extract
+        for attempt in range(50):
+            if len(self.swift.requests('PUT')) > 0:
+                break
+            time.sleep(0.1)
+        self.assertEqual(self.swift.requests('PUT'), [('PUT', '/v1/Storage-d/compute_images/img.raw.tar.gz', {'extract-archive': 'tar.gz'}, None)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -72,6 +72,7 @@ from oc.oc_exceptions import OCObjectDoesNotExist
 
 from oc.authenticate_oscs import authenticate
 from oc.upload_storage_object import uploadStorageObject
+from oc.oc_progress import TransferProgress
 from oc.oc_exceptions import REST409Exception
 from oc.oc_exceptions import REST401Exception
 
@@ -89,7 +90,11 @@ def main():
                     filename       = dict(required=False, type='str'),
                     extractarchive = dict(required=False, type='str'),
                     splitsize      = dict(required=False, type='int', default=500),
-                    poolsize       = dict(required=False, type='int', default=4)
+                    poolsize       = dict(required=False, type='int', default=4),
+                    maxpoolsize    = dict(required=False, type='int'),
+                    manifesttype   = dict(required=False, type='str', default='dlo', choices=['dlo', 'slo']),
+                    bandwidth      = dict(required=False, type='float'),
+                    compress       = dict(required=False, type='str', choices=['tar.gz'])
             )
     )
 
@@ -104,15 +109,20 @@ def main():
     filename = module.params['filename']
     splitsize = module.params['splitsize']
     poolsize = module.params['poolsize']
+    maxpoolsize = module.params['maxpoolsize']
+    manifesttype = module.params['manifesttype']
+    bandwidth = module.params['bandwidth']
     extractarchive = module.params['extractarchive']
+    compress = module.params['compress']
 
     changed = True
     jsonobj = module.params
 
     try:
         if module.params['action'] == 'upload':
-            jsonobj = uploadStorageObject(endpoint, 'compute_images', cookie, filename, splitsize, poolsize, authendpoint, user, password, extractarchive)
-            module.exit_json(changed=changed, list=jsonobj)
+            progress = TransferProgress(resourcename)
+            jsonobj = uploadStorageObject(endpoint, 'compute_images', cookie, filename, splitsize, poolsize, authendpoint, user, password, extractarchive, maxpoolsize=maxpoolsize, manifesttype=manifesttype, bandwidth=bandwidth, progress=progress, compress=compress)
+            module.exit_json(changed=changed, list=jsonobj, progress=progress.getSummary())
 
         else:
             module.fail_json(msg="Unknown action")